@@ -8,6 +8,12 @@ class Settings(BaseSettings):
     TELEGRAM_TOKEN: str
     WEBHOOK_URL: str
     API_BASE_URL: str = "https://api.telegram.org"
+    # Self-hosted Bot API server started with --local: upload results by path from OUTPUT_DIR
+    # (OUTPUT_DIR must be readable by the server). Local file paths are detected either way.
+    BOT_API_LOCAL: bool = False
+    # The server's working directory, and where it is mounted here (leave empty if identical)
+    BOT_API_SERVER_DIR: str = ""
+    BOT_API_MOUNT_DIR: str = ""
     BOT_NAME: str = "National ID converter"
     
     AUTHORIZED_USER_IDS: str = ""
@@ -18,6 +24,90 @@ class Settings(BaseSettings):
     UPLOAD_DIR: Path = BASE_DIR / "storage" / "uploads"
     OUTPUT_DIR: Path = BASE_DIR / "storage" / "outputs"
 
+    # Rendering
+    FONT_AMHARIC: str = "./fonts/truetype/abyssinica/AbyssinicaSIL-Regular.ttf"
+    FONT_ENGLISH: str = "./fonts/truetype/noto/NotoSans-Regular.ttf"
+    FONT_SIZE: int = 27
+    BG_REMOVAL_MODEL: str = "u2net"
+    # Lightweight model used by the "reduced" quality tier
+    BG_REMOVAL_FAST_MODEL: str = "u2netp"
+
+    # Pre-flight check of every PDF (structure only, a few ms): broken, scanned and
+    # non-Fayda files are rejected up front; those costing PREFLIGHT_SLOW_COST times
+    # a standard export or more render in a slow lane of SLOW_LANE_CONCURRENCY at a time
+    PREFLIGHT_SLOW_COST: float = 2.0
+    PREFLIGHT_MAX_IMAGE_MP: float = 40
+    SLOW_LANE_CONCURRENCY: int = 1
+
+    # Resolution profile of cards unless the user / API client picks another:
+    # "screen" (150 DPI), "print" (300 DPI) or "print_hq" (600 DPI, professional printers)
+    DEFAULT_RESOLUTION: str = "print"
+
+    # Single IDs: send a quick low-res preview first, then the full card in its place
+    SEND_PREVIEW: bool = True
+
+    # Batch PNG pages: "album" sends media groups of up to 10 pages while the rest
+    # render, "zip" sends all pages as one archive (PDF output is always one document)
+    BATCH_DELIVERY: str = "album"
+
+    # Journal of multi-PDF jobs (SQLite) and their per-ID results, so collections and
+    # batches survive a restart; a batch interrupted JOURNAL_MAX_RESUMES times is given up
+    JOURNAL_ENABLED: bool = True
+    JOURNAL_PATH: Path = BASE_DIR / "storage" / "journal.sqlite3"
+    RESULTS_DIR: Path = BASE_DIR / "storage" / "results"
+    JOURNAL_MAX_RESUMES: int = 3
+    JOURNAL_KEEP_HOURS: int = 24
+
+    # Telegram file_ids of sent results by content hash (SQLite): the same bytes delivered
+    # again within SENT_FILES_TTL_HOURS go out by file_id instead of being uploaded
+    SENT_FILES_ENABLED: bool = True
+    SENT_FILES_PATH: Path = BASE_DIR / "storage" / "sent_files.sqlite3"
+    SENT_FILES_TTL_HOURS: int = 24
+
+    # Warm-up runs in the background after startup; /ready reports 503 until done
+    WARMUP_ON_STARTUP: bool = True
+
+    # Renders are admitted while their estimated memory fits in this budget; the rest queue
+    RENDER_MEMORY_BUDGET_MB: int = 1536
+
+    # Renders run in this many worker processes (0: threads of this process; -1: one per
+    # CORES_PER_RENDER cores). A worker is replaced by a pre-warmed one after
+    # RENDER_WORKER_MAX_JOBS jobs or above the RSS ceiling
+    RENDER_WORKERS: int = 2
+    RENDER_WORKER_MAX_JOBS: int = 200
+    RENDER_WORKER_MAX_RSS_MB: int = 1500
+
+    # CPU thread budget (see services/thread_budget.py): CPU_CORES (0: detected) are split
+    # between the concurrent renders, CORES_PER_RENDER threads each (0: auto) in OpenCV,
+    # onnxruntime and BLAS; IO_THREADS is the default executor's size (0: auto)
+    CPU_CORES: int = 0
+    CORES_PER_RENDER: int = 0
+    IO_THREADS: int = 0
+
+    # Load-adaptive quality: drop to the "reduced" / "minimal" tier when this many
+    # renders are queued or recent jobs (queue wait + render) take this long
+    QUALITY_AUTO: bool = True
+    QUALITY_REDUCED_QUEUE: int = 4
+    QUALITY_MINIMAL_QUEUE: int = 12
+    QUALITY_REDUCED_LATENCY_S: float = 20
+    QUALITY_MINIMAL_LATENCY_S: float = 45
+
+    # Log the blocking stack when the event loop stalls longer than this (0 disables)
+    LOOP_LAG_THRESHOLD_MS: int = 250
+
+    # HTTP conversion API (/v1): comma-separated "client:key" pairs; empty disables it
+    API_KEYS: str = ""
+    API_CLIENT_CONCURRENCY: int = 2
+    # Comma-separated "client:profile" pairs: the resolution profile a client gets by default
+    API_CLIENT_RESOLUTIONS: str = ""
+    # Per PDF, and per request (all its PDFs; bodies are refused as they stream past it)
+    API_MAX_UPLOAD_MB: int = 20
+    API_MAX_REQUEST_MB: int = 100
+    # Sheet requests with more IDs than this become background jobs (poll /v1/jobs/{id})
+    API_SYNC_SHEET_LIMIT: int = 5
+    API_MAX_SHEET_IDS: int = 100
+    API_JOB_TTL_MINUTES: int = 60
+
     # Pydantic V2 configuration style
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -37,6 +127,30 @@ class Settings(BaseSettings):
             print(f"⚠️ Error parsing AUTHORIZED_USER_IDS: {e}")
             return set()
 
+    @property
+    def api_clients(self) -> dict[str, str]:
+        """Return API keys mapped to their client names."""
+        clients = {}
+        for pair in self.API_KEYS.split(","):
+            name, sep, key = pair.strip().partition(":")
+            if sep and name and key:
+                clients[key] = name
+            elif pair.strip():
+                print("⚠️ Ignoring malformed API_KEYS entry (expected client:key)")
+        return clients
+
+    @property
+    def api_client_resolutions(self) -> dict[str, str]:
+        """Return API client names mapped to their default resolution profile."""
+        profiles = {}
+        for pair in self.API_CLIENT_RESOLUTIONS.split(","):
+            name, sep, profile = pair.strip().partition(":")
+            if sep and name and profile:
+                profiles[name] = profile
+            elif pair.strip():
+                print("⚠️ Ignoring malformed API_CLIENT_RESOLUTIONS entry (expected client:profile)")
+        return profiles
+
 settings = Settings()
 
 # Ensure directories exist
@@ -4,11 +4,13 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from app.config import settings
 from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiohttp import ClientTimeout
 
 # Set a long timeout (15 minutes) for slow processing/downloads
 timeout = ClientTimeout(total=900)
-session = AiohttpSession(timeout=timeout)
+api_server = TelegramAPIServer.from_base(settings.API_BASE_URL, is_local=settings.BOT_API_LOCAL)
+session = AiohttpSession(api=api_server, timeout=timeout)
 
 bot = Bot(token=settings.TELEGRAM_TOKEN, session=session)
 dp = Dispatcher(storage=MemoryStorage())
@@ -1,36 +1,109 @@
 # app/main.py
+from app.config import settings
+from services.thread_budget import apply_native_threads, thread_plan
+
+# Before the imports below load NumPy, OpenCV or onnxruntime (see services/thread_budget.py);
+# with render workers, this process renders nothing and gets one thread per library
+apply_native_threads(1 if thread_plan["workers"] else thread_plan["threads_per_render"])
+
+import asyncio
+import time
 import uvicorn
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from app.instances import bot, dp, scheduler  # Import from instances, NOT main
-from app.routers import webhook
-from app.routers.bot_handlers import router as bot_router
-from app.config import settings
+from app.routers import webhook, health, api
+from app.routers.bot_handlers import router as bot_router, resume_journaled_jobs
+from app.dependencies import get_processing_service
+from core.image.image_generator import warm_up
+from services.loop_monitor import LoopLagMonitor
+from services.memory_budget import memory_budget
+from services.render_workers import render_workers
+
+async def warm_up_in_background(app: FastAPI):
+    """Preload models, fonts and the template (in the render workers, if any) without blocking startup."""
+    started = time.perf_counter()
+    try:
+        if render_workers.enabled:
+            app.state.warmup_timings = await render_workers.wait_warm()
+        else:
+            app.state.warmup_timings = await asyncio.to_thread(
+                warm_up,
+                font_amharic=settings.FONT_AMHARIC,
+                font_english=settings.FONT_ENGLISH,
+                font_size=settings.FONT_SIZE,
+            )
+        print(f"🔥 Warm-up finished in {time.perf_counter() - started:.2f}s: {app.state.warmup_timings}")
+    except Exception as e:
+        # Rendering still works (lazily / with fallbacks), so we don't keep the pod out of rotation
+        app.state.warmup_error = str(e)
+        print(f"⚠️ Warm-up failed after {time.perf_counter() - started:.2f}s: {e}")
+    app.state.ready = True
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # STARTUP
+    loop_monitor = None
+    if settings.LOOP_LAG_THRESHOLD_MS > 0:
+        loop_monitor = LoopLagMonitor(threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000)
+        loop_monitor.start()
+    app.state.loop_monitor = loop_monitor
+
+    # Renders go to recycled worker processes (see services/render_workers.py), or to
+    # render threads of their own; the default executor is sized by the thread budget
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(thread_plan["io_threads"], thread_name_prefix="io"))
+    if render_workers.enabled:
+        render_workers.start()
+        memory_budget.runner = render_workers.run
+    else:
+        memory_budget.executor = ThreadPoolExecutor(thread_plan["render_slots"], thread_name_prefix="render")
+    print(f"🧵 Thread budget: {thread_plan}")
+
+    app.state.ready = False
+    app.state.warmup_timings = {}
+    app.state.warmup_error = None
+    if settings.WARMUP_ON_STARTUP:
+        warmup_task = asyncio.create_task(warm_up_in_background(app))
+    else:
+        warmup_task = None
+        app.state.ready = True
+
     scheduler.start()
     dp.include_router(bot_router)
-    
+
     webhook_url = f"{settings.WEBHOOK_URL}/webhook"
     await bot.set_webhook(url=webhook_url, drop_pending_updates=False)
-    
+
     # Store in state for easy access if needed
     app.state.bot = bot
     app.state.dp = dp
     app.state.scheduler = scheduler
-    
+
     print(f"🚀 Bot started. Webhook: {webhook_url}")
+
+    # Collections and batches interrupted by the last shutdown/crash (see services/job_journal.py)
+    resume_task = asyncio.create_task(resume_journaled_jobs(bot, dp, scheduler, get_processing_service()))
     yield
-    
+
     # SHUTDOWN
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    if not resume_task.done():
+        resume_task.cancel()
+    if loop_monitor:
+        loop_monitor.stop()
     scheduler.shutdown()
+    await render_workers.stop()
+    if memory_budget.executor:
+        memory_budget.executor.shutdown(wait=False, cancel_futures=True)
     await bot.session.close()
 
 app = FastAPI(title="National ID Bot", lifespan=lifespan)
 app.include_router(webhook.router)
+app.include_router(health.router)
+app.include_router(api.router)
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
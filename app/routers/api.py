@@ -0,0 +1,281 @@
+# app/routers/api.py
+"""
+HTTP conversion API for partner kiosks: POST a PDF, get the card back.
+
+Auth: `X-API-Key: <key>` or `Authorization: Bearer <key>` (see API_KEYS).
+Bodies: multipart/form-data (any file fields) or a raw application/pdf body.
+Renders go through the same engine and memory budget as the bot.
+`resolution` picks a profile (screen / print / print_hq); each client has a
+default (see API_CLIENT_RESOLUTIONS). `layout` picks the A4 sheet layout of
+PNG sheets (see core.image.a4_layout.SHEET_LAYOUTS).
+"""
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from app.config import settings
+from core.image.a4_layout import DEFAULT_LAYOUT, SHEET_LAYOUTS, cards_per_page, sheet_sides
+from core.image.image_generator import DEFAULT_RESOLUTION, RESOLUTION_PROFILES
+from services.api_jobs import api_jobs, client_limiter
+from services.memory_budget import estimate_render_bytes, memory_budget
+from services.processing_service import (
+    inspect_pdf,
+    page_filename,
+    render_batch_item,
+    render_card_output,
+    render_card_variants,
+    render_cards_pdf,
+    render_lane,
+    render_sheet_pages,
+    zip_pages,
+)
+from services.quality import TIERS, quality_governor
+
+router = APIRouter(prefix="/v1", tags=["api"])
+
+MEDIA_TYPES = {"png": "image/png", "pdf": "application/pdf"}
+RESOLUTION_PATTERN = f"^({'|'.join(RESOLUTION_PROFILES)})$"
+LAYOUT_PATTERN = f"^({'|'.join(SHEET_LAYOUTS)})$"
+
+
+# --- Dependencies ---
+
+async def api_client(request: Request) -> str:
+    """Resolve the API key to a client name (401 if unknown, 404 if the API is disabled)."""
+    clients = settings.api_clients
+    if not clients:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    key = request.headers.get("X-API-Key", "")
+    auth = request.headers.get("Authorization", "")
+    if not key and auth.lower().startswith("bearer "):
+        key = auth[len("bearer "):].strip()
+
+    client = clients.get(key)
+    if not client:
+        raise HTTPException(status_code=401, detail="Invalid or missing API key", headers={"WWW-Authenticate": "Bearer"})
+    return client
+
+
+def client_resolution(client: str, requested: str | None) -> str:
+    """The requested resolution profile, else the client's default (API_CLIENT_RESOLUTIONS), else DEFAULT_RESOLUTION."""
+    resolution = requested or settings.api_client_resolutions.get(client) or settings.DEFAULT_RESOLUTION
+    if resolution not in RESOLUTION_PROFILES:
+        print(f"⚠️ Unknown resolution profile {resolution!r} for API client {client}, using {DEFAULT_RESOLUTION}")
+        return DEFAULT_RESOLUTION
+    return resolution
+
+
+def acquire_slot(client: str):
+    if not client_limiter.try_acquire(client):
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests in flight (limit {client_limiter.limit} per client)",
+            headers={"Retry-After": "2"},
+        )
+
+
+# --- Request helpers ---
+
+async def limited_stream(request: Request, max_bytes: int):
+    """The request body as it arrives; 413 as soon as it passes `max_bytes`, whatever Content-Length said."""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Request body larger than {max_bytes // 2**20} MB")
+        yield chunk
+
+
+async def read_pdfs(request: Request, max_files: int = 1) -> list[bytes]:
+    """
+    Every uploaded file of a multipart body, or the raw body as one PDF. The body
+    is read as it streams in and refused once it passes API_MAX_REQUEST_MB (or,
+    for one file, API_MAX_UPLOAD_MB), so no request is held in memory whole first.
+    """
+    max_bytes = settings.API_MAX_UPLOAD_MB * 2**20
+    # 64 KiB of slack for the multipart framing
+    max_request = min(max_files * max_bytes, settings.API_MAX_REQUEST_MB * 2**20) + 64 * 1024
+    declared = request.headers.get("Content-Length")
+    # Refuse before reading anything
+    if declared and declared.isdigit() and int(declared) > max_request:
+        raise HTTPException(status_code=413, detail="Request body too large")
+
+    body = limited_stream(request, max_request)
+    if request.headers.get("Content-Type", "").startswith("multipart/form-data"):
+        try:
+            form = await MultiPartParser(request.headers, body, max_files=max_files + 1, max_fields=max_files + 1).parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            uploads = [value for _, value in form.multi_items() if hasattr(value, "read")]
+            pdfs = [await upload.read() for upload in uploads]
+        finally:
+            await form.close()
+    else:
+        pdfs = [b"".join([chunk async for chunk in body])]
+        pdfs = [pdf for pdf in pdfs if pdf]
+
+    if not pdfs:
+        raise HTTPException(status_code=400, detail="No PDF in the request")
+    if len(pdfs) > max_files:
+        raise HTTPException(status_code=413, detail=f"At most {max_files} PDF(s) per request")
+    for i, pdf_bytes in enumerate(pdfs):
+        if len(pdf_bytes) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File #{i + 1} is larger than {settings.API_MAX_UPLOAD_MB} MB")
+    return pdfs
+
+
+async def validate_pdf(pdf_bytes: bytes, label: str = "File") -> dict:
+    """Same checks as the bot: a real PDF that passes the pre-flight. Returns its pre-flight report."""
+    file_type, metadata = await asyncio.to_thread(inspect_pdf, pdf_bytes)
+    if file_type != "application/pdf":
+        raise HTTPException(status_code=415, detail=f"{label} is not a PDF (detected {file_type})")
+    if metadata["verdict"] == "reject":
+        raise HTTPException(status_code=422, detail=f"{label}: {metadata['reason']}")
+    return metadata
+
+
+def file_response(content: bytes, media_type: str, filename: str, quality: str = "full", resolution: str = DEFAULT_RESOLUTION) -> Response:
+    """
+    The rendered file; X-Render-Quality tells integrators if load lowered the
+    quality tier, X-Render-Resolution which resolution profile was used.
+    """
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Render-Quality": quality,
+        "X-Render-Resolution": resolution,
+    }
+    return Response(content, media_type=media_type, headers=headers)
+
+
+async def build_sheets(pdfs: list[bytes], color: bool, output_format: str, bilevel: bool, resolution: str, job=None, layout: str = DEFAULT_LAYOUT) -> tuple:
+    """
+    Render the IDs into A4 sheets (PNG pages laid out as `layout`, PDF pages as [Back | Front] rows).
+    Returns (bytes, media_type, filename, lowest quality tier used, resolution).
+    """
+    items, held_bytes, qualities = [], 0, []
+    dpi = RESOLUTION_PROFILES[resolution]["dpi"]
+    try:
+        for pdf_bytes in pdfs:
+            item, item_bytes, quality = await render_batch_item(pdf_bytes, None, color, output_format, resolution)
+            items.append(item)
+            held_bytes += item_bytes
+            qualities.append(quality)
+            if job:
+                job.done += 1
+
+        lowest = max(qualities, key=TIERS.index)
+        if output_format == "pdf":
+            return await asyncio.to_thread(render_cards_pdf, items, "a4"), MEDIA_TYPES["pdf"], "A4_IDs.pdf", lowest, resolution
+
+        per_page = cards_per_page(layout)
+        sheets = await asyncio.gather(*(
+            render_sheet_pages(items[start:start + per_page], bilevel and not color, dpi, layout)
+            for start in range(0, len(items), per_page)
+        ))
+        pages = [(page_filename(p, side), page) for p, sheet in enumerate(sheets) for side, page in zip(sheet_sides(layout), sheet)]
+        if len(pages) == 1:
+            return pages[0][1], MEDIA_TYPES["png"], "A4_IDs.png", lowest, resolution
+        return await asyncio.to_thread(zip_pages, pages), "application/zip", "A4_IDs.zip", lowest, resolution
+    finally:
+        memory_budget.unhold(held_bytes)
+
+
+# --- Endpoints ---
+
+@router.post("/cards")
+async def create_card(
+    request: Request,
+    color: bool = True,
+    bilevel: bool = False,
+    output_format: str = Query("png", alias="format", pattern="^(png|pdf)$"),
+    resolution: str = Query(None, pattern=RESOLUTION_PATTERN),
+    both: bool = False,
+    client: str = Depends(api_client),
+):
+    """
+    One PDF in, one card out (PNG, or a card-sized vector PDF). `both` returns a
+    ZIP of the colour and the B&W card, rendered from one parse (`color` is
+    ignored, `bilevel` applies to the B&W card).
+    """
+    resolution = client_resolution(client, resolution)
+    acquire_slot(client)
+    try:
+        pdf_bytes = (await read_pdfs(request))[0]
+        metadata = await validate_pdf(pdf_bytes)
+        quality = quality_governor.choose()
+        estimate = estimate_render_bytes(metadata, color or both, quality, resolution=resolution)
+        async with render_lane(metadata):
+            if both:
+                files = await memory_budget.run(estimate, render_card_variants, pdf_bytes, output_format, bilevel, quality, resolution)
+            else:
+                content = await render_card_output(pdf_bytes, estimate, color, output_format, bilevel, quality, resolution)
+    finally:
+        client_limiter.release(client)
+    if both:
+        return file_response(await asyncio.to_thread(zip_pages, files), "application/zip", "id_cards.zip", quality, resolution)
+    return file_response(content, MEDIA_TYPES[output_format], f"id_card.{output_format}", quality, resolution)
+
+
+@router.post("/sheets")
+async def create_sheets(
+    request: Request,
+    color: bool = True,
+    bilevel: bool = False,
+    output_format: str = Query("png", alias="format", pattern="^(png|pdf)$"),
+    background: bool = False,
+    resolution: str = Query(None, pattern=RESOLUTION_PATTERN),
+    layout: str = Query(DEFAULT_LAYOUT, pattern=LAYOUT_PATTERN),
+    client: str = Depends(api_client),
+):
+    """
+    Several PDFs in, A4 sheets out: one PNG page, a ZIP of PNG pages (laid out
+    as `layout`; duplex sheets are a fronts and a backs page), or a multi-page
+    PDF of [Back | Front] rows. Batches above API_SYNC_SHEET_LIMIT (or with
+    background=true) return 202 and a job to poll instead.
+    """
+    resolution = client_resolution(client, resolution)
+    acquire_slot(client)
+    released = False
+    try:
+        pdfs = await read_pdfs(request, max_files=settings.API_MAX_SHEET_IDS)
+        for i, pdf_bytes in enumerate(pdfs):
+            await validate_pdf(pdf_bytes, label=f"File #{i + 1}")
+
+        if background or len(pdfs) > settings.API_SYNC_SHEET_LIMIT:
+            async def work(job):
+                try:
+                    return await build_sheets(pdfs, color, output_format, bilevel, resolution, job, layout)
+                finally:
+                    client_limiter.release(client)
+
+            job = api_jobs.create(client, len(pdfs), work)
+            released = True  # the job gives the slot back when it finishes
+            return JSONResponse(status_code=202, content=job.to_dict(), headers={"Location": f"/v1/jobs/{job.id}"})
+
+        content, media_type, filename, quality, resolution = await build_sheets(pdfs, color, output_format, bilevel, resolution, layout=layout)
+    finally:
+        if not released:
+            client_limiter.release(client)
+    return file_response(content, media_type, filename, quality, resolution)
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str, client: str = Depends(api_client)):
+    job = api_jobs.get(job_id, client)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, client: str = Depends(api_client)):
+    job = api_jobs.get(job_id, client)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "done":
+        return JSONResponse(status_code=409, content=job.to_dict())
+    return file_response(*job.result)
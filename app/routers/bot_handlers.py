@@ -1,32 +1,177 @@
+import asyncio
 from datetime import datetime, timedelta
 from aiogram import Router, types, F
 from aiogram.filters import CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 
+from app.config import settings
 from app.state import PDFBotStates
+from core.image.a4_layout import DEFAULT_LAYOUT, SHEET_LAYOUTS
+from core.image.image_generator import RESOLUTION_PROFILES
+from services.cancellation import current_token, session_tokens
+from services.job_journal import job_journal, new_job_id
+from services.processing_service import batch_item_stage
+from services.speculative import speculative_results
 from utils.texts import WELCOME_TEXT, SINGLE_MODE_SELECTED
 
 router = Router()
 
 # --- TIMEOUT FUNCTION ---
-async def auto_process_timeout(user_id: int, bot, dp, processor):
+async def auto_process_timeout(user_id: int, bot, dp, processor, token=None):
     """Triggered by APScheduler if user doesn't click Done within 10 mins"""
+    if token is not None:
+        # The session that set the timer (see services.cancellation)
+        if token.cancelled:
+            return
+        current_token.set(token)
+        token.track()
     state_context = dp.fsm.get_context(bot, user_id, user_id)
     state_data = await state_context.get_data()
     current_state = await state_context.get_state()
 
     if current_state == PDFBotStates.waiting_multiple_pdfs:
         files = state_data.get("pdf_list", [])
+        is_color = state_data.get("is_color", True)
+        output_format = state_data.get("output_format", "png")
+        resolution = state_data.get("resolution", settings.DEFAULT_RESOLUTION)
+        prepared = speculative_results.take(user_id, is_color, output_format, resolution)
         if files:
             await bot.send_message(chat_id=user_id, text="⏳ 10 minutes passed! Processing your PDFs automatically...")
-            await processor.process_multiple_pdfs(files, user_id)
+            await processor.process_multiple_pdfs(
+                files,
+                user_id,
+                color=is_color,
+                output_format=output_format,
+                bilevel=state_data.get("bilevel", False),
+                prepared=prepared,
+                job_id=state_data.get("job_id"),
+                resolution=resolution,
+                layout=state_data.get("layout", DEFAULT_LAYOUT)
+            )
         await state_context.clear()
 
+def schedule_timeout(scheduler, user_id: int, bot, dp, processor):
+    """(Re)start the user's 10-minute auto-processing timer, for their current session."""
+    cancel_timeout(scheduler, user_id)
+    scheduler.add_job(
+        auto_process_timeout,
+        'date',
+        run_date=datetime.now() + timedelta(minutes=10),
+        args=[user_id, bot, dp, processor, current_token.get()],
+        id=f"timer_{user_id}"
+    )
+
+def cancel_timeout(scheduler, user_id: int):
+    job_id = f"timer_{user_id}"
+    if scheduler.get_job(job_id):
+        scheduler.remove_job(job_id)
+
+async def cancel_collection(state: FSMContext):
+    """Mark the PDFs being collected as abandoned in the job journal."""
+    if await state.get_state() in (PDFBotStates.choosing_color, PDFBotStates.waiting_multiple_pdfs):
+        job_journal.cancel((await state.get_data()).get("job_id"))
+
+async def end_session(user_id: int, state: FSMContext, scheduler, reason: str):
+    """
+    The user moved on: cancel the renders and batches their session still runs or
+    queues (see services.cancellation), its timer, and the PDFs it was collecting.
+    """
+    session_tokens.cancel(user_id, reason)
+    cancel_timeout(scheduler, user_id)
+    speculative_results.discard(user_id)
+    await cancel_collection(state)
+
+# --- RECOVERY ---
+async def resume_journaled_jobs(bot, dp, scheduler, processor):
+    """
+    After a restart: give users back the PDFs they were collecting and pick up
+    the batches that were interrupted, from the last finished ID.
+    """
+    job_journal.compact(settings.JOURNAL_KEEP_HOURS * 3600)
+    collections, batches = job_journal.pending()
+
+    for job in collections:
+        user_id, files, options = job["user_id"], job["file_ids"], job["options"]
+        state = dp.fsm.get_context(bot, job["chat_id"], user_id)
+        await state.set_state(PDFBotStates.waiting_multiple_pdfs)
+        # Jobs journaled before resolution profiles / sheet layouts existed
+        options.setdefault("resolution", "print")
+        options.setdefault("layout", DEFAULT_LAYOUT)
+        await state.set_data({"mode": "multiple", "pdf_list": files, "job_id": job["id"], **options})
+        # The restored collection's work belongs to the user's session
+        token = session_tokens.get(user_id)
+        current_token.set(token)
+        token.plan(batch_item_stage(options["output_format"]), len(files))
+        for file_id in files:
+            speculative_results.start(
+                user_id, file_id, options["is_color"], options["output_format"],
+                lambda file_id=file_id: processor.prepare_batch_item(file_id, options["is_color"], options["output_format"], options["resolution"]),
+                options["resolution"]
+            )
+        schedule_timeout(scheduler, user_id, bot, dp, processor)
+        try:
+            await bot.send_message(
+                chat_id=job["chat_id"],
+                text=f"🔄 The bot was restarted. Your {len(files)} collected PDF(s) are still here: send more or click 'Done'.",
+                reply_markup=get_collecting_kb(len(files))
+            )
+        except Exception as e:
+            print(f"⚠️ Could not notify user {user_id} about their restored collection: {e}")
+
+    for job in batches:
+        files, options = job["file_ids"], job["options"]
+        if job["resumes"] >= settings.JOURNAL_MAX_RESUMES:
+            print(f"❌ Giving up on batch {job['id']} after {job['resumes']} restarts")
+            job_journal.finish(job["id"], "failed")
+            try:
+                await bot.send_message(chat_id=job["chat_id"], text=f"❌ Sorry, your batch of {len(files)} IDs could not be finished. Please send the PDFs again.")
+            except Exception:
+                pass
+            continue
+
+        job_journal.resumed(job["id"])
+        done = len(job["items"])
+        print(f"📒 Resuming batch {job['id']}: {done}/{len(files)} IDs already rendered")
+        try:
+            msg = await bot.send_message(
+                chat_id=job["chat_id"],
+                text=f"🔄 The bot was restarted while processing your {len(files)} IDs. Resuming ({done} already done)..."
+            )
+            status_msg_id = msg.message_id
+        except Exception:
+            status_msg_id = None
+        # The resumed batch belongs to its user's session (journaled collections know the user)
+        token = session_tokens.get(job["user_id"]) if job["user_id"] else None
+        current_token.set(token)
+        task = asyncio.create_task(processor.process_multiple_pdfs(
+            files,
+            job["chat_id"],
+            color=options["is_color"],
+            status_message_id=status_msg_id,
+            output_format=options["output_format"],
+            bilevel=options["bilevel"],
+            job_id=job["id"],
+            journaled=job,
+            resolution=options.get("resolution", "print"),
+            layout=options.get("layout", DEFAULT_LAYOUT)
+        ))
+        if token is not None:
+            token.track(task)
+
 # --- HANDLERS ---
 
 # --- KEYBOARDS ---
 
-# --- KEYBOARDS ---
+# Output options offered after choosing a mode: button text -> settings stored in FSM data
+OUTPUT_OPTIONS = {
+    "🎨 Color": {"is_color": True, "output_format": "png", "bilevel": False},
+    "⚫ Black & White": {"is_color": False, "output_format": "png", "bilevel": False},
+    "🖨 Laser B&W (1-bit)": {"is_color": False, "output_format": "png", "bilevel": True},
+    "📑 Color PDF": {"is_color": True, "output_format": "pdf", "bilevel": False},
+    "📑 B&W PDF": {"is_color": False, "output_format": "pdf", "bilevel": False},
+    # Single PDFs: both cards from one parse, sent together
+    "🎨+⚫ Color & B&W": {"is_color": True, "output_format": "png", "bilevel": False, "both": True},
+}
 
 def get_main_kb():
     kb = [
@@ -34,11 +179,28 @@ def get_main_kb():
     ]
     return types.ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True, persistent=True)
 
-def get_color_kb():
+RESOLUTION_BUTTON = "📐 Resolution"
+
+def resolution_button_text(resolution: str) -> str:
+    profile = RESOLUTION_PROFILES[resolution]
+    return f"{RESOLUTION_BUTTON}: {profile['label']} ({profile['dpi']} DPI)"
+
+LAYOUT_BUTTON = "🗂 Sheet layout"
+
+def layout_button_text(layout: str) -> str:
+    return f"{LAYOUT_BUTTON}: {SHEET_LAYOUTS[layout]['label']}"
+
+def get_color_kb(resolution: str = None, layout: str = None):
+    """Output options; `layout` (multiple PDFs only) adds the sheet layout button, else "both" is offered."""
     kb = [
         [types.KeyboardButton(text="🎨 Color"), types.KeyboardButton(text="⚫ Black & White")],
-        [types.KeyboardButton(text="🔙 Back to Menu")]
+        [types.KeyboardButton(text="🖨 Laser B&W (1-bit)")] + ([] if layout else [types.KeyboardButton(text="🎨+⚫ Color & B&W")]),
+        [types.KeyboardButton(text="📑 Color PDF"), types.KeyboardButton(text="📑 B&W PDF")],
+        [types.KeyboardButton(text=resolution_button_text(resolution or settings.DEFAULT_RESOLUTION))],
     ]
+    if layout:
+        kb.append([types.KeyboardButton(text=layout_button_text(layout))])
+    kb.append([types.KeyboardButton(text="🔙 Back to Menu")])
     return types.ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True, persistent=True)
 
 def get_collecting_kb(count: int):
@@ -51,43 +213,78 @@ def get_collecting_kb(count: int):
 # --- HANDLERS ---
 
 @router.message(CommandStart())
-async def cmd_start(message: types.Message, state: FSMContext):
+async def cmd_start(message: types.Message, state: FSMContext, scheduler):
+    await end_session(message.from_user.id, state, scheduler, "/start")
     await state.clear()
     await message.answer(text=WELCOME_TEXT, reply_markup=get_main_kb(), disable_web_page_preview=True)
 
 # 2. Handle Mode Selection
 @router.message(F.text == "📄 One PDF")
-async def single_mode(message: types.Message, state: FSMContext):
+async def single_mode(message: types.Message, state: FSMContext, scheduler):
+    await end_session(message.from_user.id, state, scheduler, "new mode")
     await state.set_state(PDFBotStates.choosing_color)
-    await state.update_data(mode="single")
+    await state.update_data(mode="single", resolution=settings.DEFAULT_RESOLUTION)
     await message.answer("🎨 Please select output type:", reply_markup=get_color_kb())
 
 @router.message(F.text == "📚 Multiple PDFs")
-async def multi_mode(message: types.Message, state: FSMContext):
+async def multi_mode(message: types.Message, state: FSMContext, scheduler):
+    await end_session(message.from_user.id, state, scheduler, "new mode")
     await state.set_state(PDFBotStates.choosing_color)
-    await state.update_data(mode="multiple", pdf_list=[])
-    await message.answer("🎨 Please select output type:", reply_markup=get_color_kb())
+    await state.update_data(mode="multiple", pdf_list=[], resolution=settings.DEFAULT_RESOLUTION, layout=DEFAULT_LAYOUT)
+    await message.answer("🎨 Please select output type:", reply_markup=get_color_kb(layout=DEFAULT_LAYOUT))
+
+# 2.4 Cycle the resolution profile (screen -> print -> print_hq -> screen)
+@router.message(PDFBotStates.choosing_color, F.text.startswith(RESOLUTION_BUTTON))
+async def choose_resolution(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    profiles = list(RESOLUTION_PROFILES)
+    current = data.get("resolution", settings.DEFAULT_RESOLUTION)
+    resolution = profiles[(profiles.index(current) + 1) % len(profiles)]
+    await state.update_data(resolution=resolution)
+    await message.answer(f"📐 Resolution set to {RESOLUTION_PROFILES[resolution]['label']} ({RESOLUTION_PROFILES[resolution]['dpi']} DPI). Now select output type:", reply_markup=get_color_kb(resolution, data.get("layout")))
+
+# 2.4b Cycle the A4 sheet layout of a batch (PNG pages; PDF sheets keep [Back | Front] rows)
+@router.message(PDFBotStates.choosing_color, F.text.startswith(LAYOUT_BUTTON))
+async def choose_layout(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    layouts = list(SHEET_LAYOUTS)
+    layout = layouts[(layouts.index(data.get("layout", DEFAULT_LAYOUT)) + 1) % len(layouts)]
+    await state.update_data(layout=layout)
+    await message.answer(f"🗂 Sheet layout set to {SHEET_LAYOUTS[layout]['label']}. Now select output type:", reply_markup=get_color_kb(data.get("resolution"), layout))
 
 # 2.5 Handle Color Selection
-@router.message(PDFBotStates.choosing_color, F.text.in_(["🎨 Color", "⚫ Black & White"]))
+@router.message(PDFBotStates.choosing_color, F.text.in_(OUTPUT_OPTIONS))
 async def choose_color(message: types.Message, state: FSMContext):
-    is_color = message.text == "🎨 Color"
     data = await state.get_data()
     mode = data.get("mode")
+    resolution = data.get("resolution", settings.DEFAULT_RESOLUTION)
+    if OUTPUT_OPTIONS[message.text].get("both") and mode != "single":
+        # Batches render one variant (the button is only on the single PDF keyboard)
+        return await message.answer("⚠️ Color & B&W is only available for one PDF. Please select output type:", reply_markup=get_color_kb(resolution, data.get("layout", DEFAULT_LAYOUT)))
+    options = {"both": False, **OUTPUT_OPTIONS[message.text], "resolution": resolution}
+    label = f"{message.text}, {RESOLUTION_PROFILES[resolution]['label']}"
+    if mode != "single":
+        options["layout"] = data.get("layout", DEFAULT_LAYOUT)
+        if options["output_format"] == "png":
+            label += f", {SHEET_LAYOUTS[options['layout']]['label']}"
     
-    await state.update_data(is_color=is_color)
+    await state.update_data(**options)
     
     if mode == "single":
         await state.set_state(PDFBotStates.waiting_single_pdf)
-        msg = await message.answer(f"✅ Mode: Single ({message.text})\nPlease send your PDF file.", reply_markup=get_main_kb())
+        msg = await message.answer(f"✅ Mode: Single ({label})\nPlease send your PDF file.", reply_markup=get_main_kb())
         await state.update_data(status_msg_id=msg.message_id)
     else:
         await state.set_state(PDFBotStates.waiting_multiple_pdfs)
-        msg = await message.answer(f"✅ Mode: Multiple ({message.text})\nReady to collect. Please send your first PDF.", reply_markup=get_collecting_kb(0))
-        await state.update_data(status_msg_id=msg.message_id)
+        msg = await message.answer(f"✅ Mode: Multiple ({label})\nReady to collect. Please send your first PDF.", reply_markup=get_collecting_kb(0))
+        # Journal the collection so the PDFs survive a restart
+        job_id = new_job_id()
+        job_journal.collect(job_id, message.chat.id, message.from_user.id, options)
+        await state.update_data(status_msg_id=msg.message_id, job_id=job_id)
 
 @router.message(F.text == "🔙 Back to Menu")
-async def back_to_menu(message: types.Message, state: FSMContext):
+async def back_to_menu(message: types.Message, state: FSMContext, scheduler):
+    await end_session(message.from_user.id, state, scheduler, "back to menu")
     await state.clear()
     await message.answer("🔙 Returned to main menu.", reply_markup=get_main_kb())
 
@@ -97,9 +294,13 @@ async def process_single_pdf_file(message: types.Message, state: FSMContext, pro
     if message.document.mime_type != "application/pdf":
         return await message.answer("❌ Error: Please send a PDF file.")
 
+    session_tokens.bind(message.from_user.id)
     data = await state.get_data()
     status_msg_id = data.get("status_msg_id")
     is_color = data.get("is_color", True)
+    output_format = data.get("output_format", "png")
+    bilevel = data.get("bilevel", False)
+    resolution = data.get("resolution", settings.DEFAULT_RESOLUTION)
     
     status_text = "🔄 Processing your single ID card..."
     if status_msg_id:
@@ -116,7 +317,11 @@ async def process_single_pdf_file(message: types.Message, state: FSMContext, pro
         file_id=message.document.file_id, 
         chat_id=message.chat.id, 
         color=is_color,
-        status_message_id=status_msg_id
+        status_message_id=status_msg_id,
+        output_format=output_format,
+        bilevel=bilevel,
+        resolution=resolution,
+        both=data.get("both", False)
     )
     await message.answer("📋 ID processed. What would you like to do next?", reply_markup=get_main_kb())
     await state.clear()
@@ -126,28 +331,33 @@ async def process_single_pdf_file(message: types.Message, state: FSMContext, pro
 async def collect_files(message: types.Message, state: FSMContext, scheduler, bot, dp, processor):
     if message.document.mime_type != "application/pdf":
         return await message.answer("❌ Please only send PDF files.")
-    
+
+    token = session_tokens.bind(message.from_user.id)
     data = await state.get_data()
     pdf_list = data.get("pdf_list", [])
     pdf_list.append(message.document.file_id)
     await state.update_data(pdf_list=pdf_list)
+    job_journal.add_file(data.get("job_id"), message.document.file_id)
 
-    # Timer logic
+    # Start downloading and rendering right away; "Done" only has to assemble the pages
     user_id = message.from_user.id
-    job_id = f"timer_{user_id}"
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
-
-    scheduler.add_job(
-        auto_process_timeout,
-        'date',
-        run_date=datetime.now() + timedelta(minutes=10),
-        args=[user_id, bot, dp, processor],
-        id=job_id
+    is_color = data.get("is_color", True)
+    output_format = data.get("output_format", "png")
+    resolution = data.get("resolution", settings.DEFAULT_RESOLUTION)
+    file_id = message.document.file_id
+    token.plan(batch_item_stage(output_format))
+    speculative_results.start(
+        user_id, file_id, is_color, output_format,
+        lambda: processor.prepare_batch_item(file_id, is_color, output_format, resolution),
+        resolution
     )
+
+    # Timer logic
+    schedule_timeout(scheduler, user_id, bot, dp, processor)
     
     status_msg_id = data.get("status_msg_id")
-    status_text = f"📎 Received file #{len(pdf_list)}. Send another or click 'Done' below."
+    ready = speculative_results.ready_count(user_id)
+    status_text = f"📎 Received file #{len(pdf_list)} ({ready} ready). Send another or click 'Done' below."
     
     if status_msg_id:
         try:
@@ -172,19 +382,23 @@ async def process_multiple(event: types.Message | types.CallbackQuery, state: FS
     user_id = event.from_user.id
     message = event.message if is_callback else event
 
-    job_id = f"timer_{user_id}"
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
+    session_tokens.bind(user_id)
+    cancel_timeout(scheduler, user_id)
 
     data = await state.get_data()
     files = data.get("pdf_list", [])
     is_color = data.get("is_color", True)
+    output_format = data.get("output_format", "png")
+    bilevel = data.get("bilevel", False)
+    resolution = data.get("resolution", settings.DEFAULT_RESOLUTION)
     
     if not files:
         if is_callback: await event.answer("No PDFs collected!", show_alert=True)
         else: await message.answer("You haven't sent any PDFs yet!")
         return
 
+    prepared = speculative_results.take(user_id, is_color, output_format, resolution)
+
     status_msg_id = data.get("status_msg_id")
     status_text = f"🚀 Merging {len(files)} IDs... Please wait."
     
@@ -198,7 +412,7 @@ async def process_multiple(event: types.Message | types.CallbackQuery, state: FS
         msg = await message.answer(status_text, reply_markup=get_main_kb())
         status_msg_id = msg.message_id
     
-    await processor.process_multiple_pdfs(files, message.chat.id, color=is_color, status_message_id=status_msg_id)
+    await processor.process_multiple_pdfs(files, message.chat.id, color=is_color, status_message_id=status_msg_id, output_format=output_format, bilevel=bilevel, prepared=prepared, job_id=data.get("job_id"), resolution=resolution, layout=data.get("layout", DEFAULT_LAYOUT))
     
     if is_callback: await event.answer()
     await state.clear()
@@ -209,8 +423,9 @@ async def process_pdf_default(message: types.Message, state: FSMContext, process
     if message.document.mime_type != "application/pdf":
         return await message.answer(text="❌ Error: Please send a PDF file.")
 
+    session_tokens.bind(message.from_user.id)
     msg = await message.answer(text="🔄 Processing your single ID card...")
-    await processor.process_pdf_from_telegram(file_id=message.document.file_id, chat_id=message.chat.id, status_message_id=msg.message_id)
+    await processor.process_pdf_from_telegram(file_id=message.document.file_id, chat_id=message.chat.id, status_message_id=msg.message_id, resolution=settings.DEFAULT_RESOLUTION)
     await message.answer(text="📋 Processed! What next?", reply_markup=get_main_kb())
     await state.clear()
 
@@ -0,0 +1,48 @@
+# app/routers/health.py
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from services.api_jobs import api_jobs
+from services.cancellation import session_tokens
+from services.memory_budget import memory_budget
+from services.quality import quality_governor
+from services.render_workers import render_workers
+from services.sent_files import sent_files
+from services.thread_budget import thread_plan
+
+router = APIRouter()
+
+@router.get("/health")
+async def health(request: Request):
+    """Liveness: the process is up and serving HTTP."""
+    body = {"ok": True}
+    loop_monitor = getattr(request.app.state, "loop_monitor", None)
+    if loop_monitor:
+        body["event_loop"] = loop_monitor.stats()
+    body["memory_budget"] = memory_budget.stats()
+    body["api_jobs"] = api_jobs.stats()
+    body["quality"] = quality_governor.stats()
+    body["cancellations"] = session_tokens.stats()
+    body["thread_budget"] = thread_plan
+    body["sent_files"] = sent_files.stats()
+    if render_workers.enabled:
+        body["render_workers"] = render_workers.stats()
+    return body
+
+@router.get("/ready")
+async def ready(request: Request):
+    """
+    Readiness: models, fonts and the template are loaded.
+    The load balancer should only route traffic here once this returns 200.
+    """
+    state = request.app.state
+    body = {
+        "ready": getattr(state, "ready", False),
+        "warmup": getattr(state, "warmup_timings", {}),
+    }
+    if getattr(state, "warmup_error", None):
+        body["warmup_error"] = state.warmup_error
+
+    if not body["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    return body
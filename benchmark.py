@@ -0,0 +1,329 @@
+"""
+Benchmark suite for the bot.
+
+Usage:
+    python benchmark.py                 # run every benchmark
+    python benchmark.py startup         # run selected benchmarks by name
+"""
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Add project root to sys.path
+sys.path.append(os.getcwd())
+
+# app.config refuses to load without these; benchmarks never talk to Telegram
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:benchmark")
+os.environ.setdefault("WEBHOOK_URL", "https://example.invalid")
+
+SAMPLE_PDF = Path("storage/uploads/gebre.pdf")
+
+
+def _timed_subprocess(code: str) -> float:
+    """Run `code` in a fresh interpreter and return the wall time in seconds."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, env=os.environ.copy())
+    return time.perf_counter() - start
+
+
+def bench_startup(runs: int = 3):
+    """Cold import of the web app, and the background warm-up that follows it."""
+    baseline = min(_timed_subprocess("pass") for _ in range(runs))
+    app_import = min(_timed_subprocess("import app.main") for _ in range(runs))
+    print(f"  interpreter start:   {baseline:.3f}s")
+    print(f"  import app.main:     {app_import - baseline:.3f}s (best of {runs})")
+
+    warmup_code = (
+        "import time, json\n"
+        "from app.config import settings\n"
+        "from core.image.image_generator import warm_up\n"
+        "start = time.perf_counter()\n"
+        "try:\n"
+        "    timings = warm_up(settings.FONT_AMHARIC, settings.FONT_ENGLISH, settings.FONT_SIZE)\n"
+        "except Exception as e:\n"
+        "    timings = {'error': str(e)}\n"
+        "timings['total'] = round(time.perf_counter() - start, 3)\n"
+        "print('  warm-up:            ', json.dumps(timings))\n"
+    )
+    _timed_subprocess(warmup_code)
+
+
+def _parse_sample(color: bool = True, quality: str = "full", resolution: str = "print") -> dict:
+    import tempfile
+    from core.image.image_generator import extract_card_data
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        return extract_card_data(SAMPLE_PDF, Path(tmpdir), color=color, quality=quality, resolution=resolution)
+
+
+def _best_of(fn, runs: int = 3):
+    """Return (best wall time in seconds, last result)."""
+    best, result = float("inf"), None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_output_formats(batch: int = 10):
+    """Render time and size: PNG card / A4 PNG pages vs vector PDF card / A4 PDF."""
+    from app.config import settings
+    from core.image.image_generator import render_card_image, encode_png
+    from core.image.a4_layout import ROWS_PER_PAGE, build_back_front_row, render_sheet
+    from core.pdf.pdf_card_writer import build_card_pdf
+
+    fonts = dict(font_amharic=settings.FONT_AMHARIC, font_english=settings.FONT_ENGLISH, font_size=settings.FONT_SIZE)
+    card = _parse_sample()
+
+    t, png = _best_of(lambda: encode_png(render_card_image(card, **fonts)))
+    print(f"  card  PNG: {t:.3f}s {len(png) / 1024:8.0f} KiB")
+    t, pdf = _best_of(lambda: build_card_pdf([card], **fonts))
+    print(f"  card  PDF: {t:.3f}s {len(pdf) / 1024:8.0f} KiB")
+
+    def a4_png():
+        rows = [build_back_front_row(png) for _ in range(batch)]
+        return [page for i in range(0, batch, ROWS_PER_PAGE) for page in render_sheet(rows[i:i + ROWS_PER_PAGE])]
+
+    # The PNG sheets also need one card render per ID; the PDF only needs the parsed data
+    t, pages = _best_of(a4_png, runs=1)
+    t_cards, _ = _best_of(lambda: [render_card_image(card, **fonts) for _ in range(batch)], runs=1)
+    print(f"  {batch} IDs A4 PNG: {t + t_cards:.3f}s {sum(map(len, pages)) / 1024:8.0f} KiB")
+    # NOTE: the same card repeated, so its images dedupe; real batches add one photo/QR set per ID
+    t, sheet = _best_of(lambda: build_card_pdf([card] * batch, layout="a4", **fonts), runs=1)
+    print(f"  {batch} IDs A4 PDF: {t:.3f}s {len(sheet) / 1024:8.0f} KiB")
+
+
+def bench_monochrome():
+    """Colour vs grayscale vs 1-bit: render + encode time, canvas memory and PNG size."""
+    from app.config import settings
+    from core.image.image_generator import render_card_image, encode_png
+
+    fonts = dict(font_amharic=settings.FONT_AMHARIC, font_english=settings.FONT_ENGLISH, font_size=settings.FONT_SIZE)
+    variants = [("color", _parse_sample(color=True), False), ("gray", _parse_sample(color=False), False)]
+    variants.append(("1-bit", variants[1][1], True))
+
+    for name, card, bilevel in variants:
+        t, img = _best_of(lambda: render_card_image(card, **fonts))
+        t_enc, png = _best_of(lambda: encode_png(img, bilevel=bilevel))
+        # The 2x supersampled canvas dominates peak memory
+        canvas_mib = img.width * img.height * 4 * len(img.getbands()) / 2**20
+        print(f"  {name:6} render {t:.3f}s  encode {t_enc:.3f}s  canvas {canvas_mib:5.1f} MiB  PNG {len(png) / 1024:6.0f} KiB")
+
+
+def bench_quality_tiers():
+    """Parse, render and encode time and PNG size per quality tier."""
+    from app.config import settings
+    from core.image.image_generator import QUALITY_TIERS, render_card_image, encode_png
+
+    fonts = dict(font_amharic=settings.FONT_AMHARIC, font_english=settings.FONT_ENGLISH, font_size=settings.FONT_SIZE)
+    for quality, tier in QUALITY_TIERS.items():
+        _parse_sample(quality=quality)  # load this tier's background-removal model first
+        t_parse, card = _best_of(lambda: _parse_sample(quality=quality))
+        t_render, img = _best_of(lambda: render_card_image(card, **fonts))
+        t_enc, png = _best_of(lambda: encode_png(img, optimize=tier["optimize_png"]))
+        total = t_parse + t_render + t_enc
+        print(f"  {quality:8} parse {t_parse:.3f}s  render {t_render:.3f}s  encode {t_enc:.3f}s  total {total:.3f}s  PNG {len(png) / 1024:6.0f} KiB")
+
+
+def bench_resolutions():
+    """Parse, render and encode time, canvas size and PNG size per resolution profile."""
+    from app.config import settings
+    from core.image.image_generator import RESOLUTION_PROFILES, encode_png, render_card_image
+
+    fonts = dict(font_amharic=settings.FONT_AMHARIC, font_english=settings.FONT_ENGLISH, font_size=settings.FONT_SIZE)
+    for resolution, profile in RESOLUTION_PROFILES.items():
+        t_parse, card = _best_of(lambda: _parse_sample(quality="minimal", resolution=resolution))
+        render_card_image(card, **fonts)  # scale this profile's template and fonts first
+        t_render, img = _best_of(lambda: render_card_image(card, **fonts))
+        t_enc, png = _best_of(lambda: encode_png(img, dpi=profile["dpi"]))
+        print(
+            f"  {resolution:8} {profile['dpi']:3} DPI  {img.width}x{img.height}  parse {t_parse:.3f}s  "
+            f"render {t_render:.3f}s  encode {t_enc:.3f}s  PNG {len(png) / 1024:6.0f} KiB"
+        )
+
+
+def bench_dual_variants():
+    """Colour + B&W card of one PDF: two full runs vs one parse branching at the end."""
+    from services.processing_service import render_card_variants, render_id_card
+
+    for output_format in ("png", "pdf"):
+        render_card_variants(SAMPLE_PDF, output_format)  # models, template and fonts first
+        if output_format == "png":
+            t_two, _ = _best_of(lambda: (render_id_card(SAMPLE_PDF, True), render_id_card(SAMPLE_PDF, False)))
+        else:
+            from services.processing_service import extract_id_card, render_cards_pdf
+
+            t_two, _ = _best_of(lambda: [render_cards_pdf([extract_id_card(SAMPLE_PDF, color)]) for color in (True, False)])
+        t_both, files = _best_of(lambda: render_card_variants(SAMPLE_PDF, output_format))
+        sizes = "  ".join(f"{name} {len(data) / 1024:5.0f} KiB" for name, data in files)
+        print(f"  {output_format}  two runs {t_two:.3f}s  both {t_both:.3f}s ({t_both / t_two * 2:.2f}x one run)  {sizes}")
+
+
+def bench_sheet_layouts(batch: int = 20):
+    """A4 pages, compose + encode time and size of a batch per sheet layout."""
+    from app.config import settings
+    from core.image.a4_layout import SHEET_LAYOUTS, build_back_front_row, cards_per_page, render_sheet
+    from core.image.image_generator import encode_png, render_card_image
+
+    fonts = dict(font_amharic=settings.FONT_AMHARIC, font_english=settings.FONT_ENGLISH, font_size=settings.FONT_SIZE)
+    row = build_back_front_row(encode_png(render_card_image(_parse_sample(quality="minimal"), **fonts)))
+    rows = [row] * batch
+    for layout in SHEET_LAYOUTS:
+        per_page = cards_per_page(layout)
+        render_sheet(rows[:per_page], layout=layout)  # page buffer and geometry first
+
+        def sheets():
+            return [page for i in range(0, batch, per_page) for page in render_sheet(rows[i:i + per_page], layout=layout)]
+
+        t, pages = _best_of(sheets, runs=1)
+        print(
+            f"  {layout:8} {per_page:2} IDs/sheet  {len(pages):2} pages  {t:.3f}s ({t / batch * 1000:4.0f} ms/ID)  "
+            f"{sum(map(len, pages)) / 1024:8.0f} KiB"
+        )
+
+
+def bench_thread_budget(jobs: int = 12):
+    """
+    Throughput of `jobs` concurrent renders for each split of the cores into render
+    workers x native threads (see services/thread_budget.py), and with the libraries'
+    own defaults for comparison.
+    """
+    import asyncio
+    from services.processing_service import render_id_card
+    from services.render_workers import RenderWorkerPool
+    from services.thread_budget import available_cores, plan_threads
+
+    cores = available_cores()
+    splits = {plan_threads(cores, -1, per_render)["workers"]: per_render for per_render in range(1, cores + 1)}
+    configs = [(workers, threads) for workers, threads in sorted(splits.items())]
+    configs += [(workers, 0) for workers in sorted({2, cores})]  # 0: every library sizes its pool itself
+    pdf = SAMPLE_PDF.resolve()
+
+    async def throughput(workers: int, threads: int) -> tuple[float, float]:
+        pool = RenderWorkerPool(workers, max_jobs=10**6, max_rss_bytes=2**62, threads=threads)
+        try:
+            await pool.wait_warm()
+            await asyncio.gather(*(pool.run(render_id_card, pdf) for _ in range(workers)))  # first render in each
+            latencies = []
+
+            async def timed():
+                start = time.perf_counter()
+                await pool.run(render_id_card, pdf)
+                latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(timed() for _ in range(jobs)))
+            return jobs / (time.perf_counter() - start), sum(latencies) / len(latencies)
+        finally:
+            await pool.stop()
+
+    print(f"  {cores} core(s), {jobs} renders at once")
+    results = []
+    for workers, threads in configs:
+        rate, latency = asyncio.run(throughput(workers, threads))
+        results.append((rate, workers, threads))
+        label = f"{threads} thread(s)" if threads else "library defaults"
+        print(f"  {workers:2} worker(s) x {label:16}  {rate:5.2f} IDs/s  mean latency {latency:5.2f}s")
+    rate, workers, threads = max(results)
+    print(f"  best: RENDER_WORKERS={workers} CORES_PER_RENDER={threads}  ({rate:.2f} IDs/s)")
+
+
+def bench_preflight():
+    """Pre-flight time and verdict per sample PDF and per kind of bad upload, vs a full render."""
+    import fitz
+    from app.config import settings
+    from core.pdf.preflight import preflight_pdf
+
+    def synthetic(pages: int = 1, text: str = "", image: tuple = None) -> bytes:
+        with fitz.open() as doc:
+            for _ in range(pages):
+                page = doc.new_page()
+                if text:
+                    page.insert_textbox(page.rect + (50, 50, -50, -50), text)
+                if image:
+                    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, *image), False)
+                    page.insert_image(page.rect, pixmap=pixmap)
+            return doc.tobytes()
+
+    sample = SAMPLE_PDF.read_bytes()
+    cases = [(path.name[:24], path.read_bytes()) for path in sorted(SAMPLE_PDF.parent.glob("*.pdf"))]
+    cases += [
+        ("garbage", os.urandom(64 * 1024)),
+        ("truncated", sample[:len(sample) // 2]),
+        ("3 pages", synthetic(pages=3, text="Ethiopian Digital ID Card")),
+        ("scan (image only)", synthetic(image=(2480, 3508))),
+        ("other document", synthetic(text="Invoice\n" + "Lorem ipsum dolor sit amet. " * 20)),
+    ]
+    for name, pdf in cases:
+        t, report = _best_of(lambda: preflight_pdf(pdf, settings.PREFLIGHT_SLOW_COST, int(settings.PREFLIGHT_MAX_IMAGE_MP * 1e6)))
+        print(f"  {name:24} {t * 1000:6.1f} ms  {report['verdict']:6}  cost {report['cost'] or '-':>5}  {report['reason'] or ''}")
+
+    t_render, _ = _best_of(lambda: _parse_sample(quality="minimal"), runs=1)
+    print(f"  (full parse of {SAMPLE_PDF.name}, no background removal: {t_render * 1000:.0f} ms)")
+
+
+def bench_image_buffers():
+    """Parse + build one card: colour conversions, bytes they copied and peak traced memory."""
+    import tempfile
+    import tracemalloc
+    import cv2
+    from core.image.image_generator import build_card, parse_card_sources
+
+    conversions = {"calls": 0, "bytes": 0}
+    cvt_color = cv2.cvtColor
+
+    def counting_cvt_color(src, code, *args, **kwargs):
+        dst = cvt_color(src, code, *args, **kwargs)
+        conversions["calls"] += 1
+        conversions["bytes"] += dst.nbytes
+        return dst
+
+    def parse_and_build(color):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # "minimal" skips background removal, so only our own buffers are measured
+            return build_card(parse_card_sources(SAMPLE_PDF, Path(tmpdir)), color=color, quality="minimal")
+
+    cv2.cvtColor = counting_cvt_color
+    try:
+        for color in (True, False):
+            parse_and_build(color)  # imports and template load outside the measurement
+            conversions.update(calls=0, bytes=0)
+            tracemalloc.start()
+            start = time.perf_counter()
+            parse_and_build(color)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(
+                f"  {'color' if color else 'gray':5}  {elapsed:.3f}s  cvtColor {conversions['calls']} call(s) "
+                f"{conversions['bytes'] / 2**20:6.1f} MiB  peak traced {peak / 2**20:6.1f} MiB"
+            )
+    finally:
+        cv2.cvtColor = cvt_color
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "output_formats": bench_output_formats,
+    "monochrome": bench_monochrome,
+    "quality_tiers": bench_quality_tiers,
+    "resolutions": bench_resolutions,
+    "sheet_layouts": bench_sheet_layouts,
+    "dual_variants": bench_dual_variants,
+    "preflight": bench_preflight,
+    "thread_budget": bench_thread_budget,
+    "image_buffers": bench_image_buffers,
+}
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name}. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        print(f"▶ {name}")
+        BENCHMARKS[name]()
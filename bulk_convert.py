@@ -0,0 +1,279 @@
+"""
+Offline bulk converter: render a folder of Fayda PDFs without Telegram.
+
+Usage:
+    python bulk_convert.py storage/uploads -o out/            # a directory (searched recursively)
+    python bulk_convert.py "incoming/*.pdf" -o out/ --bw      # a glob
+    python bulk_convert.py incoming -o out/ --bw --1bit -j 8  # 1-bit laser output on 8 processes
+    python bulk_convert.py incoming -o out/ --resolution print_hq  # 600 DPI for professional printers
+    python bulk_convert.py incoming -o out/ --layout duplex   # card-size fronts/backs pages with cut marks
+
+Writes:
+    out/cards/<name>.png             one card per PDF ([Front | Back], as the bot sends it)
+    out/sheets/A4_IDs_PAGE_<n>.png   A4 sheets of [Back | Front] rows, 5 per page (see --layout;
+                                     duplex sheets are A4_IDs_PAGE_<n>_FRONTS.png / _BACKS.png)
+    out/manifest.json                what is done; re-running resumes and skips finished files
+    out/errors.csv                   one line per PDF that failed
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Add project root to sys.path
+sys.path.append(os.getcwd())
+
+# app.config refuses to load without these; the converter never talks to Telegram
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:offline")
+os.environ.setdefault("WEBHOOK_URL", "https://example.invalid")
+
+# One thread per process: parallelism comes from the pool, so keep the native
+# libraries (ONNX Runtime, OpenCV, BLAS) from oversubscribing the cores
+for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(var, "1")
+
+MANIFEST_NAME = "manifest.json"
+ERRORS_NAME = "errors.csv"
+
+
+# --- Inputs ---
+
+def find_pdfs(sources: list[str]) -> tuple[list[Path], Path]:
+    """Expand directories (recursively) and globs. Returns (sorted PDFs, their common root)."""
+    found = set()
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            found.update(p for p in path.rglob("*") if p.suffix.lower() == ".pdf")
+        else:
+            found.update(Path(p) for p in glob.glob(source, recursive=True) if p.lower().endswith(".pdf"))
+    pdfs = sorted(p.resolve() for p in found)
+    if not pdfs:
+        return [], Path.cwd()
+    root = Path(os.path.commonpath([p.parent for p in pdfs]))
+    return pdfs, root
+
+
+def output_name(pdf: Path, root: Path) -> str:
+    """Flatten the path below the root into a file name: a/b/x.pdf -> a__b__x.png"""
+    return "__".join(pdf.relative_to(root).with_suffix("").parts) + ".png"
+
+
+# --- Manifest ---
+
+def load_manifest(out_dir: Path, options: dict) -> dict:
+    path = out_dir / MANIFEST_NAME
+    if path.exists():
+        manifest = json.loads(path.read_text())
+        if manifest.get("options") == options:
+            return manifest
+        print(f"⚠️ Output options changed since the last run ({manifest.get('options')}); starting over")
+    return {"options": options, "files": {}}
+
+
+def save_manifest(out_dir: Path, manifest: dict):
+    """Write via a temp file + rename, so an interrupted run never leaves a torn manifest."""
+    tmp = out_dir / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, ensure_ascii=False))
+    tmp.replace(out_dir / MANIFEST_NAME)
+
+
+def source_stamp(pdf: Path) -> dict:
+    stat = pdf.stat()
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def is_done(entry: dict | None, pdf: Path, out_dir: Path) -> bool:
+    return (
+        bool(entry)
+        and entry.get("status") == "done"
+        and entry.get("source") == source_stamp(pdf)
+        and (out_dir / entry["card"]).exists()
+        and (out_dir / entry["row"]).exists()
+    )
+
+
+# --- Worker side (runs in the pool processes) ---
+
+def init_worker():
+    """Load the template, fonts and background-removal model once per process."""
+    from app.config import settings
+    from core.image.image_generator import warm_up
+
+    try:
+        warm_up(settings.FONT_AMHARIC, settings.FONT_ENGLISH, settings.FONT_SIZE)
+    except Exception as e:
+        print(f"⚠️ Worker warm-up failed (continuing lazily): {e}")
+
+
+def convert_one(pdf_path: str, card_path: str, row_path: str, color: bool, bilevel: bool, resolution: str = "print") -> float:
+    """Render one PDF to its card PNG and its A4 row. Returns the time taken."""
+    import io
+    import tempfile
+    from PIL import Image
+    from app.config import settings
+    from core.image.image_generator import RESOLUTION_PROFILES, generate_final_id_image, encode_png
+    from core.image.a4_layout import build_back_front_row
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        # 8-bit card first: the A4 row is resampled from it, then dithered with its page
+        png = generate_final_id_image(
+            Path(pdf_path),
+            Path(tmp),
+            font_amharic=settings.FONT_AMHARIC,
+            font_english=settings.FONT_ENGLISH,
+            font_size=settings.FONT_SIZE,
+            color=color,
+            resolution=resolution,
+        )
+
+    dpi = RESOLUTION_PROFILES[resolution]["dpi"]
+    if bilevel and not color:
+        Path(card_path).write_bytes(encode_png(Image.open(io.BytesIO(png)), bilevel=True, dpi=dpi))
+    else:
+        Path(card_path).write_bytes(png)
+
+    # Rows are an intermediate; favour encode speed over size
+    build_back_front_row(png, dpi).save(row_path, format="PNG", compress_level=1)
+    return time.perf_counter() - started
+
+
+def build_sheet(row_paths: list[str], sheet_paths: list[str], bilevel: bool, resolution: str = "print", layout: str = "rows"):
+    """Lay out one A4 sheet; `sheet_paths` has one path per page of the sheet (two for duplex)."""
+    from PIL import Image
+    from core.image.a4_layout import render_sheet
+    from core.image.image_generator import RESOLUTION_PROFILES
+
+    rows = [Image.open(p) for p in row_paths]
+    pages = render_sheet(rows, bilevel=bilevel, dpi=RESOLUTION_PROFILES[resolution]["dpi"], layout=layout)
+    for sheet_path, page in zip(sheet_paths, pages):
+        Path(sheet_path).write_bytes(page)
+
+
+# --- Main ---
+
+def progress(iterable, total: int, desc: str, unit: str):
+    from tqdm import tqdm
+
+    return tqdm(iterable, total=total, desc=desc, unit=unit)
+
+
+def write_errors(out_dir: Path, manifest: dict) -> int:
+    failed = [(src, e) for src, e in manifest["files"].items() if e.get("status") == "failed"]
+    path = out_dir / ERRORS_NAME
+    if not failed:
+        path.unlink(missing_ok=True)
+        return 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["source", "error", "detail"])
+        for source, entry in failed:
+            writer.writerow([source, entry["error"], entry.get("detail", "")])
+    return len(failed)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Render Fayda PDFs to ID cards and A4 sheets, using all cores.")
+    parser.add_argument("sources", nargs="+", help="directories (searched recursively) and/or globs of PDFs")
+    parser.add_argument("-o", "--output", type=Path, default=Path("storage/outputs/bulk"), help="output directory")
+    parser.add_argument("--bw", action="store_true", help="black & white (8-bit grayscale) instead of colour")
+    parser.add_argument("--1bit", dest="bilevel", action="store_true", help="with --bw: dithered 1-bit output for laser printers")
+    parser.add_argument(
+        "--resolution", choices=("screen", "print", "print_hq"), default="print",
+        help="resolution profile: screen (150 DPI), print (300 DPI, default) or print_hq (600 DPI)",
+    )
+    parser.add_argument(
+        "--layout", choices=("rows", "cards", "compact", "duplex"), default="rows",
+        help="A4 sheet layout: rows (5 [Back | Front] rows, default), cards (card size, cut marks), "
+             "compact (18 per page, cut marks) or duplex (fronts and mirrored backs pages)",
+    )
+    parser.add_argument("--no-sheets", action="store_true", help="only write the individual cards")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    pdfs, root = find_pdfs(args.sources)
+    if not pdfs:
+        print("No PDFs found.")
+        return 1
+
+    color = not args.bw
+    bilevel = args.bilevel and not color
+    out_dir = args.output
+    for sub in ("cards", "rows", "sheets"):
+        (out_dir / sub).mkdir(parents=True, exist_ok=True)
+
+    manifest = load_manifest(out_dir, {"color": color, "bilevel": bilevel, "resolution": args.resolution})
+    files = manifest["files"]
+    keys = {pdf: str(pdf.relative_to(root)) for pdf in pdfs}
+    todo = [pdf for pdf in pdfs if not is_done(files.get(keys[pdf]), pdf, out_dir)]
+    print(f"📚 {len(pdfs)} PDFs under {root}: {len(pdfs) - len(todo)} already done, {len(todo)} to render on {args.workers} processes")
+
+    started = time.perf_counter()
+    # spawn: workers start clean (no inherited threads or half-initialised native libraries)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=init_worker) as pool:
+        # 1️⃣ Cards (and their A4 rows), saving the manifest as each one finishes
+        futures = {}
+        for pdf in todo:
+            name = output_name(pdf, root)
+            entry = {"source": source_stamp(pdf), "card": f"cards/{name}", "row": f"rows/{name}"}
+            future = pool.submit(convert_one, str(pdf), str(out_dir / entry["card"]), str(out_dir / entry["row"]), color, bilevel, args.resolution)
+            futures[future] = (keys[pdf], entry)
+
+        try:
+            for future in progress(as_completed(futures), len(futures), "Cards", "pdf"):
+                key, entry = futures[future]
+                try:
+                    entry["seconds"] = round(future.result(), 2)
+                    entry["status"] = "done"
+                except Exception as e:
+                    # The worker's traceback comes back as text on the cause; keep where it failed
+                    remote = getattr(e.__cause__, "tb", "") or traceback.format_exc()
+                    detail = " | ".join(line.strip() for line in remote.strip().splitlines()[-4:-1])
+                    entry.update(status="failed", error=f"{type(e).__name__}: {e}", detail=detail)
+                files[key] = entry
+                save_manifest(out_dir, manifest)
+        except KeyboardInterrupt:
+            print("\n⏹ Interrupted; finished files are in the manifest, re-run to resume")
+            pool.shutdown(wait=False, cancel_futures=True)
+            return 130
+
+        # 2️⃣ A4 sheets from every finished row, in input order
+        sheets = []
+        if not args.no_sheets:
+            from core.image.a4_layout import cards_per_page, sheet_sides
+
+            done = [files[keys[pdf]] for pdf in pdfs if files.get(keys[pdf], {}).get("status") == "done"]
+            row_paths = [str(out_dir / entry["row"]) for entry in done]
+            for old in (out_dir / "sheets").glob("A4_IDs_PAGE_*.png"):
+                old.unlink()
+            per_page = cards_per_page(args.layout)
+            for p, start in enumerate(range(0, len(row_paths), per_page)):
+                sheet_paths = [
+                    str(out_dir / "sheets" / (f"A4_IDs_PAGE_{p + 1}_{side.upper()}.png" if side else f"A4_IDs_PAGE_{p + 1}.png"))
+                    for side in sheet_sides(args.layout)
+                ]
+                sheets.append(pool.submit(build_sheet, row_paths[start:start + per_page], sheet_paths, bilevel, args.resolution, args.layout))
+            for future in progress(as_completed(sheets), len(sheets), "Sheets", "page"):
+                future.result()
+
+    elapsed = time.perf_counter() - started
+    failed = write_errors(out_dir, manifest)
+    rendered = len(todo) - sum(1 for pdf in todo if files[keys[pdf]]["status"] == "failed")
+    rate = rendered / elapsed if elapsed else 0
+    print(f"✅ {rendered} rendered, {failed} failed, {len(sheets)} A4 sheets in {elapsed:.1f}s ({rate:.2f} PDFs/s)")
+    if failed:
+        print(f"❌ See {out_dir / ERRORS_NAME}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
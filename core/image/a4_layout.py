@@ -0,0 +1,246 @@
+import io
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from core.image.buffers import pil_to_array
+
+# A4 Size at 300 DPI (LAYOUT_DPI); other resolution profiles scale every size below
+LAYOUT_DPI = 300
+A4_WIDTH = 2480
+A4_HEIGHT = 3508
+ID_HALF_WIDTH = 1240  # Template width 2480 / 2
+ID_FULL_HEIGHT = 727
+
+# Scaling to fit 5 rows with margins
+ROWS_PER_PAGE = 5
+TARGET_HEIGHT = 700
+TARGET_ROW_WIDTH = A4_WIDTH  # We use the full A4 width for the [Back | Front] row
+
+# One card side at ID-1 card width (85.6 mm), keeping the template's aspect ratio
+CARD_SIDE_WIDTH = 1011
+CARD_SIDE_HEIGHT = round(CARD_SIDE_WIDTH * ID_FULL_HEIGHT / ID_HALF_WIDTH)
+# Two columns of half-width sides, nine rows
+COMPACT_SIDE_WIDTH = 575
+COMPACT_SIDE_HEIGHT = round(COMPACT_SIDE_WIDTH * ID_FULL_HEIGHT / ID_HALF_WIDTH)
+
+# Cut marks: 2 mm between cut tiles, 3 mm marks starting 1 mm outside the grid
+CUT_GUTTER = 24
+MARK_LENGTH = 35
+MARK_OFFSET = 12
+MARK_WIDTH = 3
+
+# Sheet layouts: a grid of `columns` x `rows` tiles, each one card as a [Back | Front]
+# row ("pair") or, for duplex, one side of it on its own page ("side"). Sizes are
+# LAYOUT_DPI pixels. gutter=None spreads the tiles evenly down the page (the
+# original layout, which has no cut marks); otherwise the grid is centred.
+# Duplex layouts print the backs on a second page, mirrored so that they land
+# behind their fronts when the sheet is printed double-sided (flip on long edge).
+SHEET_LAYOUTS = {
+    "rows": {
+        "label": "[Back | Front]",
+        "columns": 1, "rows": ROWS_PER_PAGE, "tile": "pair",
+        "side": (TARGET_ROW_WIDTH // 2, TARGET_HEIGHT), "gutter": None, "cut_marks": False, "duplex": False,
+    },
+    "cards": {
+        "label": "[Back | Front], card size",
+        "columns": 1, "rows": 5, "tile": "pair",
+        "side": (CARD_SIDE_WIDTH, CARD_SIDE_HEIGHT), "gutter": CUT_GUTTER, "cut_marks": True, "duplex": False,
+    },
+    "compact": {
+        "label": "[Back | Front], 18 per page",
+        "columns": 2, "rows": 9, "tile": "pair",
+        "side": (COMPACT_SIDE_WIDTH, COMPACT_SIDE_HEIGHT), "gutter": CUT_GUTTER, "cut_marks": True, "duplex": False,
+    },
+    "duplex": {
+        "label": "Duplex (fronts, then backs)",
+        "columns": 2, "rows": 5, "tile": "side",
+        "side": (CARD_SIDE_WIDTH, CARD_SIDE_HEIGHT), "gutter": CUT_GUTTER, "cut_marks": True, "duplex": True,
+    },
+}
+DEFAULT_LAYOUT = "rows"
+
+# Page canvases kept for reuse between pages (an RGB page is 26 MiB at 300 DPI)
+PAGE_BUFFERS_KEPT = 2
+_page_buffers = []
+_page_buffers_lock = threading.Lock()
+
+
+def at_dpi(px: int, dpi: int = LAYOUT_DPI) -> int:
+    """A size in LAYOUT_DPI pixels, in pixels at `dpi`."""
+    return round(px * dpi / LAYOUT_DPI)
+
+
+def cards_per_page(layout: str = DEFAULT_LAYOUT) -> int:
+    """IDs on one A4 sheet of `layout` (both pages of a duplex sheet)."""
+    spec = SHEET_LAYOUTS[layout]
+    return spec["columns"] * spec["rows"]
+
+
+def sheet_sides(layout: str = DEFAULT_LAYOUT) -> tuple:
+    """The pages one sheet of `layout` prints as: ("fronts", "backs") for duplex, else (None,)."""
+    return ("fronts", "backs") if SHEET_LAYOUTS[layout]["duplex"] else (None,)
+
+
+@lru_cache(maxsize=None)
+def sheet_geometry(layout: str = DEFAULT_LAYOUT, dpi: int = LAYOUT_DPI, count: int = None) -> dict:
+    """
+    Where the first `count` cards (a full sheet by default) of a `layout` sheet go
+    at `dpi`, worked out once per layout, DPI and count:
+        page:  (width, height) of each page
+        row:   (width, height) the [Back | Front] rows are fitted to
+        pages: per page of the sheet, (placements, cut marks). A placement
+               (card, x1, x2, x, y) copies columns x1:x2 of that card's row to
+               (x, y); a cut mark is a black (x1, y1, x2, y2) rectangle.
+    """
+    spec = SHEET_LAYOUTS[layout]
+    per_page = spec["columns"] * spec["rows"]
+    count = per_page if count is None else count
+    page_w, page_h = at_dpi(A4_WIDTH, dpi), at_dpi(A4_HEIGHT, dpi)
+    side_w, side_h = at_dpi(spec["side"][0], dpi), at_dpi(spec["side"][1], dpi)
+    row_w = 2 * side_w
+    tile_w = row_w if spec["tile"] == "pair" else side_w
+
+    # 1️⃣ Tile positions, row by row
+    if spec["gutter"] is None:
+        # Spread over the page: the gaps depend on how many rows this page has
+        margin_y = (page_h - count * side_h) // (count + 1) if count else 0
+        origins = [(0, margin_y + j * (side_h + margin_y)) for j in range(count)]
+    else:
+        gutter = at_dpi(spec["gutter"], dpi)
+        grid_w = spec["columns"] * tile_w + (spec["columns"] - 1) * gutter
+        grid_h = spec["rows"] * side_h + (spec["rows"] - 1) * gutter
+        left, top = (page_w - grid_w) // 2, (page_h - grid_h) // 2
+        origins = [
+            (left + (k % spec["columns"]) * (tile_w + gutter), top + (k // spec["columns"]) * (side_h + gutter))
+            for k in range(count)
+        ]
+
+    # 2️⃣ What goes where on each page (duplex backs mirror their fronts' positions)
+    if spec["tile"] == "pair":
+        pages = [[(k, 0, row_w, x, y) for k, (x, y) in enumerate(origins)]]
+    else:
+        pages = [
+            [(k, side_w, row_w, x, y) for k, (x, y) in enumerate(origins)],
+            [(k, 0, side_w, page_w - x - side_w, y) for k, (x, y) in enumerate(origins)],
+        ]
+
+    # 3️⃣ Cut marks, in the margins around the grid, on the extension of every cut
+    marks = []
+    for placements in pages:
+        page_marks = set()
+        if spec["cut_marks"] and placements:
+            length, offset = at_dpi(MARK_LENGTH, dpi), at_dpi(MARK_OFFSET, dpi)
+            width = max(at_dpi(MARK_WIDTH, dpi), 1)
+            top = min(y for *_, y in placements)
+            bottom = max(y for *_, y in placements) + side_h
+            left = min(x for *_, x, _ in placements)
+            right = max(x + x2 - x1 for _, x1, x2, x, _ in placements)
+            for _, x1, x2, x, y in placements:
+                # Pair tiles are cut into their back and front too
+                for cut in range(x, x + x2 - x1 + 1, side_w):
+                    mx = cut - width // 2
+                    page_marks.add((mx, top - offset - length, mx + width, top - offset))
+                    page_marks.add((mx, bottom + offset, mx + width, bottom + offset + length))
+                for cut in (y, y + side_h):
+                    my = cut - width // 2
+                    page_marks.add((left - offset - length, my, left - offset, my + width))
+                    page_marks.add((right + offset, my, right + offset + length, my + width))
+        marks.append(tuple(sorted(page_marks)))
+
+    return {
+        "page": (page_w, page_h),
+        "row": (row_w, side_h),
+        "pages": tuple((tuple(placements), page_marks) for placements, page_marks in zip(pages, marks)),
+    }
+
+
+def build_back_front_row(image_bytes: bytes, dpi: int = LAYOUT_DPI) -> Image.Image:
+    """
+    Turn a rendered card (PNG bytes, [Front | Back]) into a [Back | Front] row
+    resized to fit an A4 page at `dpi` (the card's resolution profile).
+    Rows are the same for every sheet layout; render_sheet fits them to its tiles.
+    CPU-bound: run it off the event loop.
+    Grayscale cards stay 8-bit "L" (1-bit cards are widened to "L" for resampling).
+    """
+    full_id_img = Image.open(io.BytesIO(image_bytes))
+    mode = "RGB" if full_id_img.mode in ("RGB", "RGBA", "P") else "L"
+    full_id_img = full_id_img.convert(mode)
+    # Template: Front is the left half, Back the right half
+    width, height = full_id_img.size
+    half = width // 2
+    front = full_id_img.crop((0, 0, half, height))
+    back = full_id_img.crop((half, 0, width, height))
+
+    # Create the new row [Back | Front]
+    new_row = Image.new(mode, (width, height))
+    new_row.paste(back, (0, 0))
+    new_row.paste(front, (width - half, 0))
+
+    # Resize for A4 fit
+    return new_row.resize((at_dpi(TARGET_ROW_WIDTH, dpi), at_dpi(TARGET_HEIGHT, dpi)), Image.Resampling.LANCZOS)
+
+
+@contextmanager
+def page_buffer(size: tuple, mode: str):
+    """
+    A white-filled (width, height) page canvas as a NumPy array ("RGB" or "L"),
+    taken from the buffers kept by earlier pages when one has the right shape.
+    """
+    width, height = size
+    shape = (height, width, 3) if mode == "RGB" else (height, width)
+    with _page_buffers_lock:
+        index = next((i for i, kept in enumerate(_page_buffers) if kept.shape == shape), None)
+        canvas = _page_buffers.pop(index) if index is not None else None
+    if canvas is None:
+        canvas = np.empty(shape, dtype=np.uint8)
+    try:
+        yield canvas
+    finally:
+        with _page_buffers_lock:
+            _page_buffers.append(canvas)
+            # Keep the most recent ones (another resolution profile needs another shape)
+            del _page_buffers[:-PAGE_BUFFERS_KEPT]
+
+
+def encode_page(canvas: np.ndarray, bilevel: bool = False, dpi: int = LAYOUT_DPI) -> bytes:
+    """PNG bytes of a page canvas; bilevel=True dithers it to 1-bit."""
+    page = Image.fromarray(canvas)
+    if bilevel:
+        page = page.convert('1')
+    out_io = io.BytesIO()
+    if dpi == LAYOUT_DPI:
+        page.save(out_io, format='PNG')
+    else:
+        page.save(out_io, format='PNG', dpi=(dpi, dpi))
+    return out_io.getvalue()
+
+
+def render_sheet(rows: list[Image.Image], bilevel: bool = False, dpi: int = LAYOUT_DPI, layout: str = DEFAULT_LAYOUT) -> list[bytes]:
+    """
+    Lay out up to cards_per_page(layout) [Back | Front] rows on one A4 sheet at
+    `dpi` and return its pages as PNG bytes (two for duplex: fronts, then backs).
+    The pages use the rows' mode; bilevel=True dithers them to 1-bit.
+    CPU-bound: runs in a render worker (or a thread) per sheet.
+    """
+    geometry = sheet_geometry(layout, dpi, len(rows))
+    mode = rows[0].mode if rows else 'RGB'
+    # Rows are built at the original layout's size; other layouts resample them once
+    row_size = geometry["row"]
+    rows = [row if row.size == row_size else row.resize(row_size, Image.Resampling.LANCZOS) for row in rows]
+    arrays = [pil_to_array(row if row.mode == mode else row.convert(mode)) for row in rows]
+
+    pages = []
+    with page_buffer(geometry["page"], mode) as canvas:
+        for placements, marks in geometry["pages"]:
+            canvas.fill(255)
+            for k, x1, x2, x, y in placements:
+                tile = arrays[k][:, x1:x2]
+                canvas[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+            for x1, y1, x2, y2 in marks:
+                canvas[y1:y2, x1:x2] = 0
+            pages.append(encode_page(canvas, bilevel, dpi))
+    return pages
@@ -0,0 +1,29 @@
+# core/image/buffers.py
+"""
+The in-memory image representation shared by core.image and core.pdf.
+
+Images are 8-bit NumPy arrays in RGB (HxWx3), RGBA (HxWx4) or grayscale (HxW)
+order. They are never BGR: the OpenCV filters we use are channel-order agnostic,
+so nothing needs OpenCV's native layout. Conversions only happen at library
+boundaries: decoding (PyMuPDF pixmaps, PIL) and handing images to PIL for
+drawing and encoding.
+"""
+import numpy as np
+from PIL import Image
+
+
+def pixmap_to_array(pix) -> np.ndarray:
+    """A PyMuPDF pixmap as an RGB(A) array: a read-only view of its samples, no further copy."""
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+
+def pil_to_array(img: Image.Image) -> np.ndarray:
+    """A PIL image as a read-only array (one copy; np.array() would make two)."""
+    return np.asarray(img)
+
+
+def to_pil(img) -> Image.Image:
+    """A PIL image for drawing/encoding (PIL images pass through untouched)."""
+    if isinstance(img, Image.Image):
+        return img
+    return Image.fromarray(img)
@@ -1,22 +1,49 @@
-from rembg import remove
-from PIL import Image
-import numpy as np
-import cv2
-import io
+import os
+from functools import lru_cache
+from app.config import settings
 
-def get_image_without_bg(input_image):
+# rembg imports pymatting, whose numba kernels pick the TBB threading layer when it
+# is installed. TBB deadlocks interpreter shutdown if that first import happens off
+# the main thread, which is where warm-up and renders run. We never use alpha
+# matting, so the plain workqueue layer is all we need.
+os.environ.setdefault("NUMBA_THREADING_LAYER", "workqueue")
+
+
+@lru_cache(maxsize=None)
+def get_bg_session(model_name: str = None):
+    """
+    Load the rembg/onnxruntime session once per process.
+    rembg.remove() builds a new session (and reloads the model) on every call
+    when no session is passed, so we keep one around and reuse it.
+    Inference uses OMP_NUM_THREADS threads when set (see services.thread_budget).
+    """
+    import onnxruntime as ort
+    from rembg import new_session  # heavy: pulls in onnxruntime and pymatting
+
+    sess_opts = ort.SessionOptions()
+    threads = int(os.environ.get("OMP_NUM_THREADS", 0))
+    if threads > 0:
+        sess_opts.intra_op_num_threads = threads
+        # Operators run one after another (sequential execution): no inter-op pool needed
+        sess_opts.inter_op_num_threads = 1
+    return new_session(model_name or settings.BG_REMOVAL_MODEL, sess_opts=sess_opts)
+
+
+def get_image_without_bg(input_image, fast: bool = False):
     """
-    Accepts a PIL Image or a NumPy (OpenCV) array.
+    Accepts a PIL Image or an RGB NumPy array (see core.image.buffers).
     Removes the background and returns a PIL RGBA Image.
+    fast=True uses the lightweight model (BG_REMOVAL_FAST_MODEL).
     """
-    # 1. If the input is a NumPy array (OpenCV), convert BGR to RGB
-    if isinstance(input_image, np.ndarray):
-        # OpenCV uses BGR, but rembg/PIL use RGB
-        input_image = cv2.cvtColor(input_image, cv2.COLOR_BGR2RGB)
-        input_image = Image.fromarray(input_image)
+    from rembg import remove
+    from core.image.buffers import to_pil
+
+    # 1. rembg works on PIL images
+    input_image = to_pil(input_image)
 
     # 2. rembg.remove can take a PIL image directly and returns a PIL image
-    output_image = remove(input_image)
+    model_name = settings.BG_REMOVAL_FAST_MODEL if fast else None
+    output_image = remove(input_image, session=get_bg_session(model_name))
 
     # 3. Ensure the result is in RGBA mode (to support transparency)
-    return output_image.convert("RGBA")
\ No newline at end of file
+    return output_image.convert("RGBA")
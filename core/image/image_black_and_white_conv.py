@@ -7,9 +7,9 @@ def get_grayscale_image(input_image):
     Converts a color image to Grayscale (shades of gray).
     Accepts PIL Image or NumPy array.
     """
-    # 1. If it's a PIL image, convert to NumPy array
+    # 1. If it's a PIL image, view it as a NumPy array (one copy, see core.image.buffers)
     if isinstance(input_image, Image.Image):
-        input_image = np.array(input_image)
+        input_image = np.asarray(input_image)
 
     # 2. Convert to Grayscale
     if len(input_image.shape) == 3:  # If the image has color channels
@@ -1,64 +1,58 @@
 import cv2
+import fitz  # PyMuPDF
 import numpy as np
 from pathlib import Path
-from core.pdf.pdf_to_image_converter import pdf_to_image
 
+from core.image.buffers import pixmap_to_array
 
-def crop_pdf_sections(pdf_path: Path, output_dir: Path, dpi: int = 400):
-    """
-    Convert PDF to a high-resolution image, crop regions (photo, barcode, QR),
-    and return them as NumPy arrays (high quality, no saving).
-    """
-
-    # 1️⃣ Convert PDF to image at high DPI
-    image_path = pdf_to_image(pdf_path, output_dir, dpi=dpi)
-
-    # 2️⃣ Load image using OpenCV
-    img = cv2.imread(str(image_path))
-    if img is None:
-        raise ValueError(f"Image not found at {image_path}")
-
-    # 3️⃣ Define crop coordinates (x1, y1, x2, y2)
-    photo_coords = (2445, 670, 2810, 1130)
-    barcode_coords = (2400, 1610, 2845, 1740)
-    qrcode_coords = (2290, 2000, 3000, 2700)
-    fin_code_coords = (2640, 2730, 3000, 2790)
-    # Adjust for DPI scaling if needed
-    base_dpi = 200
-    scale = dpi / base_dpi
-
+# Crop regions (x1, y1, x2, y2) in page pixels at 400 DPI
+CROP_DPI = 400
+CROP_REGIONS = {
+    "photo": (2445, 670, 2810, 1130),
+    "barcode": (2400, 1610, 2845, 1740),
+    "qrcode": (2290, 2000, 3000, 2700),
+    "fin_code": (2640, 2730, 3000, 2790),
+}
 
 
-    # 3️⃣ Crop each section
-    def crop_section(coords):
-        x1, y1, x2, y2 = coords
-        return img[y1:y2, x1:x2]
-
-    photo = crop_section(photo_coords)
-    barcode = crop_section(barcode_coords)
-    qrcode = crop_section(qrcode_coords)
-    fin_code = crop_section(fin_code_coords)
-    
-    # 4️⃣ Optional enhancement for clarity
-    def enhance(img_section):
-        if img_section is None or img_section.size == 0:
-            return img_section
-        gaussian = cv2.GaussianBlur(img_section, (0, 0), 2)
-        return cv2.addWeighted(img_section, 1.5, gaussian, -0.5, 0)
-
-    photo = enhance(photo)
-    barcode = enhance(barcode)
-    qrcode = enhance(qrcode)
-    fin_code = enhance(fin_code)
+def render_page(pdf_path: Path, dpi: int = CROP_DPI) -> np.ndarray:
+    """
+    Render the first page straight into an RGB array (see core.image.buffers),
+    without a PNG encode/decode.
 
+    The whole page is rendered on purpose: MuPDF picks the image subsampling
+    from the area drawn, so clipped renders of the regions come out different.
+    """
+    with fitz.open(pdf_path) as pdf:
+        page = pdf.load_page(0)
+        zoom = dpi / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return pixmap_to_array(pix)
 
 
-    return {
-        "photo": photo,
-        "barcode": barcode,
-        "qrcode": qrcode,
-        "fin_code": fin_code,
-        "small_image":photo
-    }
+def enhance(img_section):
+    """Unsharp mask for clarity (per channel, so any channel order)."""
+    if img_section is None or img_section.size == 0:
+        return img_section
+    gaussian = cv2.GaussianBlur(img_section, (0, 0), 2)
+    return cv2.addWeighted(img_section, 1.5, gaussian, -0.5, 0)
 
 
+def crop_pdf_sections(pdf_path: Path, output_dir: Path = None, dpi: int = CROP_DPI):
+    """
+    Render the first page at high DPI, crop the photo, barcode, QR and FIN
+    regions and return them as sharpened RGB NumPy arrays (high quality, no saving).
+    `output_dir` is unused (kept for callers that pass a scratch directory).
+    """
+    # 1️⃣ Render the page in memory
+    img = render_page(pdf_path, dpi)
+
+    # 2️⃣ Crop and sharpen each section (coordinates are page pixels at CROP_DPI)
+    scale = dpi / CROP_DPI
+    crops = {}
+    for name, coords in CROP_REGIONS.items():
+        x1, y1, x2, y2 = (round(c * scale) for c in coords)
+        crops[name] = enhance(img[y1:y2, x1:x2])
+
+    crops["small_image"] = crops["photo"]
+    return crops
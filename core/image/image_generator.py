@@ -1,16 +1,13 @@
 from PIL import Image, ImageDraw, ImageFont
-import cv2
-import numpy as np
+from functools import lru_cache
 from pathlib import Path
 from datetime import date
 from io import BytesIO
 
 from app.config import BASE_DIR
-from core.image.image_crop import crop_pdf_sections
-from core.pdf.pdf_data_extractor import extract_user_data  # Your OCR/text extraction function
-from core.pdf.images_from_pdf import extract_images_from_pdf
-from core.image.image_black_and_white_conv import get_grayscale_image
-from core.image.image_bg_remove import get_image_without_bg
+
+# NOTE: cv2, numpy, PyMuPDF, camelot/pdfplumber and rembg are imported inside the
+# functions that use them. Importing them here made `import app.main` take seconds.
 # ======================
 # 🔹 Constants and Paths
 # ======================
@@ -48,6 +45,144 @@ TEMPLATE_FIELDS = {
     "barcode": {"type": "image", "coords": (612, 524, 910, 608)},
 }
 
+# How each image field is resampled into its box (see resize_field):
+# "smooth": the quality tier's filter (LANCZOS, or BILINEAR for "minimal")
+# "area":   area-averaged (BOX) when shrinking, else smooth
+# "crisp":  nearest-neighbour up to a whole multiple, then area-averaged down to the box:
+#           hard module edges that still land where they should at any ratio
+# The barcode and FIN are crops of the rendered page whose anti-aliased edges carry the
+# bar positions, so they must not go through nearest-neighbour; the QR code is a bitmap.
+IMAGE_RESAMPLING = {
+    "photo": "smooth",
+    "small_image": "smooth",
+    "qrcode": "crisp",
+    "barcode": "smooth",
+    "fin_code": "area",
+}
+
+# Vertical issue dates: (date key, anchor in template pixels, font size in template pixels)
+ISSUE_DATE_FIELDS = (
+    ("date_of_issue_greg", (155, 290), 20),
+    ("date_of_issue_eth", (155, 520), 20),
+)
+
+# Render quality tiers, best first. Lower tiers trade fidelity for speed under load
+# (the tier is picked per job, see services/quality.py).
+QUALITY_TIERS = {
+    # 2x supersampled canvas, neural background removal, optimized PNG
+    "full": {"supersample": 2, "bg_removal": "neural", "resample": Image.Resampling.LANCZOS, "optimize_png": True},
+    # Drawn at final size, lightweight background-removal model, fast PNG encoding
+    "reduced": {"supersample": 1, "bg_removal": "fast", "resample": Image.Resampling.LANCZOS, "optimize_png": False},
+    # As reduced, without background removal and with cheaper resampling
+    "minimal": {"supersample": 1, "bg_removal": None, "resample": Image.Resampling.BILINEAR, "optimize_png": False},
+}
+
+# Output resolution profiles. The template, TEMPLATE_FIELDS and the font sizes are
+# designed at TEMPLATE_DPI and scaled together by dpi / TEMPLATE_DPI; crop_dpi is
+# what the PDF page is rendered at for the photo / barcode / QR / FIN crops.
+TEMPLATE_DPI = 300
+RESOLUTION_PROFILES = {
+    # Phone screens and previews: a quarter of the pixels
+    "screen": {"dpi": 150, "crop_dpi": 200, "label": "Screen"},
+    # The standard card (2480x727)
+    "print": {"dpi": 300, "crop_dpi": 400, "label": "Print"},
+    # Professional printers: four times the pixels, sharper text, barcode and FIN
+    "print_hq": {"dpi": 600, "crop_dpi": 800, "label": "Print HQ"},
+}
+DEFAULT_RESOLUTION = "print"
+
+
+def resolution_scale(resolution: str = DEFAULT_RESOLUTION) -> float:
+    """Card pixels of `resolution` per template pixel."""
+    return RESOLUTION_PROFILES[resolution]["dpi"] / TEMPLATE_DPI
+
+
+# ======================
+# 🔹 Cached Resources
+# ======================
+@lru_cache(maxsize=None)
+def load_template(mode: str = "RGB", dpi: int = TEMPLATE_DPI) -> Image.Image:
+    """
+    Load the base template once per process, mode and DPI (callers must not draw on it).
+    mode="L" is the 8-bit grayscale template used by the B&W pipeline.
+    """
+    if dpi != TEMPLATE_DPI:
+        template = load_template(mode)
+        size = (round(template.width * dpi / TEMPLATE_DPI), round(template.height * dpi / TEMPLATE_DPI))
+        return template.resize(size, Image.Resampling.LANCZOS)
+    if not TEMPLATE_PATH.exists():
+        raise FileNotFoundError(f"Template not found at {TEMPLATE_PATH}")
+    with Image.open(TEMPLATE_PATH) as img:
+        template = img.convert("RGB")
+    if mode == "L":
+        from core.image.image_black_and_white_conv import get_grayscale_image
+        template = Image.fromarray(get_grayscale_image(template))
+    return template
+
+
+@lru_cache(maxsize=None)
+def load_font(font_path: str, size: int):
+    """Load a TrueType font once per (path, size). Returns None if it can't be loaded."""
+    try:
+        return ImageFont.truetype(font_path, size)
+    except Exception as e:
+        print(f"[Warning] Failed to load font {font_path}: {e}")
+        return None
+
+
+def warm_up(
+    font_amharic: str = FONT_AMHARIC_DEFAULT,
+    font_english: str = FONT_ENGLISH_DEFAULT,
+    font_size: int = 24,
+    scale: int = 2,
+) -> dict:
+    """
+    Preload everything the first render would otherwise pay for: the heavy
+    libraries, the background-removal model, the fonts and the template.
+    Returns the time spent on each step in seconds.
+    """
+    import time
+
+    timings = {}
+
+    def step(name, fn):
+        start = time.perf_counter()
+        fn()
+        timings[name] = round(time.perf_counter() - start, 3)
+
+    def import_libraries():
+        import core.image.image_crop  # noqa: F401  (cv2, PyMuPDF)
+        import core.pdf.pdf_data_extractor  # noqa: F401  (camelot, pandas, pdfplumber)
+        import core.pdf.images_from_pdf  # noqa: F401
+
+    def load_fonts():
+        load_font(font_amharic, font_size * scale)
+        load_font(font_english, font_size * scale)
+        load_font(font_english, 20 * scale)  # vertical issue dates
+
+    def compile_plans():
+        # Same positional arguments as render_card_image, so the cached plans are the ones it uses
+        for quality in QUALITY_TIERS:
+            compile_render_plan(quality, DEFAULT_RESOLUTION, font_amharic, font_english, font_size, 1)
+
+    def load_bg_model():
+        from core.image.image_bg_remove import get_bg_session
+        get_bg_session()
+
+    def load_fast_bg_model():
+        from app.config import settings
+        from core.image.image_bg_remove import get_bg_session
+        get_bg_session(settings.BG_REMOVAL_FAST_MODEL)
+
+    step("imports", import_libraries)
+    step("template", lambda: (load_template("RGB"), load_template("L")))
+    step("fonts", load_fonts)
+    step("render_plans", compile_plans)
+    step("bg_model", load_bg_model)
+    step("bg_model_fast", load_fast_bg_model)
+    return timings
+
+
 # ======================
 # 🔹 Helper Functions
 # ======================
@@ -78,21 +213,31 @@ def draw_bold_text(draw, position, text, font, fill=(0, 0, 0), boldness=1):
             draw.text((x + dx, y + dy), text, font=font, fill=fill)
 
 
+def resize_field(img: Image.Image, size: tuple[int, int], policy: str, smooth=Image.Resampling.LANCZOS) -> Image.Image:
+    """Resize an image field into its box following its IMAGE_RESAMPLING policy."""
+    width, height = size
+    shrinking = width * height < img.width * img.height
+    if policy == "crisp":
+        fx, fy = -(-width // img.width), -(-height // img.height)
+        if fx > 1 or fy > 1:
+            img = img.resize((img.width * fx, img.height * fy), Image.Resampling.NEAREST)
+        return img if img.size == size else img.resize(size, Image.Resampling.BOX)
+    if policy == "area" and shrinking:
+        return img.resize(size, Image.Resampling.BOX)
+    return img.resize(size, smooth)
+
+
 def draw_vertical_text(base_img, position, text, font_path, font_size=22, fill=(0, 0, 0), boldness=1, scale=1):
-    """Draw sharp vertical text (rotated upward) using supersampling."""
-    try:
-        font = ImageFont.truetype(font_path, font_size * scale)
-    except Exception as e:
-        print(f"[Warning] Failed to load vertical text font: {e}")
-        font = ImageFont.load_default()
+    """Draw sharp vertical text (rotated upward) using supersampling. `scale` may be fractional."""
+    font = load_font(font_path, round(font_size * scale)) or ImageFont.load_default()
 
     # Make a transparent canvas for the text
-    text_img = Image.new("RGBA", (500 * scale, 100 * scale), (255, 255, 255, 0))
+    text_img = Image.new("RGBA", (round(500 * scale), round(100 * scale)), (255, 255, 255, 0))
     text_draw = ImageDraw.Draw(text_img)
 
     # Draw bold text
-    for dx in range(boldness * scale + 1):
-        for dy in range(boldness * scale + 1):
+    for dx in range(round(boldness * scale) + 1):
+        for dy in range(round(boldness * scale) + 1):
             text_draw.text((dx, dy), text, font=font, fill=fill)
 
     # Rotate upward
@@ -100,163 +245,351 @@ def draw_vertical_text(base_img, position, text, font_path, font_size=22, fill=(
 
     # Paste upward relative to the position
     x, y = position
-    x *= scale
-    y *= scale
+    x = round(x * scale)
+    y = round(y * scale)
     base_img.paste(rotated, (x, y - rotated.height), rotated)
 
 
 # ======================
-# 🔹 Main Function
+# 🔹 Pipeline Stages
 # ======================
-def generate_final_id_image(
-    pdf_path: Path,
-    output_dir: Path,
-    font_amharic: str = FONT_AMHARIC_DEFAULT,
-    font_english: str = FONT_ENGLISH_DEFAULT,
-    font_size: int = 24,
-    boldness: int = 1,
-    color : bool = True
-) -> bytes:
-    """Generate a final sharp ID image (PNG bytes) from PDF data."""
+def issue_dates(today: date = None) -> dict:
+    """Issue and expiry dates (Gregorian and Ethiopian) for a card issued `today`."""
+    today = today or date.today()
+    e_year, e_month, e_day = gregorian_to_ethiopian(today.year, today.month, today.day)
+    expiry_eth_date = f"{e_day:02d}/{e_month:02d}/{e_year + 8}"
+    expiry_date_greg = f"{today.day:02d}/{today.month:02d}/{today.year + 8}"
+    return {
+        "date_of_issue_greg": f"{today.day:02d}/{today.month:02d}/{today.year}",
+        "date_of_issue_eth": f"{e_day:02d}/{e_month:02d}/{e_year}",
+        "expiry_date": f"{expiry_eth_date} | {expiry_date_greg}",
+    }
+
+
+def parse_card_sources(pdf_path: Path, output_dir: Path, crop_dpi: int = 400) -> dict:
+    """
+    The raw material of a card: the cropped regions (page rendered at
+    `crop_dpi`, see RESOLUTION_PROFILES), the embedded images and the text
+    fields. Independent of colour and quality, so one parse can feed several
+    cards (e.g. a quick preview, then the full-quality card).
+    """
+    from core.image.image_crop import crop_pdf_sections
+    from core.pdf.pdf_data_extractor import extract_user_data
+    from core.pdf.images_from_pdf import extract_images_from_pdf
+
     try:
-        # 1️⃣ Extract cropped images and text
-        image_crops = crop_pdf_sections(pdf_path, output_dir, dpi=400)
-        second_images = extract_images_from_pdf(pdf_path)
-        text_data = extract_user_data(pdf_path)
+        return {
+            "crops": crop_pdf_sections(pdf_path, output_dir, dpi=crop_dpi),
+            "images": extract_images_from_pdf(pdf_path),
+            "text": extract_user_data(pdf_path),
+        }
     except Exception as e:
         raise RuntimeError(f"Error extracting data from PDF: {e}")
 
+
+def build_card(sources: dict, color: bool = True, quality: str = "full", today: date = None, resolution: str = DEFAULT_RESOLUTION) -> dict:
+    """
+    Turn parsed sources (see parse_card_sources) into card data: text fields,
+    plus every image field as a PIL image ready to be placed (background removed
+    from the photo). With color=False every image is already 8-bit grayscale
+    ("L", or "LA" for the cut-out photo). `quality` (see QUALITY_TIERS) picks the
+    background removal; it is kept on the card for the renderers, like
+    `resolution` (see RESOLUTION_PROFILES). `today` fixes the issue date
+    (default: the real today). `sources` is left untouched.
+    """
+    from core.image.buffers import to_pil
+    from core.image.image_bg_remove import get_image_without_bg
+
+    image_crops = dict(sources["crops"])
+    second_images = sources["images"]
+    text_data = sources["text"]
+
+    def as_rgba(photo):
+        return to_pil(photo).convert("RGBA")
+
     # --- OPTIMIZATION: Process photo once and reuse ---
     raw_photo = second_images.get("photo")
     processed_photo = None
-    if raw_photo is not None:
+    bg_removal = QUALITY_TIERS[quality]["bg_removal"]
+    if raw_photo is not None and bg_removal is None:
+        processed_photo = as_rgba(raw_photo)
+    elif raw_photo is not None:
         try:
             # Remove BG ONCE
-            processed_photo = get_image_without_bg(raw_photo)
+            processed_photo = get_image_without_bg(raw_photo, fast=bg_removal == "fast")
             
-            # Apply grayscale if needed (common for both)
-            if not color:
-                alpha = processed_photo.getchannel('A')
-                processed_photo = processed_photo.convert('L').convert('RGBA')
-                processed_photo.putalpha(alpha)
         except Exception as e:
             print(f"[Warning] Background removal failed, using raw photo: {e}")
-            if isinstance(raw_photo, np.ndarray):
-                processed_photo = Image.fromarray(cv2.cvtColor(raw_photo, cv2.COLOR_BGR2RGB)).convert("RGBA")
-            else:
-                processed_photo = raw_photo.convert("RGBA")
+            processed_photo = as_rgba(raw_photo)
 
     image_crops["photo"] = processed_photo
     image_crops["small_image"] = processed_photo
     image_crops["qrcode"] = second_images.get("qrcode")
-    
-    # 2️⃣ Load base template
-    template_img = cv2.imread(str(TEMPLATE_PATH))
-    if template_img is None:
-        raise FileNotFoundError(f"Template not found at {TEMPLATE_PATH}")
-    img_pil = Image.fromarray(cv2.cvtColor(template_img, cv2.COLOR_BGR2RGB))
 
-    # 3️⃣ Supersampled drawing canvas
-    scale = 2
-    w, h = img_pil.size
-    img_large = img_pil.resize((w * scale, h * scale), Image.Resampling.LANCZOS)
-    draw_large = ImageDraw.Draw(img_large)
+    # Convert the remaining crops (QR code, barcode, FIN) to PIL once
+    images = {}
+    for key, field in TEMPLATE_FIELDS.items():
+        if field["type"] != "image" or image_crops.get(key) is None:
+            continue
+        crop_img = image_crops[key]
+        try:
+            if key in ("photo", "small_image"):
+                images[key] = crop_img  # Already processed above!
+            elif isinstance(crop_img, Image.Image):
+                images[key] = crop_img.convert("RGBA")
+            elif crop_img.size == 0:
+                continue
+            else:
+                # Arrays are RGB already (core.image.buffers): straight to PIL
+                images[key] = to_pil(crop_img)
+        except Exception as e:
+            print(f"[Warning] Could not convert {key}: {e}")
 
-    # Load fonts
-    try:
-        font_am_large = ImageFont.truetype(font_amharic, font_size * scale)
-    except Exception as e:
-        print(f"[Warning] Failed to load Amharic font: {e}")
-        font_am_large = ImageFont.load_default()
-    try:
-        font_en_large = ImageFont.truetype(font_english, font_size * scale)
-    except Exception as e:
-        print(f"[Warning] Failed to load English font: {e}")
-        font_en_large = font_am_large
+    card = {
+        "text": text_data, "images": images, "dates": issue_dates(today),
+        "color": True, "quality": quality, "resolution": resolution,
+    }
+    return card if color else grayscale_card(card)
 
-    # 4️⃣ Generate date data
-    today = date.today()
-    e_year, e_month, e_day = gregorian_to_ethiopian(today.year, today.month, today.day)
-    date_of_issue_greg = f"{today.day:02d}/{today.month:02d}/{today.year}"
-    date_of_issue_eth = f"{e_day:02d}/{e_month:02d}/{e_year}"
-    expiry_eth_date = f"{e_day:02d}/{e_month:02d}/{e_year + 8}"
-    expiry_date_greg = f"{today.day:02d}/{today.month:02d}/{today.year + 8}"
-    text_data["expiry_date"] = f"{expiry_eth_date} | {expiry_date_greg}"
 
-    # 5️⃣ Draw text fields
-    for key, field in TEMPLATE_FIELDS.items():
-        if field["type"] != "text" or key not in text_data:
-            continue
+def grayscale_card(card: dict) -> dict:
+    """
+    The B&W card data of a colour card (see build_card): every image as 8-bit
+    grayscale, "LA" for the cut-out photo (its alpha kept). Nothing is parsed or
+    cut out again, so one parse can give both variants. `card` is left untouched.
+    """
+    from core.image.image_black_and_white_conv import get_grayscale_image
 
-        text_to_draw = str(text_data[key])
-        font_use = font_am_large if field.get("lang") == "am" else font_en_large
-        x, y = field["coords"]
-        x *= scale
-        y *= scale
+    images, converted = {}, {}  # converted: the photo and small_image are one image
+    for key, img in card["images"].items():
+        try:
+            if id(img) not in converted:
+                gray = Image.fromarray(get_grayscale_image(img))
+                if key in ("photo", "small_image"):
+                    gray = Image.merge("LA", (gray, img.getchannel("A")))
+                converted[id(img)] = gray
+            images[key] = converted[id(img)]
+        except Exception as e:
+            print(f"[Warning] Could not convert {key}: {e}")
+    return dict(card, images=images, color=False)
 
-        # Handle combined or special fields
-        if key == "sex_en":
-            am_text = text_data.get("sex_am", "")
-            am_width = draw_large.textlength(am_text, font=font_am_large)
-            x = (TEMPLATE_FIELDS["sex_am"]["coords"][0] * scale) + am_width + 10
-            text_to_draw = "| " + text_to_draw
-        elif key == "date_of_birth_greg":
-            continue
-        elif key == "date_of_birth_et" and "date_of_birth_greg" in text_data:
-            text_to_draw = f"{text_data['date_of_birth_et']} | {text_data['date_of_birth_greg']}"
-            font_use = font_en_large
 
-        draw_bold_text(draw_large, (x, y), text_to_draw, font_use, boldness=boldness * scale)
+def grayscale_card_image(img: Image.Image) -> Image.Image:
+    """
+    The B&W card ("L") of a rendered colour card. Grayscale is a weighted sum of
+    the channels, so converting the finished card matches drawing the B&W card
+    data (see grayscale_card) to within rounding at the photo's soft edges, for
+    a fraction of the drawing time.
+    """
+    from core.image.image_black_and_white_conv import get_grayscale_image
+
+    return Image.fromarray(get_grayscale_image(img))
 
-    # 6️⃣ Paste cropped images
+
+def extract_card_data(pdf_path: Path, output_dir: Path, color: bool = True, quality: str = "full", resolution: str = DEFAULT_RESOLUTION) -> dict:
+    """
+    Parse the PDF and build its card data in one go (see parse_card_sources and
+    build_card). The result feeds any of the renderers (PNG card, vector PDF, A4 sheets).
+    """
+    sources = parse_card_sources(pdf_path, output_dir, RESOLUTION_PROFILES[resolution]["crop_dpi"])
+    return build_card(sources, color=color, quality=quality, resolution=resolution)
+
+
+@lru_cache(maxsize=None)
+def compile_render_plan(
+    quality: str = "full",
+    resolution: str = DEFAULT_RESOLUTION,
+    font_amharic: str = FONT_AMHARIC_DEFAULT,
+    font_english: str = FONT_ENGLISH_DEFAULT,
+    font_size: int = 24,
+    boldness: int = 1,
+) -> dict:
+    """
+    Compile TEMPLATE_FIELDS once per quality tier, resolution and font setup into
+    an ordered render plan (cached; do not mutate it). Every slot carries what
+    the per-card loop would otherwise work out again: its position in canvas
+    pixels, its font and boldness or its resampling filters, and the rule for
+    composite fields. Slots, in drawing order:
+
+    - "text": `key` from the card's `source` ("text", or "dates" for the expiry
+      date) at `xy`; `join` appends another text field after " | " (drawn in
+      `join_font`); `after` places it `gap` pixels right of another field's text
+      (measured in `after_font`) with `prefix` in front.
+    - "image": the card image `key` resized into `box` with its `resample`
+      policy (see IMAGE_RESAMPLING; `smooth` is the tier's filter) and pasted
+      there, through its alpha if it has one.
+    - "vertical": the issue date `key` drawn upward from `xy`.
+    """
+    tier = QUALITY_TIERS[quality]
+    supersample = tier["supersample"]
+    scale = resolution_scale(resolution) * supersample  # template pixels -> canvas pixels
+    font_am = load_font(font_amharic, round(font_size * scale)) or ImageFont.load_default()
+    font_en = load_font(font_english, round(font_size * scale)) or font_am
+    bold = max(1, round(boldness * scale)) if boldness else 0
+
+    def at_scale(coords):
+        return tuple(round(c * scale) for c in coords)
+
+    slots = []
     for key, field in TEMPLATE_FIELDS.items():
-        if field["type"] != "image" or key not in image_crops:  
+        if field["type"] != "text" or key == "date_of_birth_greg":  # drawn with date_of_birth_et
             continue
-        crop_img = image_crops[key]
-        if crop_img is None: # Photo could be None if missing in PDF
+        slot = {
+            "kind": "text", "key": key, "source": "dates" if key == "expiry_date" else "text",
+            "xy": at_scale(field["coords"]), "font": font_am if field.get("lang") == "am" else font_en, "bold": bold,
+        }
+        if key == "sex_en":
+            slot.update(
+                after="sex_am", after_font=font_am, prefix="| ",
+                xy=(TEMPLATE_FIELDS["sex_am"]["coords"][0] * scale, slot["xy"][1]), gap=5 * scale,
+            )
+        elif key == "date_of_birth_et":
+            slot.update(join="date_of_birth_greg", join_font=font_en)
+        slots.append(slot)
+
+    for key, field in TEMPLATE_FIELDS.items():
+        if field["type"] != "image":
             continue
-            
-        try:
-            pil_crop = None
+        slots.append({
+            "kind": "image", "key": key, "box": at_scale(field["coords"]),
+            "resample": IMAGE_RESAMPLING[key], "smooth": tier["resample"],
+        })
 
-            # --- 1. Use already processed photo/small_image OR process other images ---
-            if key == "photo" or key == "small_image":
-                # Already processed above!
-                pil_crop = crop_img
-            else:
-                # For other image types (QR code, etc.), just convert to PIL
-                if isinstance(crop_img, np.ndarray):
-                    if crop_img.size == 0: continue
-                    pil_crop = Image.fromarray(cv2.cvtColor(crop_img, cv2.COLOR_BGR2RGB))
-                else:
-                    pil_crop = crop_img.convert("RGBA")
+    for key, xy, size in ISSUE_DATE_FIELDS:
+        slots.append({"kind": "vertical", "key": key, "xy": xy, "font_path": font_english, "font_size": size, "scale": scale})
 
-            if pil_crop is None: continue
+    return {"dpi": RESOLUTION_PROFILES[resolution]["dpi"], "supersample": supersample, "slots": tuple(slots)}
 
-            # --- 2. RESIZE ---
-            x1, y1, x2, y2 = field["coords"]
-            target_w, target_h = (x2 - x1) * scale, (y2 - y1) * scale
-            pil_crop = pil_crop.resize((target_w, target_h), Image.Resampling.LANCZOS)
 
-            # --- 3. PASTE ---
-            if pil_crop.mode == "RGBA":
-                # Use alpha as mask
-                img_large.paste(pil_crop, (x1 * scale, y1 * scale), pil_crop)
-            else:
-                # No transparency (e.g., barcode)
-                img_large.paste(pil_crop, (x1 * scale, y1 * scale))
+def render_card_image(
+    card: dict,
+    font_amharic: str = FONT_AMHARIC_DEFAULT,
+    font_english: str = FONT_ENGLISH_DEFAULT,
+    font_size: int = 24,
+    boldness: int = 1,
+) -> Image.Image:
+    """
+    Draw parsed card data onto the template by executing its render plan (see
+    compile_render_plan). Returns the final card image: RGB for colour cards,
+    8-bit "L" for B&W (drawn and composited in L throughout).
+    Supersampling and resampling follow the card's quality tier; the size, the
+    field geometry and `font_size` (in template pixels) follow its resolution.
+    """
+    plan = compile_render_plan(
+        card.get("quality", "full"), card.get("resolution", DEFAULT_RESOLUTION),
+        font_amharic, font_english, font_size, boldness,
+    )
+    sources = {"text": card["text"], "dates": card["dates"]}
+    image_crops = card["images"]
+    mode = "RGB" if card.get("color", True) else "L"
+    ink = (0, 0, 0) if mode == "RGB" else 0
+
+    # 2️⃣ Load base template at the card's DPI (cached; resize/copy below makes our own copy)
+    img_pil = load_template(mode, plan["dpi"])
 
-        except Exception as e:
-            print(f"[Warning] Could not paste {key}: {e}")
+    # 3️⃣ Supersampled drawing canvas
+    supersample = plan["supersample"]
+    w, h = img_pil.size
+    if supersample == 1:
+        img_large = img_pil.copy()
+    else:
+        img_large = img_pil.resize((w * supersample, h * supersample), Image.Resampling.LANCZOS)
+    draw_large = ImageDraw.Draw(img_large)
 
-    # 7️⃣ Draw vertical date text (both)
-    draw_vertical_text(img_large, (155, 290), date_of_issue_greg, font_english, 20, boldness=1, scale=scale)
-    draw_vertical_text(img_large, (155, 520), date_of_issue_eth, font_english, 20, boldness=1, scale=scale)
+    for slot in plan["slots"]:
+        kind, key = slot["kind"], slot["key"]
+
+        # 4️⃣ Text fields, composite ones per their rule
+        if kind == "text":
+            values = sources[slot["source"]]
+            if key not in values:
+                continue
+            text_to_draw, font_use = str(values[key]), slot["font"]
+            x, y = slot["xy"]
+            if "after" in slot:
+                x = x + draw_large.textlength(values.get(slot["after"], ""), font=slot["after_font"]) + slot["gap"]
+                text_to_draw = slot["prefix"] + text_to_draw
+            elif "join" in slot and slot["join"] in values:
+                text_to_draw = f"{text_to_draw} | {values[slot['join']]}"
+                font_use = slot["join_font"]
+            draw_bold_text(draw_large, (x, y), text_to_draw, font_use, fill=ink, boldness=slot["bold"])
+
+        # 5️⃣ Images, resized with the field's own filter
+        elif kind == "image":
+            crop = image_crops.get(key)
+            if crop is None:
+                continue
+            try:
+                x1, y1, x2, y2 = slot["box"]
+                pil_crop = resize_field(crop, (x2 - x1, y2 - y1), slot["resample"], slot["smooth"])
+                if pil_crop.mode in ("RGBA", "LA"):
+                    # Use alpha as mask
+                    img_large.paste(pil_crop, (x1, y1), pil_crop)
+                else:
+                    # No transparency (e.g., barcode)
+                    img_large.paste(pil_crop, (x1, y1))
+            except Exception as e:
+                print(f"[Warning] Could not paste {key}: {e}")
+
+        # 6️⃣ Vertical issue dates
+        else:
+            draw_vertical_text(
+                img_large, slot["xy"], sources["dates"][key], slot["font_path"], slot["font_size"],
+                boldness=1, scale=slot["scale"],
+            )
+
+    # 7️⃣ Downscale with LANCZOS to preserve sharpness
+    if supersample == 1:
+        return img_large
+    return img_large.resize((w, h), Image.Resampling.LANCZOS)
+
+
+def encode_png(img: Image.Image, bilevel: bool = False, optimize: bool = True, dpi: int = TEMPLATE_DPI) -> bytes:
+    """
+    9️⃣ High-quality PNG bytes, tagged with `dpi` (the card's resolution profile).
+    bilevel=True dithers (Floyd-Steinberg) to a 1-bit PNG for laser printers.
+    optimize=False trades size for speed (fastest zlib level, no optimizer pass).
+    """
+    if bilevel:
+        img = img.convert("1")
+    buffer = BytesIO()
+    if optimize:
+        img.save(buffer, format="PNG", optimize=True, dpi=(dpi, dpi))
+    else:
+        img.save(buffer, format="PNG", compress_level=1, dpi=(dpi, dpi))
+    return buffer.getvalue()
 
-    # 8️⃣ Downscale with LANCZOS to preserve sharpness
-    img_final = img_large.resize((w, h), Image.Resampling.LANCZOS)
 
-    # 9️⃣ Return as high-quality PNG bytes
+def encode_preview(img: Image.Image, max_width: int = 1280, jpeg_quality: int = 70) -> bytes:
+    """Small JPEG of a card for the instant preview (not meant for printing)."""
+    if img.width > max_width:
+        img = img.resize((max_width, round(img.height * max_width / img.width)), Image.Resampling.BILINEAR)
     buffer = BytesIO()
-    img_final.save(buffer, format="PNG", optimize=True, dpi=(300, 300))
+    img.save(buffer, format="JPEG", quality=jpeg_quality)
     return buffer.getvalue()
+
+
+# ======================
+# 🔹 Main Function
+# ======================
+def generate_final_id_image(
+    pdf_path: Path,
+    output_dir: Path,
+    font_amharic: str = FONT_AMHARIC_DEFAULT,
+    font_english: str = FONT_ENGLISH_DEFAULT,
+    font_size: int = 24,
+    boldness: int = 1,
+    color : bool = True,
+    bilevel: bool = False,
+    quality: str = "full",
+    resolution: str = DEFAULT_RESOLUTION,
+) -> bytes:
+    """
+    Generate a final sharp ID image (PNG bytes) from PDF data.
+    color=False renders a grayscale PNG; add bilevel=True for a dithered 1-bit PNG.
+    quality picks one of QUALITY_TIERS, resolution one of RESOLUTION_PROFILES.
+    """
+    card = extract_card_data(pdf_path, output_dir, color=color, quality=quality, resolution=resolution)
+    img_final = render_card_image(card, font_amharic, font_english, font_size, boldness)
+    dpi = RESOLUTION_PROFILES[resolution]["dpi"]
+    return encode_png(img_final, bilevel=bilevel and not color, optimize=QUALITY_TIERS[quality]["optimize_png"], dpi=dpi)
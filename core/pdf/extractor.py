@@ -1,23 +1,36 @@
 # core/pdf/extractor.py
-import fitz  # PyMuPDF
 from typing import Dict, Any
 
 def get_pdf_metadata(pdf_bytes: bytes) -> Dict[str, Any]:
     """
-    Extract PDF metadata including page count from PDF bytes
+    Extract PDF metadata including page count from PDF bytes.
+    Also reports the first page size (points) and the embedded images
+    (width, height) so callers can estimate the cost of rendering it.
     """
+    import fitz  # PyMuPDF (imported lazily to keep app startup fast)
+
     try:
-        # Open PDF from bytes
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page_count = len(pdf_document)
-        pdf_document.close()
-        
+        # Open PDF from bytes (closed even if reading it fails)
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_document:
+            page_count = len(pdf_document)
+
+            page_width = page_height = 0.0
+            images = []
+            if page_count:
+                page = pdf_document[0]
+                page_width, page_height = page.rect.width, page.rect.height
+                # (xref, smask, width, height, ...) - read from the object dict, nothing is decoded
+                images = [(img[2], img[3]) for img in page.get_images(full=True)]
+
         return {
-            "page_count": page_count
+            "page_count": page_count,
+            "page_width": page_width,
+            "page_height": page_height,
+            "images": images,
         }
-        
+
     except Exception as e:
         # Return default in case of error
         return {
             "page_count": 0
-        }
\ No newline at end of file
+        }
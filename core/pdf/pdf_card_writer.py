@@ -0,0 +1,223 @@
+# core/pdf/pdf_card_writer.py
+"""
+Vector, print-ready PDF output.
+
+Instead of rasterising the whole card, the template is embedded once per
+document as a shared image, the text fields are drawn as real text with the
+fonts embedded (and subset), and the photo / QR / barcode / FIN images are
+embedded once per card, however many times they are placed.
+"""
+import io
+from functools import lru_cache
+from PIL import Image
+
+from core.image.image_generator import (
+    DEFAULT_RESOLUTION,
+    FONT_AMHARIC_DEFAULT,
+    FONT_ENGLISH_DEFAULT,
+    RESOLUTION_PROFILES,
+    TEMPLATE_DPI,
+    TEMPLATE_FIELDS,
+    load_template,
+)
+from core.image.a4_layout import (
+    A4_HEIGHT,
+    A4_WIDTH,
+    ID_FULL_HEIGHT,
+    ID_HALF_WIDTH,
+    ROWS_PER_PAGE,
+    TARGET_HEIGHT,
+)
+
+# Card pixels are 300 DPI; PDF user space is 72 points per inch
+PX_TO_PT = 72 / 300
+CARD_WIDTH = 2480
+
+# Template regions, in card pixels
+FULL_CARD = (0, 0, CARD_WIDTH, ID_FULL_HEIGHT)
+FRONT_HALF = (0, 0, ID_HALF_WIDTH, ID_FULL_HEIGHT)
+BACK_HALF = (ID_HALF_WIDTH, 0, CARD_WIDTH, ID_FULL_HEIGHT)
+
+
+@lru_cache(maxsize=None)
+def _template_jpeg(box: tuple, mode: str = "RGB", dpi: int = TEMPLATE_DPI) -> bytes:
+    """
+    JPEG of one template region ("RGB" or grayscale "L") at `dpi`, encoded once
+    per process. `box` is in card pixels (TEMPLATE_DPI) like the page layout.
+    """
+    buffer = io.BytesIO()
+    box = tuple(round(c * dpi / TEMPLATE_DPI) for c in box)
+    load_template(mode, dpi).crop(box).save(buffer, format="JPEG", quality=92, dpi=(dpi, dpi))
+    return buffer.getvalue()
+
+
+def _png_bytes(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", compress_level=6)
+    return buffer.getvalue()
+
+
+class CardPdfWriter:
+    """Builds one PDF from parsed card data (see `extract_card_data`)."""
+
+    def __init__(
+        self,
+        font_amharic: str = FONT_AMHARIC_DEFAULT,
+        font_english: str = FONT_ENGLISH_DEFAULT,
+        font_size: int = 24,
+        boldness: int = 1,
+    ):
+        import fitz  # PyMuPDF
+
+        self.fitz = fitz
+        self.doc = fitz.open()
+        self.font_files = {"am": font_amharic, "en": font_english}
+        self.fonts = {name: fitz.Font(fontfile=path) for name, path in self.font_files.items()}
+        self.font_size = font_size
+        self.boldness = boldness
+        # Shared images (template regions, per colour mode and DPI) keep their xref for the whole document
+        self._template_xrefs = {}
+
+    # --- Pages ---
+
+    def add_card_page(self, card: dict):
+        """One page the size of the card, laid out exactly like the PNG."""
+        page = self.doc.new_page(width=CARD_WIDTH * PX_TO_PT, height=ID_FULL_HEIGHT * PX_TO_PT)
+        self._draw_card(page, card, origin=(0, 0), scale=1.0, back_first=False)
+
+    def add_sheet_pages(self, cards: list[dict]):
+        """A4 pages with ROWS_PER_PAGE cards each, as [Back | Front] rows."""
+        # Keep the card's aspect ratio and centre the row (the PNG path stretches it)
+        scale = TARGET_HEIGHT / ID_FULL_HEIGHT
+        row_x = (A4_WIDTH - CARD_WIDTH * scale) / 2
+
+        for start in range(0, len(cards), ROWS_PER_PAGE):
+            page_cards = cards[start:start + ROWS_PER_PAGE]
+            page = self.doc.new_page(width=A4_WIDTH * PX_TO_PT, height=A4_HEIGHT * PX_TO_PT)
+            margin_y = (A4_HEIGHT - (len(page_cards) * TARGET_HEIGHT)) // (len(page_cards) + 1)
+            for j, card in enumerate(page_cards):
+                y_pos = margin_y + j * (TARGET_HEIGHT + margin_y)
+                self._draw_card(page, card, origin=(row_x, y_pos), scale=scale, back_first=True)
+
+    def tobytes(self) -> bytes:
+        self.doc.subset_fonts()
+        # No random file /ID: the same cards give the same bytes (see services.sent_files)
+        data = self.doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+        self.doc.close()
+        return data
+
+    # --- Drawing ---
+
+    def _draw_card(self, page, card: dict, origin: tuple, scale: float, back_first: bool):
+        fitz = self.fitz
+        ox, oy = origin
+        k = scale * PX_TO_PT  # card pixels -> page points
+
+        def to_page(x, y):
+            """Map a card pixel to page points, swapping halves for [Back | Front] rows."""
+            if back_first:
+                x = x - ID_HALF_WIDTH if x >= ID_HALF_WIDTH else x + ID_HALF_WIDTH
+            return fitz.Point((ox + x * scale) * PX_TO_PT, (oy + y * scale) * PX_TO_PT)
+
+        def to_rect(box):
+            x1, y1, x2, y2 = box
+            top_left = to_page(x1, y1)
+            return fitz.Rect(top_left, top_left + ((x2 - x1) * k, (y2 - y1) * k))
+
+        # 1️⃣ Template (embedded once per document; grayscale for B&W cards, at the card's DPI)
+        mode = "RGB" if card.get("color", True) else "L"
+        dpi = RESOLUTION_PROFILES[card.get("resolution", DEFAULT_RESOLUTION)]["dpi"]
+        regions = (BACK_HALF, FRONT_HALF) if back_first else (FULL_CARD,)
+        for box in regions:
+            xref = self._template_xrefs.get((box, mode, dpi), 0)
+            if xref:
+                page.insert_image(to_rect(box), xref=xref, keep_proportion=False)
+            else:
+                self._template_xrefs[(box, mode, dpi)] = page.insert_image(
+                    to_rect(box), stream=_template_jpeg(box, mode, dpi), keep_proportion=False
+                )
+
+        # 2️⃣ Images (each distinct image embedded once per card)
+        card_xrefs = {}
+        for key, field in TEMPLATE_FIELDS.items():
+            img = card["images"].get(key) if field["type"] == "image" else None
+            if img is None:
+                continue
+            try:
+                rect = to_rect(field["coords"])
+                xref = card_xrefs.get(id(img), 0)
+                if xref:
+                    page.insert_image(rect, xref=xref, keep_proportion=False)
+                else:
+                    card_xrefs[id(img)] = page.insert_image(rect, stream=_png_bytes(img), keep_proportion=False)
+            except Exception as e:
+                print(f"[Warning] Could not place {key} in PDF: {e}")
+
+        # 3️⃣ Text fields as vector text
+        for name, path in self.font_files.items():
+            page.insert_font(fontname=name, fontfile=path)
+
+        text_data = dict(card["text"])
+        text_data["expiry_date"] = card["dates"]["expiry_date"]
+        for key, field in TEMPLATE_FIELDS.items():
+            if field["type"] != "text" or key not in text_data or key == "date_of_birth_greg":
+                continue
+
+            text_to_draw = str(text_data[key])
+            font_name = "am" if field.get("lang") == "am" else "en"
+            x, y = field["coords"]
+
+            # Same combined/special fields as the PNG renderer
+            if key == "sex_en":
+                am_width = self.fonts["am"].text_length(text_data.get("sex_am", ""), fontsize=self.font_size)
+                x = TEMPLATE_FIELDS["sex_am"]["coords"][0] + am_width + 5
+                text_to_draw = "| " + text_to_draw
+            elif key == "date_of_birth_et" and "date_of_birth_greg" in text_data:
+                text_to_draw = f"{text_data['date_of_birth_et']} | {text_data['date_of_birth_greg']}"
+                font_name = "en"
+
+            self._draw_text(page, to_page, x, y, text_to_draw, font_name, self.font_size, k)
+
+        # 4️⃣ Vertical issue dates
+        self._draw_text(page, to_page, 155, 290, card["dates"]["date_of_issue_greg"], "en", 20, k, rotate=90)
+        self._draw_text(page, to_page, 155, 520, card["dates"]["date_of_issue_eth"], "en", 20, k, rotate=90)
+
+    def _draw_text(self, page, to_page, x, y, text, font_name, size_px, k, rotate=0):
+        """
+        Draw text whose top-left (PIL-style anchor) is at card pixel (x, y).
+        Boldness is emulated with a stroke instead of PIL's overdraw.
+        """
+        ascent = self.fonts[font_name].ascender * size_px
+        half_bold = self.boldness / 2
+        if rotate == 90:
+            # Text runs upward from (x, y); the baseline sits one ascent to the right
+            baseline = to_page(x + ascent + half_bold, y - half_bold)
+        else:
+            baseline = to_page(x + half_bold, y + ascent + half_bold)
+
+        page.insert_text(
+            baseline,
+            text,
+            fontname=font_name,
+            fontsize=size_px * k,
+            rotate=rotate,
+            fill=(0, 0, 0),
+            color=(0, 0, 0),
+            render_mode=2,
+            border_width=self.boldness / size_px,
+        )
+
+
+def build_card_pdf(cards: list[dict], layout: str = "card", **font_kwargs) -> bytes:
+    """
+    Render parsed cards to PDF bytes.
+    layout="card": one card-sized page per card.
+    layout="a4":   A4 sheets of [Back | Front] rows, ROWS_PER_PAGE per page.
+    """
+    writer = CardPdfWriter(**font_kwargs)
+    if layout == "a4":
+        writer.add_sheet_pages(cards)
+    else:
+        for card in cards:
+            writer.add_card_page(card)
+    return writer.tobytes()
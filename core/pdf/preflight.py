@@ -0,0 +1,100 @@
+# core/pdf/preflight.py
+"""
+Pre-flight check of an uploaded PDF, from its structure only (PyMuPDF, nothing
+decoded or rendered): a few milliseconds that decide whether the real render
+should run at all and how expensive it will be.
+
+The report holds the page count and size, the embedded images (pixel size and
+stored bytes), a fingerprint of the text layer (how many phrases of a Fayda
+export it has) and the object count. From them:
+
+    cost     render cost relative to a standard Fayda export (1.0)
+    verdict  "reject" (with `reason`): broken, several pages, no text layer
+             (a scan), not a Fayda export, or an image too big to decode;
+             "slow": valid but cost >= slow_cost; else "ok"
+"""
+import time
+
+# A standard Fayda export: A4 page, ~13 MP of embedded images, ~5800 PDF objects
+REFERENCE_PAGE_AREA = 595 * 842
+REFERENCE_IMAGE_PIXELS = 13_000_000
+REFERENCE_OBJECTS = 5800
+# Share of a standard render's time that scales with each of them (the rest, template,
+# background removal and drawing, is the same for every PDF): measured on the samples
+COST_WEIGHTS = {"page": 0.16, "images": 0.08, "objects": 0.16}
+
+# Phrases of the text layer of a Fayda export; a PDF needs MIN_MARKERS of them
+FAYDA_MARKERS = ("Ethiopian Digital ID Card", "Date of Birth", "Nationality", "Phone Number", "Region", "Woreda", "FCN:")
+MIN_MARKERS = 4
+# Fewer characters than this means there is no real text layer (a scan or a photo)
+MIN_TEXT_CHARS = 200
+
+
+def render_cost(page_area: float, image_pixels: int, objects: int) -> float:
+    """Render cost relative to a standard Fayda export (see COST_WEIGHTS)."""
+    fixed = 1 - sum(COST_WEIGHTS.values())
+    return (
+        fixed
+        + COST_WEIGHTS["page"] * page_area / REFERENCE_PAGE_AREA
+        + COST_WEIGHTS["images"] * image_pixels / REFERENCE_IMAGE_PIXELS
+        + COST_WEIGHTS["objects"] * objects / REFERENCE_OBJECTS
+    )
+
+
+def preflight_pdf(pdf_bytes, slow_cost: float = 2.0, max_image_pixels: int = 40_000_000) -> dict:
+    """
+    Inspect a PDF (bytes or a memory-mapped view) and judge it (see module doc).
+    The report also has the keys of core.pdf.extractor.get_pdf_metadata, so it
+    can feed the memory estimate of the render.
+    """
+    import fitz  # PyMuPDF (imported lazily to keep app startup fast)
+
+    started = time.perf_counter()
+    report = {"page_count": 0, "verdict": "reject", "reason": None, "cost": None}
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf:
+            if pdf.needs_pass:
+                report["reason"] = "The PDF is password-protected"
+                return report
+            report["page_count"] = len(pdf)
+            report["objects"] = pdf.xref_length()
+            if report["page_count"] == 0:
+                report["reason"] = "The PDF has no pages (damaged or incomplete download?)"
+                return report
+            if report["page_count"] != 1:
+                report["reason"] = f"Found {report['page_count']} pages. Please send 1 page."
+                return report
+
+            page = pdf[0]
+            report["page_width"], report["page_height"] = page.rect.width, page.rect.height
+            # (xref, smask, width, height, ...) from the object dicts; stream lengths without decoding
+            images = page.get_images(full=True)
+            report["images"] = [(img[2], img[3]) for img in images]
+            report["image_bytes"] = sum(len(pdf.xref_stream_raw(img[0]) or b"") for img in images)
+            text = page.get_text("text")
+    except Exception as e:
+        report["reason"] = f"The PDF could not be read ({e})"
+        return report
+    finally:
+        report["ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    report["text_chars"] = len(text.strip())
+    report["markers"] = sum(1 for marker in FAYDA_MARKERS if marker in text)
+    largest = max((w * h for w, h in report["images"]), default=0)
+    report["cost"] = round(render_cost(
+        report["page_width"] * report["page_height"],
+        sum(w * h for w, h in report["images"]),
+        report["objects"],
+    ), 2)
+
+    if not report["page_width"] or not report["page_height"]:
+        report["reason"] = "The page is empty"
+    elif report["text_chars"] < MIN_TEXT_CHARS:
+        report["reason"] = "The PDF has no text layer (a scan or a photo?). Please send the PDF downloaded from Fayda."
+    elif report["markers"] < MIN_MARKERS:
+        report["reason"] = "This doesn't look like a Fayda ID export"
+    elif largest > max_image_pixels:
+        report["reason"] = f"An embedded image is too large ({largest / 1e6:.0f} MP)"
+    else:
+        report["verdict"] = "slow" if report["cost"] >= slow_cost else "ok"
+    return report
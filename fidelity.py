@@ -0,0 +1,543 @@
+"""
+Golden-output fidelity harness for the card renderer.
+
+Renders a fixed set of synthetic Fayda PDFs (no real person's data) with a
+frozen "today" in every quality tier, encoder mode and resolution profile, then compares each
+output with its stored golden field by field (the TEMPLATE_FIELDS regions):
+structural similarity (SSIM) and the share of visibly changed pixels. It also
+checks that the QR code and the barcode still decode to what the fixture
+encodes, and prints speed next to fidelity for each mode.
+
+Usage:
+    python fidelity.py freeze            # render the goldens (on a known-good commit)
+    python fidelity.py check             # compare against them; exit code 1 on a regression
+    python fidelity.py check minimal pdf # only some modes
+    python fidelity.py fixtures          # rebuild the synthetic PDFs
+
+Goldens depend on the locally installed models (background removal), so they
+are frozen and checked on the same machine, and kept out of git:
+
+    git stash && python fidelity.py freeze && git stash pop && python fidelity.py check
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+# Add project root to sys.path
+sys.path.append(os.getcwd())
+
+# app.config refuses to load without these; the harness never talks to Telegram
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:fidelity")
+os.environ.setdefault("WEBHOOK_URL", "https://example.invalid")
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+FIDELITY_DIR = Path("storage/fidelity")
+FIXTURES_DIR = FIDELITY_DIR / "pdfs"
+GOLDEN_DIR = FIDELITY_DIR / "golden"
+
+# Only the layout is taken from this PDF: every personal field and image is replaced
+LAYOUT_PDF = Path("storage/uploads/gebre.pdf")
+FROZEN_TODAY = date(2025, 1, 15)
+
+MIN_SSIM = 0.99  # per field, against the mode's own golden
+CHANGED_LEVEL = 16  # a pixel counts as changed above this absolute difference (0-255)
+TEXT_BOX = (400, 36)  # text fields only have an anchor: compare this box below/right of it
+
+PEOPLE = {
+    "abebe": {
+        "name_en": "Abebe Bekele Tadesse", "name_am": "አበበ በቀለ ታደሰ",
+        "born": date(1988, 3, 9), "sex_en": "Male", "sex_am": "ወንድ", "phone_number": "0911000001",
+        "region_en": "Addis Ababa", "region_am": "አዲስ አበባ", "zone_en": "Bole", "zone_am": "ቦሌ",
+        "woreda_en": "Woreda 03", "woreda_am": "ወረዳ 03",
+        "fcn": "1111 2222 3333 4444", "fin": "5555 6666 7777", "tint": (214, 228, 240),
+    },
+    "selam": {
+        "name_en": "Selam Girma Wolde", "name_am": "ሰላም ግርማ ወልዴ",
+        "born": date(1995, 11, 27), "sex_en": "Female", "sex_am": "ሴት", "phone_number": "0922000002",
+        "region_en": "Oromia", "region_am": "ኦሮሚያ", "zone_en": "East Shewa", "zone_am": "ምስራቅ ሸዋ",
+        "woreda_en": "Adama", "woreda_am": "አዳማ",
+        "fcn": "9876 5432 1098 7654", "fin": "1234 0987 5678", "tint": (236, 222, 206),
+    },
+}
+
+# Personal text on the layout PDF: top-left corner of the span (points) -> field
+PERSONAL_SPANS = {
+    (170.7, 218.6): "name_am",
+    (170.7, 228.4): "name_en",
+    (73.6, 226.9): "fcn",
+    (59.6, 279.7): "date_of_birth_et",
+    (59.6, 288.4): "date_of_birth_greg",
+    (59.6, 316.6): "sex_am",
+    (59.6, 324.3): "sex_en",
+    (59.6, 377.6): "phone_number",
+    (203.2, 281.4): "region_am",
+    (203.2, 288.4): "region_en",
+    (203.2, 316.6): "zone_am",
+    (203.2, 324.3): "zone_en",
+    (203.2, 347.3): "woreda_am",
+    (203.2, 355.3): "woreda_en",
+}
+
+# name: (colour, quality tier, encoder, resolution profile)
+MODES = {
+    "full": (True, "full", "png", "print"),
+    "reduced": (True, "reduced", "png", "print"),
+    "minimal": (True, "minimal", "png", "print"),
+    "gray": (False, "full", "png", "print"),
+    "bilevel": (False, "full", "bilevel", "print"),
+    "pdf": (True, "full", "pdf", "print"),
+    "a4": (True, "full", "a4", "print"),
+    "screen": (True, "full", "png", "screen"),
+    "print_hq": (True, "full", "png", "print_hq"),
+}
+
+
+# --- Code 128 (the Fayda card barcode; OpenCV only reads EAN/UPC) ---
+
+# Bar/space widths of symbol values 0-106 (106 = stop)
+CODE128 = (
+    "212222 222122 222221 121223 121322 131222 122213 122312 132212 221213 221312 231212 112232 "
+    "122132 122231 113222 123122 123221 223211 221132 221231 213212 223112 312131 311222 321122 "
+    "321221 312212 322112 322211 212123 212321 232121 111323 131123 131321 112313 132113 132311 "
+    "211313 231113 231311 112133 112331 132131 113123 113321 133121 313121 211331 231131 213113 "
+    "213311 213131 311123 311321 331121 312113 312311 332111 314111 221411 431111 111224 111422 "
+    "121124 121421 141122 141221 112214 112412 122114 122411 142112 142211 241211 221114 413111 "
+    "241112 134111 111242 121142 121241 114212 124112 124211 411212 421112 421211 212141 214121 "
+    "412121 111143 111341 131141 114113 114311 411113 411311 113141 114131 311141 411131 211412 "
+    "211214 211232 2331112"
+).split()
+START_A, START_B, START_C, STOP = 103, 104, 105, 106
+
+
+def _edges(symbol) -> tuple:
+    """
+    Bar+space edge-to-edge distances of a 6-element symbol, in modules. Unlike
+    the widths themselves they survive ink spread (bars printed or sharpened
+    wider), and they tell all Code 128 symbols apart.
+    """
+    module = sum(symbol) / 11
+    return tuple(round((symbol[i] + symbol[i + 1]) / module) for i in range(4))
+
+
+# The stop symbol is 7 elements; its first 6 are matched like a symbol
+CODE128_VALUES = {_edges([int(w) for w in pattern[:6]]): value for value, pattern in enumerate(CODE128)}
+
+
+def code128_widths(digits: str) -> list[int]:
+    """Module widths (bar, space, bar, ...) of an even-length digit string in code set C."""
+    values = [START_C] + [int(digits[i:i + 2]) for i in range(0, len(digits), 2)]
+    values.append((values[0] + sum(i * v for i, v in enumerate(values[1:], start=1))) % 103)
+    values.append(STOP)
+    return [int(w) for value in values for w in CODE128[value]]
+
+
+def _decode_code128_runs(runs: list[int], start: int) -> str | None:
+    """Decode the symbols from runs[start] (a bar) to the stop; None unless the checksum matches."""
+    values = []
+    for i in range(start, len(runs) - 5, 6):
+        value = CODE128_VALUES.get(_edges(runs[i:i + 6]))
+        if value is None:
+            return None
+        if value == STOP:
+            break
+        values.append(value)
+    else:
+        return None
+
+    if len(values) < 2 or values[0] not in (START_A, START_B, START_C):
+        return None
+    *values, check = values
+    if (values[0] + sum(i * v for i, v in enumerate(values[1:], start=1))) % 103 != check:
+        return None
+
+    text, code = [], values[0]
+    for value in values[1:]:
+        if code == START_C and value < 100:
+            text.append(f"{value:02d}")
+        elif value in (99, 100, 101):
+            code = {99: START_C, 100: START_B, 101: START_A}[value]
+        elif code == START_B:
+            text.append(chr(value + 32))
+        else:
+            text.append(chr(value + 32) if value < 64 else chr(value - 64))
+    return "".join(text)
+
+
+def decode_barcode(img: Image.Image) -> str | None:
+    """Read a Code 128 barcode along the image's scanlines (None if no row decodes)."""
+    gray = np.asarray(img.convert("L"))
+    _, bw = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    step = max(1, min(gray.shape[0] // 40, 8))
+    for row in bw[::step]:
+        edges = np.flatnonzero(np.diff(row)) + 1
+        runs = np.diff(np.concatenate(([0], edges, [len(row)]))).tolist()
+        # Runs alternate dark/light; start codes begin with a dark one
+        for i in range(0 if row[0] == 0 else 1, len(runs) - 6, 2):
+            if CODE128_VALUES.get(_edges(runs[i:i + 6])) in (START_A, START_B, START_C):
+                text = _decode_code128_runs(runs, i)
+                if text:
+                    return text
+    return None
+
+
+def decode_qr(img: Image.Image) -> str | None:
+    gray = np.asarray(img.convert("L"))
+    if max(gray.shape) < 400:
+        gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_NEAREST)
+    gray = cv2.copyMakeBorder(gray, 32, 32, 32, 32, cv2.BORDER_CONSTANT, value=255)
+    text, _, _ = cv2.QRCodeDetector().detectAndDecode(gray)
+    return text or None
+
+
+# --- Synthetic fixtures ---
+
+def expected_codes(person: dict) -> dict:
+    fcn = person["fcn"].replace(" ", "")
+    return {"qrcode": f"FCN:{fcn};NAME:{person['name_en']};DOB:{person['born']:%Y-%m-%d}", "barcode": fcn}
+
+
+def _qr_image(payload: str, size: int) -> Image.Image:
+    matrix = cv2.QRCodeEncoder.create().encode(payload)
+    return Image.fromarray(matrix).resize((size, size), Image.Resampling.NEAREST)
+
+
+def _barcode_image(digits: str, size: tuple[int, int], font: ImageFont.FreeTypeFont) -> Image.Image:
+    """Digits above the bars, like the printed card."""
+    w, h = size
+    widths = code128_widths(digits)
+    module = w // (sum(widths) + 20)
+    img = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(img)
+    draw.text((w // 2, 0), digits, font=font, fill=0, anchor="ma")
+    x, top = (w - module * sum(widths)) // 2, h // 4
+    for i, width in enumerate(widths):
+        if i % 2 == 0:
+            draw.rectangle((x, top, x + module * width - 1, h - 1), fill=0)
+        x += module * width
+    return img
+
+
+def _photo_image(tint: tuple, size: tuple[int, int]) -> Image.Image:
+    """A plain head-and-shoulders silhouette."""
+    w, h = size
+    img = Image.new("RGB", size, tint)
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((w * 0.05, h * 0.7, w * 0.95, h * 1.4), fill=(40, 52, 84))
+    draw.ellipse((w * 0.3, h * 0.18, w * 0.7, h * 0.68), fill=(120, 84, 60))
+    draw.ellipse((w * 0.4, h * 0.36, w * 0.45, h * 0.4), fill=(20, 16, 14))
+    draw.ellipse((w * 0.55, h * 0.36, w * 0.6, h * 0.4), fill=(20, 16, 14))
+    return img
+
+
+def _png(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def make_fixture(name: str, path: Path):
+    """Write a synthetic one-page Fayda PDF for PEOPLE[name] (layout of LAYOUT_PDF)."""
+    import fitz
+    from app.config import settings
+    from core.image.image_crop import CROP_DPI, CROP_REGIONS
+    from core.image.image_generator import gregorian_to_ethiopian
+
+    person = dict(PEOPLE[name])
+    born = person["born"]
+    e_year, e_month, e_day = gregorian_to_ethiopian(born.year, born.month, born.day)
+    person["date_of_birth_et"] = f"{e_day:02d}/{e_month:02d}/{e_year}"
+    person["date_of_birth_greg"] = f"{born:%Y/%m/%d}"
+    codes = expected_codes(person)
+
+    with fitz.open(LAYOUT_PDF) as doc:
+        page = doc[0]
+
+        # 1️⃣ Personal text: redact it and write the synthetic values in its place
+        replacements = []
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                for span in line["spans"]:
+                    corner = (round(span["bbox"][0], 1), round(span["bbox"][1], 1))
+                    field = PERSONAL_SPANS.get(corner)
+                    if field:
+                        page.add_redact_annot(span["bbox"])
+                        replacements.append((span["origin"], span["size"], person[field]))
+        if len(replacements) != len(PERSONAL_SPANS):
+            raise RuntimeError(f"{LAYOUT_PDF} no longer has the expected layout ({len(replacements)} personal spans)")
+        page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE, graphics=fitz.PDF_REDACT_LINE_ART_NONE)
+        for origin, size, text in replacements:
+            is_amharic = any(ord(ch) >= 0x1200 for ch in text)
+            font_file = settings.FONT_AMHARIC if is_amharic else settings.FONT_ENGLISH
+            page.insert_text(origin, text, fontsize=size, fontname="am" if is_amharic else "en", fontfile=font_file)
+
+        # 2️⃣ Embedded photo and QR code (what extract_images_from_pdf picks up)
+        photo_xref, qr_xref, front_xref, back_xref = (img[0] for img in page.get_images(full=True)[:4])
+        photo = _photo_image(person["tint"], (219, 237))
+        page.replace_image(photo_xref, stream=_png(photo))
+        page.replace_image(qr_xref, stream=_png(_qr_image(codes["qrcode"], 250)))
+
+        # 3️⃣ The printed card (front and back) with the regions crop_pdf_sections reads
+        font = ImageFont.truetype(settings.FONT_ENGLISH, 72)
+        for xref in (front_xref, back_xref):
+            rect = page.get_image_rects(xref)[0]
+            info = doc.extract_image(xref)
+            size = (info["width"], info["height"])
+            sx, sy = size[0] / rect.width, size[1] / rect.height
+            img = Image.new("RGB", size, tuple(min(255, c + 20) for c in person["tint"]))
+            draw = ImageDraw.Draw(img)
+
+            for region, coords in CROP_REGIONS.items():
+                # Page pixels at CROP_DPI -> points -> pixels of this image
+                x1, y1, x2, y2 = (c * 72 / CROP_DPI for c in coords)
+                if not rect.y0 <= y1 < rect.y1:
+                    continue
+                x1, x2 = round((x1 - rect.x0) * sx), round((x2 - rect.x0) * sx)
+                y1, y2 = round((y1 - rect.y0) * sy), round((y2 - rect.y0) * sy)
+                if region == "photo":
+                    img.paste(photo.resize((x2 - x1, y2 - y1)), (x1, y1))
+                elif region == "barcode":
+                    img.paste(_barcode_image(codes["barcode"], (x2 - x1, y2 - y1), font), (x1, y1))
+                elif region == "qrcode":
+                    img.paste(_qr_image(codes["qrcode"], min(x2 - x1, y2 - y1)), (x1, y1))
+                elif region == "fin_code":
+                    draw.rectangle((x1, y1, x2, y2), fill=(255, 255, 255))
+                    draw.text((x1 + 10, (y1 + y2) // 2), f"FIN {person['fin']}", font=font, fill=(0, 0, 0), anchor="lm")
+            page.replace_image(xref, stream=_png(img))
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        doc.save(path, deflate=True)
+
+
+def fixtures(rebuild: bool = False) -> dict[str, Path]:
+    paths = {}
+    for name in PEOPLE:
+        path = FIXTURES_DIR / f"{name}.pdf"
+        if rebuild or not path.exists():
+            make_fixture(name, path)
+            print(f"🧪 Fixture {path}")
+        paths[name] = path
+    return paths
+
+
+# --- Rendering ---
+
+def parse_fixture(path: Path, resolution: str = "print") -> tuple[dict, float]:
+    from core.image.image_generator import RESOLUTION_PROFILES, parse_card_sources
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sources = parse_card_sources(path, Path(tmpdir), RESOLUTION_PROFILES[resolution]["crop_dpi"])
+    return sources, time.perf_counter() - start
+
+
+def mode_sources(path: Path, parsed: dict, mode: str) -> dict:
+    """The fixture parsed for `mode`'s resolution profile (`parsed` caches one parse per profile)."""
+    resolution = MODES[mode][3]
+    if resolution not in parsed:
+        parsed[resolution] = parse_fixture(path, resolution)[0]
+    return parsed[resolution]
+
+
+def render_mode(sources: dict, mode: str) -> tuple[Image.Image, int, float]:
+    """Build, render and encode one card in `mode`. Returns (decoded output, encoded bytes, seconds)."""
+    from app.config import settings
+    from core.image.image_generator import RESOLUTION_PROFILES, build_card, encode_png, render_card_image
+
+    color, quality, encoder, resolution = MODES[mode]
+    dpi = RESOLUTION_PROFILES[resolution]["dpi"]
+    fonts = dict(font_amharic=settings.FONT_AMHARIC, font_english=settings.FONT_ENGLISH, font_size=settings.FONT_SIZE)
+
+    start = time.perf_counter()
+    card = build_card(sources, color=color, quality=quality, today=FROZEN_TODAY, resolution=resolution)
+    if encoder == "pdf":
+        from core.pdf.pdf_card_writer import build_card_pdf
+        data = build_card_pdf([card], **fonts)
+    else:
+        data = encode_png(render_card_image(card, **fonts), bilevel=encoder == "bilevel", optimize=False, dpi=dpi)
+        if encoder == "a4":
+            from core.image.a4_layout import build_back_front_row, render_sheet
+            data = render_sheet([build_back_front_row(data, dpi)], dpi=dpi)[0]
+    elapsed = time.perf_counter() - start
+
+    if encoder == "pdf":
+        import fitz
+        from core.image.buffers import pixmap_to_array
+        from core.image.image_generator import load_template
+
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            page = doc[0]
+            width, height = load_template(dpi=dpi).size
+            pix = page.get_pixmap(matrix=fitz.Matrix(width / page.rect.width, height / page.rect.height), alpha=False)
+            output = Image.fromarray(pixmap_to_array(pix))
+    else:
+        output = Image.open(io.BytesIO(data))
+        output.load()
+    return output, len(data), elapsed
+
+
+# --- Scoring ---
+
+def field_regions(mode: str, size: tuple[int, int]) -> dict[str, tuple]:
+    """TEMPLATE_FIELDS as boxes, scaled to the mode's resolution; an A4 page is compared as a whole."""
+    from core.image.image_generator import TEMPLATE_FIELDS, resolution_scale
+
+    if MODES[mode][2] == "a4":
+        return {"page": (0, 0, *size)}
+    scale = resolution_scale(MODES[mode][3])
+    regions = {}
+    for key, field in TEMPLATE_FIELDS.items():
+        if field["type"] == "image":
+            regions[key] = tuple(round(c * scale) for c in field["coords"])
+            continue
+        # Up to the next field on the same line
+        x, y = field["coords"]
+        right = min(
+            [x + TEXT_BOX[0]] + [other["coords"][0] for other in TEMPLATE_FIELDS.values()
+                                 if other["type"] == "text" and other["coords"][1] == y and other["coords"][0] > x]
+        )
+        x, y, right, bottom = (round(c * scale) for c in (x, y, right, y + TEXT_BOX[1]))
+        regions[key] = (x, y, min(right, size[0]), min(bottom, size[1]))
+    return regions
+
+
+def ssim(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean structural similarity (Gaussian window, sigma 1.5) of two equally sized 8-bit images."""
+    a, b = a.astype(np.float32), b.astype(np.float32)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    def blur(x):
+        return cv2.GaussianBlur(x, (11, 11), 1.5)
+
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a * mu_a
+    var_b = blur(b * b) - mu_b * mu_b
+    cov = blur(a * b) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+def compare(output: Image.Image, golden: Image.Image, regions: dict) -> dict[str, dict]:
+    """Per field: SSIM and the share of pixels that changed by more than CHANGED_LEVEL."""
+    mode = "RGB" if output.mode == golden.mode == "RGB" else "L"
+    if output.size != golden.size:
+        output = output.resize(golden.size, Image.Resampling.LANCZOS)
+    a, b = np.asarray(output.convert(mode)), np.asarray(golden.convert(mode))
+    scores = {}
+    for key, (x1, y1, x2, y2) in regions.items():
+        field_a, field_b = a[y1:y2, x1:x2], b[y1:y2, x1:x2]
+        changed = np.abs(field_a.astype(np.int16) - field_b.astype(np.int16)) > CHANGED_LEVEL
+        scores[key] = {"ssim": ssim(field_a, field_b), "changed": float(changed.mean())}
+    return scores
+
+
+def decode_codes(output: Image.Image, regions: dict) -> dict:
+    """QR code and barcode as read back from the output (whole page for A4)."""
+    if "page" in regions:
+        return {"qrcode": decode_qr(output), "barcode": decode_barcode(output)}
+    return {
+        "qrcode": decode_qr(output.crop(regions["qrcode"])),
+        "barcode": decode_barcode(output.crop(regions["barcode"])),
+    }
+
+
+def worst(scores: dict) -> tuple[str, dict]:
+    return min(scores.items(), key=lambda item: item[1]["ssim"])
+
+
+# --- Commands ---
+
+def golden_path(case: str, mode: str) -> Path:
+    return GOLDEN_DIR / case / f"{mode}.png"
+
+
+def freeze(modes: list[str]):
+    for case, path in fixtures().items():
+        sources, t_parse = parse_fixture(path)
+        parsed = {"print": sources}
+        print(f"▶ {case}  parse {t_parse:.3f}s")
+        for mode in modes:
+            output, size, elapsed = render_mode(mode_sources(path, parsed, mode), mode)
+            target = golden_path(case, mode)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            output.save(target)
+            print(f"  {mode:8} {elapsed:.3f}s  {size / 1024:6.0f} KiB  -> {target}")
+
+
+def check(modes: list[str], min_ssim: float) -> bool:
+    """Print the speed/fidelity table; False if any mode regressed against its golden."""
+    failures = []
+    for case, path in fixtures().items():
+        sources, t_parse = parse_fixture(path)
+        parsed = {"print": sources}
+        expected = expected_codes(PEOPLE[case])
+        reference = golden_path(case, "full")
+        reference = Image.open(reference) if reference.exists() else None
+        print(f"▶ {case}  parse {t_parse:.3f}s")
+        print(f"  {'mode':8} {'time':>7} {'size':>9}  {'vs golden (worst field)':32} {'vs full (worst field)':30}  codes")
+
+        for mode in modes:
+            output, size, elapsed = render_mode(mode_sources(path, parsed, mode), mode)
+            regions = field_regions(mode, output.size)
+            codes = decode_codes(output, regions)
+            marks = " ".join(f"{kind} {'✓' if codes[kind] == expected[kind] else '✗'}" for kind in ("qrcode", "barcode"))
+
+            golden = golden_path(case, mode)
+            if golden.exists():
+                scores = compare(output, Image.open(golden), regions)
+                field, score = worst(scores)
+                vs_golden = f"{score['ssim']:.4f} {score['changed']:6.2%} ({field})"
+                failures += [
+                    f"{case}/{mode}: {key} SSIM {s['ssim']:.4f} < {min_ssim}, {s['changed']:.2%} of its pixels changed"
+                    for key, s in scores.items() if s["ssim"] < min_ssim
+                ]
+                golden_codes = decode_codes(Image.open(golden), regions)
+                for kind in ("qrcode", "barcode"):
+                    if golden_codes[kind] == expected[kind] and codes[kind] != expected[kind]:
+                        failures.append(f"{case}/{mode}: {kind} no longer decodes")
+            else:
+                vs_golden = "no golden (run freeze)"
+
+            vs_full = "-"
+            if reference is not None and "page" not in regions:
+                # Other resolutions are resampled to the reference size first (see compare)
+                field, score = worst(compare(output, reference, field_regions("full", reference.size)))
+                vs_full = f"{score['ssim']:.4f} ({field})"
+            print(f"  {mode:8} {elapsed:6.3f}s {size / 1024:6.0f} KiB  {vs_golden:32} {vs_full:30}  {marks}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Every mode matches its golden")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-output fidelity harness for the card renderer.")
+    parser.add_argument("command", choices=("freeze", "check", "fixtures"))
+    parser.add_argument("modes", nargs="*", help=f"modes to run (default: all of {', '.join(MODES)})")
+    parser.add_argument("--min-ssim", type=float, default=MIN_SSIM, help="lowest per-field SSIM that still passes")
+    args = parser.parse_args()
+
+    unknown = [mode for mode in args.modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown mode(s) {', '.join(unknown)}; available: {', '.join(MODES)}")
+    modes = args.modes or list(MODES)
+
+    if args.command == "fixtures":
+        fixtures(rebuild=True)
+    elif args.command == "freeze":
+        freeze(modes)
+    elif not check(modes, args.min_ssim):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
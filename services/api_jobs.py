@@ -0,0 +1,112 @@
+# services/api_jobs.py
+import asyncio
+import time
+import uuid
+
+from app.config import settings
+
+
+class ClientLimiter:
+    """Caps the requests/jobs each API client has in flight."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = {}  # client -> count
+
+    def try_acquire(self, client: str) -> bool:
+        if self.in_flight.get(client, 0) >= self.limit:
+            return False
+        self.in_flight[client] = self.in_flight.get(client, 0) + 1
+        return True
+
+    def release(self, client: str):
+        self.in_flight[client] -= 1
+        if not self.in_flight[client]:
+            del self.in_flight[client]
+
+
+class Job:
+    def __init__(self, client: str, total: int):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.status = "queued"  # queued -> running -> done | failed
+        self.total = total
+        self.done = 0
+        self.created = time.time()
+        self.finished = None
+        self.result = None  # (bytes, media_type, filename, quality, resolution)
+        self.error = None
+        self.task = None
+
+    def to_dict(self) -> dict:
+        body = {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "created": self.created,
+        }
+        if self.finished:
+            body["finished"] = self.finished
+        if self.status == "done":
+            body["result_url"] = f"/v1/jobs/{self.id}/result"
+        if self.error:
+            body["error"] = self.error
+        return body
+
+
+class JobStore:
+    """
+    In-memory background jobs of the HTTP API.
+    Finished jobs (and their results) are dropped after `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.jobs = {}
+
+    def create(self, client: str, total: int, work) -> Job:
+        """
+        Start `work(job)` (a coroutine function returning (bytes, media_type, filename))
+        in the background and return its job.
+        """
+        self.purge()
+        job = Job(client, total)
+        self.jobs[job.id] = job
+
+        async def run():
+            job.status = "running"
+            try:
+                job.result = await work(job)
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"❌ API job {job.id} failed: {e}")
+            finally:
+                job.finished = time.time()
+
+        job.task = asyncio.create_task(run())
+        return job
+
+    def get(self, job_id: str, client: str) -> Job | None:
+        """The client's job, or None (other clients' jobs are reported as missing)."""
+        self.purge()
+        job = self.jobs.get(job_id)
+        return job if job and job.client == client else None
+
+    def purge(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and now - job.finished > self.ttl:
+                del self.jobs[job_id]
+
+    def stats(self) -> dict:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+
+# Shared by every API request of this process
+client_limiter = ClientLimiter(settings.API_CLIENT_CONCURRENCY)
+api_jobs = JobStore(ttl=settings.API_JOB_TTL_MINUTES * 60)
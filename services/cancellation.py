@@ -0,0 +1,271 @@
+# services/cancellation.py
+"""
+Cancellation of the work a user's bot session started.
+
+Each user has one CancelToken at a time. The bot handlers bind it to the update
+they handle (current_token), so the tasks they start and the render jobs those
+run belong to the session, which keeps the token until it is idle again (no
+tasks, jobs or planned work). When the user moves on ("🔙 Back to Menu",
+/start, another mode) the token is cancelled:
+
+- its tasks (a running batch or single render, speculative preparations, the
+  auto-process timer) are cancelled, which also takes their queued jobs out of
+  the memory budget;
+- jobs already running stop at their next checkpoint(): between the stages of
+  a render, in a thread of this process or in a render worker.
+
+The CPU the cancelled work would have used is estimated from what the same
+stages took when they ran to the end, minus what the stopped jobs still spent
+before reaching a checkpoint. It is logged per cancelled session and totalled
+in /health.
+"""
+import asyncio
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# The session the current task / render job works for (None: not cancellable, e.g. API jobs).
+# In a render worker it holds a stand-in whose `cancelled` the pool flips (see render_workers)
+current_token = ContextVar("current_token", default=None)
+
+
+class JobCancelled(Exception):
+    """Raised at a checkpoint() of a job whose session was cancelled."""
+
+
+def checkpoint():
+    """Stop the current job here if its session was cancelled."""
+    token = current_token.get()
+    if token is not None and token.cancelled:
+        raise JobCancelled("The user left, job cancelled")
+
+
+class JobTicket:
+    """
+    One render job (`stage` is its function's name) run for `token`'s session,
+    or for no session. The runner marks it `started` once the job can no longer
+    just be dropped from a queue and settles it with the CPU seconds it took.
+    """
+
+    def __init__(self, stage: str, token=None):
+        self.stage = stage
+        self.token = token
+        self.started = False
+        self._loop = asyncio.get_running_loop()
+        self._on_cancel = []
+
+    def on_cancel(self, callback):
+        """Call `callback()` if the session is cancelled while the job runs (e.g. tell its worker)."""
+        self._on_cancel.append(callback)
+
+    def cancel(self):
+        for callback in self._on_cancel:
+            callback()
+
+    def settle(self, cpu: float, completed: bool):
+        """The job is over (`completed`: it ran to the end). Callable from any thread."""
+        try:
+            self._loop.call_soon_threadsafe(session_tokens.settle, self, cpu, completed)
+        except RuntimeError:
+            pass  # the event loop is gone (shutdown)
+
+    def close(self):
+        """The caller is done with the job; one that never started has nothing left to settle."""
+        if not self.started and self.token is not None:
+            self.token.jobs.discard(self)
+            session_tokens.release(self.token)
+
+
+@contextmanager
+def timed_job(ticket: JobTicket | None):
+    """Run a job in this thread for `ticket`: skip it if already cancelled, settle it with its CPU time."""
+    if ticket is None:
+        yield
+        return
+    ticket.started = True
+    start = time.thread_time()
+    completed = False
+    try:
+        checkpoint()
+        yield
+        completed = True
+    finally:
+        ticket.settle(time.thread_time() - start, completed)
+
+
+def new_ticket(fn) -> JobTicket:
+    """A ticket for running `fn` as a job of the current session (if any)."""
+    token = current_token.get()
+    ticket = JobTicket(getattr(fn, "__name__", str(fn)), token)
+    if token is not None:
+        token.add_job(ticket)
+    return ticket
+
+
+class CancelToken:
+    """What one user's session has running, planned and, once cancelled, saved."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.reason = None
+        self.tasks = set()
+        self.jobs = set()  # tickets of render jobs queued or running
+        self.planned = Counter()  # stage -> jobs the session will still start
+        self.report = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def track(self, task: asyncio.Task = None):
+        """Cancel `task` (default: the current one) with the session."""
+        task = task or asyncio.current_task()
+        if self.cancelled:
+            task.cancel()
+            return
+        self.tasks.add(task)
+        session_tokens.hold(self)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        session_tokens.release(self)
+
+    @property
+    def idle(self) -> bool:
+        """Nothing running, queued or planned."""
+        return not self.tasks and not self.jobs and not +self.planned
+
+    def plan(self, stage: str, count: int = 1):
+        """Jobs of `stage` the session will run later (counted as saved if it is cancelled first)."""
+        self.planned[stage] += count
+
+    def unplan(self):
+        """Forget the planned jobs that will no longer run (e.g. the batch ended)."""
+        self.planned.clear()
+
+    def add_job(self, ticket: JobTicket):
+        if self.planned[ticket.stage] > 0:
+            self.planned[ticket.stage] -= 1
+        self.jobs.add(ticket)
+
+    def cancel(self, reason: str):
+        """Cancel everything the session runs; the saving is reported once the running jobs have stopped."""
+        if self.cancelled:
+            return
+        self.reason = reason
+        stopping = {ticket for ticket in self.jobs if ticket.started}
+        dropped = +self.planned + Counter(ticket.stage for ticket in self.jobs - stopping)
+        self.report = {
+            "reason": reason,
+            "stopped": Counter(ticket.stage for ticket in stopping),
+            "dropped": dropped,
+            "cpu_spent": 0.0,
+            "waiting": stopping,
+            "started": time.monotonic(),
+        }
+        self.planned.clear()
+        for ticket in stopping:
+            ticket.cancel()
+        current = asyncio.current_task()
+        for task in list(self.tasks):
+            if task is not current:
+                task.cancel()
+        if not stopping:
+            session_tokens.finish_report(self)
+
+
+class SessionTokens:
+    """
+    The current CancelToken of each user, and what cancelling them has saved.
+    `costs` holds the smoothed CPU seconds of each job stage that ran to the end.
+    """
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self._tokens = {}  # user_id -> CancelToken
+        self.costs = {}
+        self.cancelled = 0
+        self.jobs_stopped = 0
+        self.jobs_dropped = 0
+        self.cpu_saved = 0.0
+
+    def get(self, user_id: int) -> CancelToken:
+        token = self._tokens.get(user_id)
+        if token is None:
+            token = self._tokens[user_id] = CancelToken(user_id)
+        return token
+
+    def bind(self, user_id: int) -> CancelToken:
+        """The user's token, made current for this task (and what it starts) and cancelled with it."""
+        token = self.get(user_id)
+        current_token.set(token)
+        token.track()
+        return token
+
+    def hold(self, token: CancelToken):
+        """Keep `token` as its user's while it has work (again, if it was released while idle)."""
+        self._tokens.setdefault(token.user_id, token)
+
+    def release(self, token: CancelToken):
+        """Forget the user's token once it is idle; their next update gets a fresh one."""
+        if token.idle and self._tokens.get(token.user_id) is token:
+            del self._tokens[token.user_id]
+
+    def cancel(self, user_id: int, reason: str):
+        """The user moved on: cancel their session's work. Their next update gets a fresh token."""
+        token = self._tokens.pop(user_id, None)
+        if token is not None:
+            token.cancel(reason)
+
+    def expected_cpu(self, stage: str) -> float:
+        return self.costs.get(stage, 0.0)
+
+    def settle(self, ticket: JobTicket, cpu: float, completed: bool):
+        """A job is over (on the event loop, see JobTicket.settle)."""
+        token = ticket.token
+        if token is not None:
+            token.jobs.discard(ticket)
+            self.release(token)
+            if token.report and ticket in token.report["waiting"]:
+                token.report["cpu_spent"] += cpu
+                token.report["waiting"].discard(ticket)
+                if not token.report["waiting"]:
+                    self.finish_report(token)
+                return
+        if completed:
+            previous = self.costs.get(ticket.stage)
+            self.costs[ticket.stage] = cpu if previous is None else previous + self.smoothing * (cpu - previous)
+
+    def finish_report(self, token: CancelToken):
+        report = token.report
+        stopped, dropped = sum(report["stopped"].values()), sum(report["dropped"].values())
+        if not stopped and not dropped:
+            return
+        stages = report["stopped"] + report["dropped"]
+        expected = sum(self.expected_cpu(stage) * count for stage, count in stages.items())
+        saved = max(expected - report["cpu_spent"], 0.0)
+        unknown = sorted(stage for stage in stages if stage not in self.costs)
+        self.cancelled += 1
+        self.jobs_stopped += stopped
+        self.jobs_dropped += dropped
+        self.cpu_saved += saved
+        print(
+            f"🛑 Cancelled user {token.user_id}'s work ({report['reason']}): {stopped} running job(s) stopped "
+            f"in {time.monotonic() - report['started']:.2f}s, {dropped} never started; ~{saved:.1f}s CPU saved"
+            + (f" (not counting {', '.join(unknown)}: none finished yet to go by)" if unknown else "")
+        )
+
+    def stats(self) -> dict:
+        return {
+            "sessions_cancelled": self.cancelled,
+            "jobs_stopped": self.jobs_stopped,
+            "jobs_dropped": self.jobs_dropped,
+            "cpu_saved_s": round(self.cpu_saved, 1),
+            "stage_cpu_s": {stage: round(cpu, 3) for stage, cpu in self.costs.items()},
+        }
+
+
+# One registry per process, shared by every handler
+session_tokens = SessionTokens()
@@ -0,0 +1,184 @@
+# services/job_journal.py
+"""
+Append-only journal of multi-PDF jobs, so a deploy or a crash doesn't lose them.
+
+Every step is one row of an SQLite `events` table, never updated in place:
+
+    collect  the user started collecting PDFs (chat, options)
+    file     one collected PDF (file_id)
+    accept   the batch was started (file_ids, options)
+    item     ID #index is rendered; its result is stored under `hash`
+    pages    these A4 pages were sent
+    resume   the batch was picked up again after a restart
+    cancel   the collection was abandoned
+    finish   done / failed
+
+Per-ID results are stored content-addressed in RESULTS_DIR (file name = SHA-256
+of the bytes), so identical results are stored once and the journal only holds
+hashes. `replay()` folds the events back into one dict per job; on startup open
+collections are restored and accepted batches resume from the last finished ID.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+
+from app.config import settings
+
+TERMINAL = ("done", "failed", "cancelled")
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+class JobJournal:
+    def __init__(self, path: Path, results_dir: Path, enabled: bool = True):
+        self.path = Path(path)
+        self.results_dir = Path(results_dir)
+        self.enabled = enabled
+        self._db = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.results_dir.mkdir(parents=True, exist_ok=True)
+            # Autocommit: an event is on disk once append() returns
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " job_id TEXT NOT NULL,"
+                " event TEXT NOT NULL,"
+                " data TEXT NOT NULL,"
+                " ts REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS events_job ON events (job_id)")
+        return self._db
+
+    def append(self, job_id: str, event: str, **data):
+        if not self.enabled or not job_id:
+            return
+        self._conn().execute(
+            "INSERT INTO events (job_id, event, data, ts) VALUES (?, ?, ?, ?)",
+            (job_id, event, json.dumps(data), time.time()),
+        )
+
+    # --- Events ---
+
+    def collect(self, job_id: str, chat_id: int, user_id: int, options: dict):
+        self.append(job_id, "collect", chat_id=chat_id, user_id=user_id, options=options)
+
+    def add_file(self, job_id: str, file_id: str):
+        self.append(job_id, "file", file_id=file_id)
+
+    def accept(self, job_id: str, chat_id: int, file_ids: list[str], options: dict):
+        self.append(job_id, "accept", chat_id=chat_id, file_ids=list(file_ids), options=options)
+
+    def item_done(self, job_id: str, index: int, digest: str, quality: str):
+        self.append(job_id, "item", index=index, hash=digest, quality=quality)
+
+    def pages_sent(self, job_id: str, pages: list[int]):
+        self.append(job_id, "pages", pages=list(pages))
+
+    def resumed(self, job_id: str):
+        self.append(job_id, "resume")
+
+    def cancel(self, job_id: str):
+        self.append(job_id, "cancel")
+
+    def finish(self, job_id: str, status: str = "done"):
+        self.append(job_id, "finish", status=status)
+
+    # --- Content-addressed results (blocking file I/O: call through asyncio.to_thread) ---
+
+    def _result_path(self, digest: str) -> Path:
+        return self.results_dir / digest[:2] / digest
+
+    def store_result(self, blob: bytes) -> str:
+        """Write `blob` once under its SHA-256 and return the hash."""
+        digest = hashlib.sha256(blob).hexdigest()
+        path = self._result_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(blob)
+            tmp.replace(path)  # atomic: a crash never leaves a half-written result
+        return digest
+
+    def load_result(self, digest: str) -> bytes | None:
+        try:
+            return self._result_path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    # --- Recovery ---
+
+    def replay(self) -> dict:
+        """Fold the events into job_id -> state (status, chat, options, file_ids, items, pages, resumes)."""
+        jobs = {}
+        if not self.enabled:
+            return jobs
+        rows = self._conn().execute("SELECT job_id, event, data, ts FROM events ORDER BY seq")
+        for job_id, event, data, ts in rows:
+            data = json.loads(data)
+            job = jobs.setdefault(job_id, {
+                "id": job_id, "status": None, "chat_id": None, "user_id": None, "options": {},
+                "file_ids": [], "items": {}, "pages": set(), "resumes": 0,
+            })
+            job["updated"] = ts
+            if event == "collect":
+                job.update(status="collecting", chat_id=data["chat_id"], user_id=data["user_id"], options=data["options"])
+            elif event == "file" and job["status"] == "collecting":
+                job["file_ids"].append(data["file_id"])
+            elif event == "accept":
+                job.update(status="accepted", chat_id=data["chat_id"], file_ids=data["file_ids"], options=data["options"])
+            elif event == "item":
+                job["items"][data["index"]] = {"hash": data["hash"], "quality": data["quality"]}
+            elif event == "pages":
+                job["pages"].update(data["pages"])
+            elif event == "resume":
+                job["resumes"] += 1
+            elif event == "cancel" and job["status"] == "collecting":
+                job["status"] = "cancelled"
+            elif event == "finish":
+                job["status"] = data["status"]
+        return jobs
+
+    def pending(self) -> tuple[list[dict], list[dict]]:
+        """(collections still open, accepted batches never finished), oldest first."""
+        jobs = self.replay().values()
+        collections = [job for job in jobs if job["status"] == "collecting" and job["file_ids"]]
+        batches = [job for job in jobs if job["status"] == "accepted"]
+        return collections, batches
+
+    def compact(self, keep_seconds: float):
+        """Forget jobs that ended more than `keep_seconds` ago and the results nobody references any more."""
+        if not self.enabled:
+            return
+        now = time.time()
+        jobs = self.replay()
+        expired = [
+            job_id for job_id, job in jobs.items()
+            if (job["status"] in TERMINAL or job["status"] is None) and now - job["updated"] > keep_seconds
+        ]
+        conn = self._conn()
+        for job_id in expired:
+            conn.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+            del jobs[job_id]
+
+        referenced = {item["hash"] for job in jobs.values() for item in job["items"].values()}
+        removed = 0
+        for path in self.results_dir.glob("*/*"):
+            if path.name not in referenced:
+                path.unlink(missing_ok=True)
+                removed += 1
+        if expired or removed:
+            print(f"🧹 Journal compacted: {len(expired)} old job(s), {removed} unreferenced result(s)")
+
+
+# One journal per process (SQLite connections stay on the event loop thread)
+job_journal = JobJournal(settings.JOURNAL_PATH, settings.RESULTS_DIR, enabled=settings.JOURNAL_ENABLED)
@@ -0,0 +1,70 @@
+# services/loop_monitor.py
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+
+class LoopLagMonitor:
+    """
+    Watchdog for the asyncio event loop.
+
+    A coroutine on the loop records a heartbeat every `interval` seconds and a
+    background thread checks it. If the heartbeat is older than `threshold`,
+    something is blocking the loop and we print the loop thread's current
+    stack so the offending call shows up in the logs.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_lag = 0.0
+        self.stalls = 0
+
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.max_lag = max(self.max_lag, now - expected)
+            self._last_beat = now
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            blocked_for = time.monotonic() - beat
+            if blocked_for < self.threshold or beat == reported_beat:
+                continue
+
+            # Report each stall once, while it is still happening
+            reported_beat = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+            print(f"🐢 Event loop blocked for {blocked_for * 1000:.0f}ms (threshold {self.threshold * 1000:.0f}ms):\n{stack}")
+
+    def start(self):
+        """Must be called from the event loop thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"max_lag_ms": round(self.max_lag * 1000, 1), "stalls": self.stalls}
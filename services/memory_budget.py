@@ -0,0 +1,273 @@
+# services/memory_budget.py
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+from app.config import settings
+from core.image.image_generator import DEFAULT_RESOLUTION, QUALITY_TIERS, RESOLUTION_PROFILES, resolution_scale
+from services.cancellation import new_ticket, timed_job
+
+MIB = 1024 * 1024
+
+# --- Cost model (bytes) ---
+# Fixed per-job cost of background removal (input/output tensors and activations)
+BG_REMOVAL_BYTES = {"neural": 300 * MIB, "fast": 80 * MIB, None: 0}
+# Final card canvas: 2480x727 at 300 DPI ("print"), drawn on a supersampled copy of the
+# template (per quality tier); other resolution profiles scale it by their area
+CARD_PIXELS = 2480 * 727
+# One [Back | Front] A4 row kept in memory per ID until its page is built (at 300 DPI)
+BATCH_ROW_BYTES = 2480 * 700 * 3
+# Default page size if the metadata doesn't have one (A4 in points)
+DEFAULT_PAGE = (595.0, 842.0)
+
+
+def batch_row_bytes(resolution: str = DEFAULT_RESOLUTION) -> int:
+    """Memory held by one A4 row at `resolution` (see BATCH_ROW_BYTES)."""
+    return int(BATCH_ROW_BYTES * resolution_scale(resolution) ** 2)
+
+
+def estimate_render_bytes(
+    metadata: dict,
+    color: bool = True,
+    quality: str = "full",
+    crop_dpi: int = None,
+    resolution: str = DEFAULT_RESOLUTION,
+) -> int:
+    """
+    Rough upper bound of the memory one render holds at once, from PDF metadata.
+    `crop_dpi` defaults to the resolution profile's.
+    This is the raw model; MemoryBudget scales it by what it has measured.
+    """
+    channels = 3 if color else 1
+    tier = QUALITY_TIERS[quality]
+    if crop_dpi is None:
+        crop_dpi = RESOLUTION_PROFILES[resolution]["crop_dpi"]
+    card_pixels = CARD_PIXELS * resolution_scale(resolution) ** 2
+    page_w = metadata.get("page_width") or DEFAULT_PAGE[0]
+    page_h = metadata.get("page_height") or DEFAULT_PAGE[1]
+
+    # Page pixmap at crop DPI and the copy of its samples (crop_dpi=0: page already parsed)
+    page_pixels = (page_w / 72 * crop_dpi) * (page_h / 72 * crop_dpi)
+    page_bytes = page_pixels * 3 * 2
+
+    # Embedded images: PIL decode + NumPy copy + colour-converted copy
+    image_bytes = sum(w * h * 4 * 3 for w, h in metadata.get("images", []))
+
+    # Supersampled canvas + its resized template source + final image and PNG buffer
+    canvas_bytes = card_pixels * tier["supersample"] ** 2 * channels * 2 + card_pixels * channels * 2
+
+    return int(page_bytes + image_bytes + canvas_bytes + BG_REMOVAL_BYTES[tier["bg_removal"]])
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (Linux /proc; ru_maxrss elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    """Samples RSS in a background thread; `peak_delta` is the growth above the starting RSS."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = current_rss()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, current_rss())
+
+    @property
+    def peak_delta(self) -> int:
+        return self.peak_rss - self.start_rss
+
+
+class MemoryBudget:
+    """
+    Admission controller for rendering jobs.
+
+    Each job declares an estimated cost in bytes. Jobs are admitted in FIFO order
+    while the total of admitted estimates (plus memory held between jobs, such as
+    batch rows) fits in the budget; the rest wait. When no job is running the
+    head of the queue is always admitted, so oversized jobs and held memory
+    can't stall the queue forever.
+
+    Peak RSS growth of jobs that ran alone is compared with their raw estimate,
+    and the ratio (smoothed) is applied to future estimates. The latency of
+    recent jobs (queue wait + run) is kept for load-based decisions.
+    """
+
+    def __init__(self, budget_bytes: int, smoothing: float = 0.2):
+        self.budget = budget_bytes
+        self.smoothing = smoothing
+        self.correction = 1.0
+        self.in_use = 0
+        self.running = 0
+        self.admitted = 0
+        self.queued_total = 0
+        self.samples = 0
+        self._waiters = deque()  # (nbytes, future)
+        self._running_ids = set()
+        self._shared = set()  # running jobs that overlapped another job (RSS not attributable)
+        self._latencies = deque(maxlen=50)  # (finished at, seconds from request to result)
+        # async (fn, *args) -> (result, peak RSS growth) running jobs elsewhere, e.g. the
+        # render worker processes; None runs them in a thread of this process, from
+        # `executor` (None: the default one)
+        self.runner = None
+        self.executor = None
+
+    # --- Admission ---
+
+    def scaled(self, raw_estimate: int) -> int:
+        return int(raw_estimate * self.correction)
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.running == 0 or self.in_use + nbytes <= self.budget
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def recent_latency(self, window: float = 120.0) -> float | None:
+        """Mean latency (queue wait + run) of jobs finished in the last `window` seconds."""
+        now = time.monotonic()
+        recent = [seconds for finished, seconds in self._latencies if now - finished <= window]
+        return sum(recent) / len(recent) if recent else None
+
+    def would_wait(self, nbytes: int) -> bool:
+        return bool(self._waiters) or not self._fits(nbytes)
+
+    def _admit(self, nbytes: int):
+        self.in_use += nbytes
+        self.running += 1
+        self.admitted += 1
+
+    async def acquire(self, nbytes: int):
+        """Wait for admission of a job costing `nbytes`. Pair with release()."""
+        if not self._waiters and self._fits(nbytes):
+            self._admit(nbytes)
+            return
+
+        self.queued_total += 1
+        fut = asyncio.get_running_loop().create_future()
+        entry = (nbytes, fut)
+        self._waiters.append(entry)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(nbytes)  # admitted just as we were cancelled
+            else:
+                self._waiters.remove(entry)
+                self._wake()
+            raise
+
+    def release(self, nbytes: int):
+        self.in_use -= nbytes
+        self.running -= 1
+        self._wake()
+
+    def hold(self, nbytes: int):
+        """Account memory kept between jobs (e.g. batch rows). Never waits."""
+        self.in_use += nbytes
+
+    def unhold(self, nbytes: int):
+        self.in_use -= nbytes
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._fits(self._waiters[0][0]):
+            nbytes, fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self._admit(nbytes)
+            fut.set_result(None)
+
+    # --- Running jobs ---
+
+    async def run(self, raw_estimate: int, fn, *args):
+        """
+        Admit a job costing `raw_estimate` bytes (before correction), run `fn(*args)`
+        (through `runner`, else in a worker thread) while sampling RSS, and learn
+        from the measured peak. The job belongs to the current session, if any
+        (see services.cancellation).
+        """
+        nbytes = self.scaled(raw_estimate)
+        requested = time.monotonic()
+        ticket = new_ticket(fn)
+        try:
+            await self.acquire(nbytes)
+            job_id = object()
+            if self._running_ids:
+                self._shared.update({job_id, *self._running_ids})
+            self._running_ids.add(job_id)
+            try:
+                started = time.perf_counter()
+                if self.runner:
+                    result, peak = await self.runner(fn, *args, ticket=ticket)
+                else:
+                    # Like asyncio.to_thread: the job sees the caller's context (its session)
+                    call = functools.partial(contextvars.copy_context().run, self._measured, fn, *args, ticket=ticket)
+                    result, peak = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+                if job_id not in self._shared:
+                    self.record_peak(raw_estimate, peak)
+                self._latencies.append((time.monotonic(), time.monotonic() - requested))
+                print(f"🧮 Job done in {time.perf_counter() - started:.2f}s: estimated {nbytes / MIB:.0f} MiB, peak RSS +{peak / MIB:.0f} MiB")
+                return result
+            finally:
+                self._running_ids.discard(job_id)
+                self._shared.discard(job_id)
+                self.release(nbytes)
+        finally:
+            ticket.close()
+
+    @staticmethod
+    def _measured(fn, *args, ticket=None):
+        with RssSampler() as sampler, timed_job(ticket):
+            result = fn(*args)
+        return result, sampler.peak_delta
+
+    def record_peak(self, raw_estimate: int, peak_bytes: int):
+        """Move the correction factor towards measured/estimated (never below 0.25)."""
+        if raw_estimate <= 0 or peak_bytes <= 0:
+            return
+        ratio = max(peak_bytes / raw_estimate, 0.25)
+        self.correction += self.smoothing * (ratio - self.correction)
+        self.samples += 1
+
+    def stats(self) -> dict:
+        return {
+            "budget_mib": round(self.budget / MIB),
+            "in_use_mib": round(self.in_use / MIB),
+            "running": self.running,
+            "queued": self.queued,
+            "admitted_total": self.admitted,
+            "queued_total": self.queued_total,
+            "estimate_correction": round(self.correction, 3),
+            "peak_samples": self.samples,
+        }
+
+
+# One budget per process, shared by every ProcessingService instance
+memory_budget = MemoryBudget(settings.RENDER_MEMORY_BUDGET_MB * MIB)
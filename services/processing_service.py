@@ -1,24 +1,310 @@
 import asyncio
 import io
 import traceback
+import zipfile
 import magic
 import tempfile
 import math
+import pickle
+import time
+from contextlib import nullcontext
 from pathlib import Path
 from aiogram import Bot, types
-from aiogram.types import BufferedInputFile
 from PIL import Image
 
 # Keep your existing core imports
-from core.image.image_generator import generate_final_id_image
-from core.pdf.extractor import get_pdf_metadata
+from app.config import settings
+from core.image.image_generator import (
+    DEFAULT_RESOLUTION,
+    QUALITY_TIERS,
+    RESOLUTION_PROFILES,
+    build_card,
+    encode_png,
+    encode_preview,
+    grayscale_card,
+    grayscale_card_image,
+    parse_card_sources,
+    render_card_image,
+)
+from core.image.a4_layout import DEFAULT_LAYOUT, SHEET_LAYOUTS, build_back_front_row, cards_per_page, render_sheet, sheet_sides
+from core.pdf.pdf_card_writer import build_card_pdf
+from core.pdf.preflight import preflight_pdf
+from services.cancellation import checkpoint, current_token, new_ticket, timed_job
+from services.job_journal import job_journal, new_job_id
+from services.memory_budget import batch_row_bytes, estimate_render_bytes, memory_budget
+from services.quality import TIERS, quality_governor
+from services.render_workers import render_workers
+from services.sent_files import sent_files
+from services.speculative import discard_tasks
+from services.telegram_files import download_pdf
+from services.thread_budget import thread_plan
+
+
+# Telegram takes at most this many documents per media group
+MEDIA_GROUP_SIZE = 10
+
+# A4 sheets composed at once (each holds a page canvas and its PNG): one per render worker
+_sheet_slots = asyncio.Semaphore(max(thread_plan["workers"], 1))
+
+# Renders of PDFs pre-flight found expensive, at once (the rest wait here, not in the memory budget)
+_slow_lane = asyncio.Semaphore(settings.SLOW_LANE_CONCURRENCY)
+
+
+# --- Blocking helpers (always called through asyncio.to_thread) ---
+# Render jobs call checkpoint() between their stages, so a job whose session was
+# cancelled (see services.cancellation) stops there
+
+# libmagic only needs the start of the file to recognise a PDF
+MAGIC_SNIFF_BYTES = 8192
+
+def preflight(pdf_bytes) -> dict:
+    """Pre-flight report of a PDF (see core.pdf.preflight) with the configured thresholds."""
+    return preflight_pdf(pdf_bytes, settings.PREFLIGHT_SLOW_COST, int(settings.PREFLIGHT_MAX_IMAGE_MP * 1e6))
+
+def inspect_pdf(pdf_bytes) -> tuple[str, dict]:
+    """Sniff the MIME type and pre-flight the PDF (bytes or a memory-mapped view)."""
+    file_type = magic.from_buffer(bytes(pdf_bytes[:MAGIC_SNIFF_BYTES]), mime=True)
+    report = preflight(pdf_bytes) if file_type == "application/pdf" else {}
+    return file_type, report
+
+def font_kwargs() -> dict:
+    return dict(
+        font_amharic=settings.FONT_AMHARIC,
+        font_english=settings.FONT_ENGLISH,
+        font_size=settings.FONT_SIZE,
+        boldness=1,
+    )
+
+def parse_id_sources(pdf, resolution: str = DEFAULT_RESOLUTION) -> dict:
+    """
+    Parse a PDF with the core extractor, cropping at the resolution profile's DPI.
+    `pdf` is the file's bytes (written to a temp dir first) or, for files already
+    on local disk, its Path.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        if isinstance(pdf, Path):
+            pdf_file = pdf
+        else:
+            pdf_file = temp_path / "input.pdf"
+            pdf_file.write_bytes(pdf)
+
+        output_dir = temp_path / "output"
+        output_dir.mkdir(exist_ok=True)
+
+        return parse_card_sources(pdf_file, output_dir, RESOLUTION_PROFILES[resolution]["crop_dpi"])
+
+def extract_id_card(pdf, color: bool = True, quality: str = "full", resolution: str = DEFAULT_RESOLUTION) -> dict:
+    """Parse a PDF (see parse_id_sources) into card data."""
+    sources = parse_id_sources(pdf, resolution)
+    checkpoint()
+    return build_card(sources, color, quality, resolution=resolution)
+
+def encode_id_card(card: dict, bilevel: bool = False) -> bytes:
+    """PNG bytes of parsed card data (grayscale or 1-bit for B&W), tagged with the card's DPI."""
+    img = render_card_image(card, **font_kwargs())
+    checkpoint()
+    dpi = RESOLUTION_PROFILES[card.get("resolution", DEFAULT_RESOLUTION)]["dpi"]
+    return encode_png(img, bilevel=bilevel and not card["color"], optimize=QUALITY_TIERS[card["quality"]]["optimize_png"], dpi=dpi)
+
+def render_id_card(pdf, color: bool = True, bilevel: bool = False, quality: str = "full", resolution: str = DEFAULT_RESOLUTION) -> bytes:
+    """Parse and render one card (see extract_id_card). Returns PNG bytes (grayscale or 1-bit for B&W)."""
+    card = extract_id_card(pdf, color, quality, resolution)
+    checkpoint()
+    return encode_id_card(card, bilevel)
+
+def preview_id_card(pdf, color: bool = True, resolution: str = DEFAULT_RESOLUTION) -> tuple[dict, bytes]:
+    """
+    Parse a PDF for the final card's `resolution` and draw a quick low-res JPEG
+    of it ("minimal" tier and "screen" profile: no background removal, a quarter
+    of the pixels). Returns (sources, jpeg); finish_id_card reuses the sources.
+    """
+    sources = parse_id_sources(pdf, resolution)
+    checkpoint()
+    img = render_card_image(build_card(sources, color, "minimal", resolution="screen"), **font_kwargs())
+    return sources, encode_preview(img)
+
+def finish_id_card(sources: dict, color: bool = True, output_format: str = "png", bilevel: bool = False, quality: str = "full", resolution: str = DEFAULT_RESOLUTION) -> bytes:
+    """The real card from already-parsed sources: PNG bytes, or a card-sized vector PDF."""
+    card = build_card(sources, color, quality, resolution=resolution)
+    checkpoint()
+    if output_format == "pdf":
+        return render_cards_pdf([card])
+    return encode_id_card(card, bilevel)
+
+def card_variants(card: dict, output_format: str = "png", bilevel: bool = False) -> list[tuple[str, bytes]]:
+    """
+    (filename, bytes) of the colour and the B&W card, from colour card data: two
+    PNGs from one drawing (the B&W card branches off at the end, see
+    grayscale_card_image; `bilevel` dithers it), or two card-sized vector PDFs.
+    """
+    if output_format == "pdf":
+        return [("id_card_color.pdf", render_cards_pdf([card])), ("id_card_bw.pdf", render_cards_pdf([grayscale_card(card)]))]
+    img = render_card_image(card, **font_kwargs())
+    checkpoint()
+    options = dict(
+        optimize=QUALITY_TIERS[card["quality"]]["optimize_png"],
+        dpi=RESOLUTION_PROFILES[card.get("resolution", DEFAULT_RESOLUTION)]["dpi"],
+    )
+    color_png = encode_png(img, **options)
+    checkpoint()
+    return [("id_card_color.png", color_png), ("id_card_bw.png", encode_png(grayscale_card_image(img), bilevel=bilevel, **options))]
+
+def render_card_variants(pdf, output_format: str = "png", bilevel: bool = False, quality: str = "full", resolution: str = DEFAULT_RESOLUTION) -> list[tuple[str, bytes]]:
+    """Parse a PDF once (one background removal) into its colour and B&W cards (see card_variants)."""
+    card = extract_id_card(pdf, True, quality, resolution)
+    checkpoint()
+    return card_variants(card, output_format, bilevel)
+
+def finish_card_variants(sources: dict, output_format: str = "png", bilevel: bool = False, quality: str = "full", resolution: str = DEFAULT_RESOLUTION) -> list[tuple[str, bytes]]:
+    """Both cards from already-parsed sources (see finish_id_card and card_variants)."""
+    card = build_card(sources, True, quality, resolution=resolution)
+    checkpoint()
+    return card_variants(card, output_format, bilevel)
+
+def render_cards_pdf(cards: list[dict], layout: str = "card") -> bytes:
+    """Vector PDF of already-parsed cards (see core.pdf.pdf_card_writer)."""
+    return build_card_pdf(cards, layout=layout, **font_kwargs())
+
+
+def compose_sheet(rows: list, bilevel: bool = False, dpi: int = 300, layout: str = DEFAULT_LAYOUT, ticket=None) -> list[bytes]:
+    """render_sheet as a job of `ticket` (see services.cancellation)."""
+    with timed_job(ticket):
+        return render_sheet(rows, bilevel, dpi, layout)
+
+def batch_item_stage(output_format: str) -> str:
+    """The render job behind one ID of a batch (see render_batch_item)."""
+    return extract_id_card.__name__ if output_format == "pdf" else render_id_card.__name__
+
+
+def page_filename(p: int, side: str = None) -> str:
+    """File name of page `p` (0-based) of a batch; duplex sheets have a fronts and a backs page."""
+    return f"A4_IDs_PAGE_{p + 1}_{side.upper()}.png" if side else f"A4_IDs_PAGE_{p + 1}.png"
+
+def zip_pages(pages: list[tuple[str, bytes]]) -> bytes:
+    """(filename, bytes) A4 PNG pages (or cards) in one ZIP (stored: they are already compressed)."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for filename, page in pages:
+            archive.writestr(filename, page)
+    return buffer.getvalue()
+
+
+def dump_batch_item(item, output_format: str) -> bytes:
+    """A batch item as bytes for the result store: the A4 row as PNG, or the parsed card pickled."""
+    if output_format == "pdf":
+        return pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+    buffer = io.BytesIO()
+    item.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+def load_batch_item(blob: bytes, output_format: str):
+    if output_format == "pdf":
+        return pickle.loads(blob)
+    img = Image.open(io.BytesIO(blob))
+    img.load()
+    return img
+
+def store_batch_item(item, output_format: str) -> str:
+    """Put a batch item in the job journal's result store. Returns its hash."""
+    return job_journal.store_result(dump_batch_item(item, output_format))
+
+
+def describe_output(color: bool, bilevel: bool = False) -> str:
+    if color:
+        return "Color"
+    return "B&W 1-bit" if bilevel else "B&W"
+
+def describe_resolution(resolution: str) -> str:
+    """Caption line for cards rendered at another profile than the standard print one ("" otherwise)."""
+    if resolution == DEFAULT_RESOLUTION:
+        return ""
+    profile = RESOLUTION_PROFILES[resolution]
+    return f"\n📐 {profile['label']} resolution ({profile['dpi']} DPI)"
+
+def describe_layout(layout: str) -> str:
+    label = SHEET_LAYOUTS[layout]["label"]
+    if SHEET_LAYOUTS[layout]["duplex"]:
+        label += ", print double-sided (flip on long edge)"
+    return f"Layout: {label}"
+
+def render_lane(report: dict):
+    """Where a render waits before the memory budget: the slow lane for expensive PDFs (see preflight)."""
+    return _slow_lane if report.get("verdict") == "slow" else nullcontext()
+
+def describe_quality(tiers) -> str:
+    """Caption line for results rendered below full quality because of load ("" otherwise)."""
+    degraded = [tier for tier in TIERS if tier in tiers and tier != "full"]
+    if not degraded:
+        return ""
+    return f"\n⚡ {' / '.join(degraded).capitalize()} quality (server under heavy load)"
+
+
+# --- Async render steps (shared by the bot and the HTTP API) ---
+
+async def render_card_output(pdf, estimate: int, color: bool = True, output_format: str = "png", bilevel: bool = False, quality: str = "full", resolution: str = DEFAULT_RESOLUTION) -> bytes:
+    """One card as PNG bytes, or as a card-sized vector PDF, admitted through the memory budget."""
+    if output_format == "pdf":
+        card = await memory_budget.run(estimate, extract_id_card, pdf, color, quality, resolution)
+        return await asyncio.to_thread(render_cards_pdf, [card])
+    return await memory_budget.run(estimate, render_id_card, pdf, color, bilevel, quality, resolution)
+
+async def render_batch_item(pdf_bytes, local_path: Path = None, color: bool = True, output_format: str = "png", resolution: str = DEFAULT_RESOLUTION) -> tuple:
+    """
+    Render one ID of an A4 batch through the memory budget. Returns (item, held_bytes, quality):
+    the parsed card for PDF output, else its [Back | Front] A4 row, which stays
+    accounted in the memory budget until the caller unholds `held_bytes`.
+    """
+    pdf = local_path or pdf_bytes
+    report = await asyncio.to_thread(preflight, pdf_bytes)
+    if report["verdict"] == "reject":
+        raise ValueError(f"Invalid PDF: {report['reason']}")
+    quality = quality_governor.choose()
+    estimate = estimate_render_bytes(report, color, quality, resolution=resolution)
+
+    async with render_lane(report):
+        if output_format == "pdf":
+            # Keep the parsed card; the PDF sheets are laid out once at the end
+            return await memory_budget.run(estimate, extract_id_card, pdf, color, quality, resolution), 0, quality
+
+        # 2. Process to Wide Image (Front | Back); 1-bit dithering waits for the final page
+        image_bytes = await memory_budget.run(estimate, render_id_card, pdf, color, False, quality, resolution)
+
+    # 3. Reorder to [Back | Front] and resize for A4 fit (at the profile's DPI)
+    row_resized = await asyncio.to_thread(build_back_front_row, image_bytes, RESOLUTION_PROFILES[resolution]["dpi"])
+    row_bytes = batch_row_bytes(resolution)
+    memory_budget.hold(row_bytes)
+    return row_resized, row_bytes, quality
+
+
+async def render_sheet_pages(rows: list, bilevel: bool = False, dpi: int = 300, layout: str = DEFAULT_LAYOUT) -> list[bytes]:
+    """
+    Compose and PNG-encode one A4 sheet (see render_sheet) in a render worker
+    process, or in a thread when there are none. The rows are already accounted
+    in the memory budget.
+    """
+    ticket = new_ticket(render_sheet)
+    try:
+        async with _sheet_slots:
+            if render_workers.enabled:
+                pages, _ = await render_workers.run(render_sheet, rows, bilevel, dpi, layout, ticket=ticket)
+                return pages
+            return await asyncio.to_thread(compose_sheet, rows, bilevel, dpi, layout, ticket)
+    finally:
+        ticket.close()
+
 
 class ProcessingService:
     def __init__(self, bot: Bot):
         self.bot = bot
 
-    async def process_pdf_from_telegram(self, file_id: str, chat_id: int, color: bool = True, status_message_id: int = None) -> bool:
+    async def process_pdf_from_telegram(self, file_id: str, chat_id: int, color: bool = True, status_message_id: int = None, output_format: str = "png", bilevel: bool = False, resolution: str = DEFAULT_RESOLUTION, both: bool = False) -> bool:
+        """
+        Render one PDF and send its card. `both` sends the colour and the B&W
+        card together, from one parse (`color` is then ignored).
+        """
         status_msg_id = status_message_id
+        color = color or both
         try:
             # Step 1: Send or Edit initial progress message
             if status_msg_id:
@@ -31,10 +317,9 @@ class ProcessingService:
                 msg = await self.bot.send_message(chat_id=chat_id, text="📥 Downloading your PDF...")
                 status_msg_id = msg.message_id
 
-            # Step 2: Download PDF
-            file = await self.bot.get_file(file_id=file_id)
-            pdf_bytes_io = await self.bot.download_file(file_path=file.file_path)
-            pdf_bytes = pdf_bytes_io.read()
+            # Step 2: Download PDF (memory-mapped from disk with a local Bot API server)
+            pdf_bytes, local_path = await download_pdf(self.bot, file_id)
+            pdf = local_path or pdf_bytes
 
             await self.bot.edit_message_text(
                 text="🧩 Checking file type...", 
@@ -42,8 +327,8 @@ class ProcessingService:
                 message_id=status_msg_id
             )
 
-            # Step 3: Validate file type
-            file_type = magic.from_buffer(pdf_bytes, mime=True)
+            # Step 3: Validate file type (libmagic + PyMuPDF run off the event loop)
+            file_type, metadata = await asyncio.to_thread(inspect_pdf, pdf_bytes)
             if file_type != "application/pdf":
                 await self.bot.edit_message_text(
                     text=f"❌ Error: Not a PDF. Detected: `{file_type}`", 
@@ -52,17 +337,26 @@ class ProcessingService:
                 )
                 return False
 
-            # Step 4: Validate PDF Metadata
-            metadata = get_pdf_metadata(pdf_bytes)
-            page_count = metadata.get("page_count", 1)
-
-            if page_count != 1:
+            # Step 4: Pre-flight (structure only): reject what can't render, spot expensive PDFs
+            if metadata["verdict"] == "reject":
                 await self.bot.edit_message_text(
-                    text=f"❌ Invalid PDF: Found {page_count} pages. Please send 1 page.",
+                    text=f"❌ Invalid PDF: {metadata['reason']}",
                     chat_id=chat_id, 
                     message_id=status_msg_id
                 )
                 return False
+            if metadata["verdict"] == "slow":
+                print(f"🐢 Slow lane for a PDF from chat {chat_id}: cost {metadata['cost']}x a standard export")
+
+            # Renders are admitted against the global memory budget; tell the user if we queue
+            quality = quality_governor.choose()
+            estimate = estimate_render_bytes(metadata, color, quality, resolution=resolution)
+            if (metadata["verdict"] == "slow" and _slow_lane.locked()) or memory_budget.would_wait(memory_budget.scaled(estimate)):
+                await self.bot.edit_message_text(
+                    text="⏳ Server is busy, your ID card is queued...",
+                    chat_id=chat_id,
+                    message_id=status_msg_id
+                )
 
             await self.bot.edit_message_text(
                 text="🔄 Generating your ID card...", 
@@ -71,32 +365,43 @@ class ProcessingService:
             )
 
             # Step 5: Process using Core logic
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_path = Path(temp_dir)
-                pdf_file = temp_path / "input.pdf"
-                pdf_file.write_bytes(pdf_bytes)
-
-                output_dir = temp_path / "output"
-                output_dir.mkdir(exist_ok=True)
-
-                image_bytes = await asyncio.to_thread(
-                    generate_final_id_image,
-                    pdf_path=pdf_file,
-                    output_dir=output_dir,
-                    font_amharic="./fonts/truetype/abyssinica/AbyssinicaSIL-Regular.ttf",
-                    font_english="./fonts/truetype/noto/NotoSans-Regular.ttf",
-                    font_size=27,
-                    boldness=1,
-                    color=color
+            caption = f"✅ Your ID Card is ready! ({describe_output(color, bilevel and output_format != 'pdf')})"
+            caption += describe_resolution(resolution) + describe_quality([quality])
+            preview_sent = None
+            async with render_lane(metadata):
+                if settings.SEND_PREVIEW:
+                    # Step 5a: Parse once, show a quick low-res preview, then finish from the same parse
+                    sources, preview = await self.render_preview(pdf, metadata, color, resolution)
+                    # The preview uploads while the card is finished
+                    preview_sent = asyncio.create_task(self.send_preview(chat_id, preview, output_format))
+                    # The page is already parsed
+                    finish_estimate = estimate_render_bytes(metadata, color, quality, crop_dpi=0, resolution=resolution)
+                    try:
+                        if both:
+                            result = await memory_budget.run(finish_estimate, finish_card_variants, sources, output_format, bilevel, quality, resolution)
+                        else:
+                            result = await memory_budget.run(finish_estimate, finish_id_card, sources, color, output_format, bilevel, quality, resolution)
+                    except BaseException:
+                        preview_sent.cancel()
+                        raise
+                else:
+                    if both:
+                        result = await memory_budget.run(estimate, render_card_variants, pdf, output_format, bilevel, quality, resolution)
+                    else:
+                        result = await render_card_output(pdf, estimate, color, output_format, bilevel, quality, resolution)
+            preview_msg_id = await preview_sent if preview_sent else None
+            if both:
+                # Step 6: Both cards in one album (replacing the preview)
+                await self.send_variants(chat_id, preview_msg_id, result, output_format, bilevel, resolution, quality)
+            elif output_format == "pdf":
+                # Step 6: Send the result (by file_id if Telegram already has these bytes)
+                await sent_files.send(
+                    lambda media: self.bot.send_document(chat_id=chat_id, document=media[0], caption=caption + "\n📑 Print-ready PDF"),
+                    [(result, "id_card.pdf", "document")],
                 )
-
-            # Step 6: Send the result
-            photo = BufferedInputFile(image_bytes, filename="id_card.png")
-            await self.bot.send_photo(
-                chat_id=chat_id, 
-                photo=photo, 
-                caption=f"✅ Your ID Card is ready! ({'Color' if color else 'B&W'})"
-            )
+            else:
+                # Step 6: Send the result (in place of the preview when there is one)
+                await self.send_or_replace_photo(chat_id, preview_msg_id, result, "id_card.png", caption)
             
             # Clean up the progress message
             try:
@@ -119,7 +424,143 @@ class ProcessingService:
             print(f"Processing Error: {e}\n{error_traceback}")
             return False
 
-    async def process_multiple_pdfs(self, file_ids: list[str], chat_id: int, color: bool = True, status_message_id: int = None) -> bool:
+        except asyncio.CancelledError:
+            await self.report_cancelled(chat_id, status_msg_id, "🛑 Cancelled, your ID card was not generated.")
+            raise
+
+    async def send_variants(self, chat_id: int, preview_msg_id: int | None, files: list[tuple], output_format: str, bilevel: bool, resolution: str, quality: str):
+        """Send the colour and B&W cards (see card_variants) as one album, then drop the preview."""
+        suffix = describe_resolution(resolution) + describe_quality([quality])
+        if output_format == "pdf":
+            suffix += "\n📑 Print-ready PDF"
+        captions = [
+            f"✅ Your ID Card is ready! ({describe_output(True)})" + suffix,
+            f"✅ Your ID Card is ready! ({describe_output(False, bilevel and output_format != 'pdf')})" + suffix,
+        ]
+        kind, media_type = ("document", types.InputMediaDocument) if output_format == "pdf" else ("photo", types.InputMediaPhoto)
+        await sent_files.send(
+            lambda media: self.bot.send_media_group(
+                chat_id=chat_id,
+                media=[media_type(media=file, caption=caption) for file, caption in zip(media, captions)]
+            ),
+            [(data, filename, kind) for filename, data in files],
+        )
+        if preview_msg_id:
+            try:
+                await self.bot.delete_message(chat_id=chat_id, message_id=preview_msg_id)
+            except Exception:
+                pass
+
+    async def report_cancelled(self, chat_id: int, status_msg_id: int | None, text: str) -> bool:
+        """
+        Tell the user their work stopped, if it was their session that was cancelled
+        (not e.g. a shutdown). Returns whether it was.
+        """
+        token = current_token.get()
+        if token is None or not token.cancelled:
+            return False
+        if status_msg_id:
+            try:
+                await self.bot.edit_message_text(text=text, chat_id=chat_id, message_id=status_msg_id)
+            except Exception:
+                pass
+        return True
+
+    async def render_preview(self, pdf, metadata: dict, color: bool, resolution: str = DEFAULT_RESOLUTION) -> tuple[dict, bytes]:
+        """Parse the PDF (for a card at `resolution`) and draw a low-res preview of its card. Returns (sources, JPEG)."""
+        # Page parsed at the final profile's crop DPI, preview drawn at the screen profile
+        estimate = estimate_render_bytes(metadata, color, "minimal", RESOLUTION_PROFILES[resolution]["crop_dpi"], "screen")
+        return await memory_budget.run(estimate, preview_id_card, pdf, color, resolution)
+
+    async def send_preview(self, chat_id: int, preview: bytes, output_format: str) -> int | None:
+        """Send the preview (see render_preview). Returns its message id, or None if it couldn't be sent."""
+        started = time.perf_counter()
+        follows = "print-ready PDF follows" if output_format == "pdf" else "full-quality card coming up"
+        try:
+            msg = await sent_files.send(
+                lambda media: self.bot.send_photo(chat_id=chat_id, photo=media[0], caption=f"👀 Quick preview ({follows}...)"),
+                [(preview, "preview.jpg", "photo")],
+            )
+        except Exception as e:
+            print(f"⚠️ Could not send the preview: {e}")
+            return None
+        print(f"👀 Preview sent in {time.perf_counter() - started:.2f}s")
+        return msg.message_id
+
+    async def send_or_replace_photo(self, chat_id: int, message_id: int | None, data: bytes, filename: str, caption: str):
+        """Swap the photo `data` into the preview message `message_id`, or send it as a new photo (see sent_files)."""
+        items = [(data, filename, "photo")]
+        if message_id:
+            try:
+                await sent_files.send(
+                    lambda media: self.bot.edit_message_media(
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        media=types.InputMediaPhoto(media=media[0], caption=caption)
+                    ),
+                    items,
+                )
+                return
+            except Exception as e:
+                print(f"⚠️ Could not replace the preview, sending a new photo: {e}")
+        await sent_files.send(lambda media: self.bot.send_photo(chat_id=chat_id, photo=media[0], caption=caption), items)
+
+    async def send_documents(self, chat_id: int, documents: list[tuple], job_id: str = None, pages: list[int] = ()):
+        """
+        Send (filename, bytes, caption) documents in one call: a media group, or
+        send_document for one (by file_id where Telegram already has the bytes,
+        see sent_files). Records `pages` as sent in the job journal.
+        """
+        items = [(data, filename, "document") for filename, data, _ in documents]
+        if len(items) == 1:
+            await sent_files.send(
+                lambda media: self.bot.send_document(chat_id=chat_id, document=media[0], caption=documents[0][2]),
+                items,
+            )
+        else:
+            await sent_files.send(
+                lambda media: self.bot.send_media_group(
+                    chat_id=chat_id,
+                    media=[types.InputMediaDocument(media=file, caption=caption) for file, (_, _, caption) in zip(media, documents)]
+                ),
+                items,
+            )
+        job_journal.pages_sent(job_id, pages)
+
+    async def restore_batch_item(self, digest: str, output_format: str, resolution: str = DEFAULT_RESOLUTION) -> tuple:
+        """(item, held_bytes) of an ID rendered before a restart, or (None, 0) if its result is gone."""
+        blob = await asyncio.to_thread(job_journal.load_result, digest)
+        if blob is None:
+            return None, 0
+        item = await asyncio.to_thread(load_batch_item, blob, output_format)
+        if output_format == "pdf":
+            return item, 0
+        row_bytes = batch_row_bytes(resolution)
+        memory_budget.hold(row_bytes)
+        return item, row_bytes
+
+    async def prepare_batch_item(self, file_id: str, color: bool = True, output_format: str = "png", resolution: str = DEFAULT_RESOLUTION) -> tuple:
+        """Download and render one ID of a batch (see render_batch_item)."""
+        # 1. Download
+        pdf_bytes, local_path = await download_pdf(self.bot, file_id)
+        return await render_batch_item(pdf_bytes, local_path, color, output_format, resolution)
+
+    async def process_multiple_pdfs(self, file_ids: list[str], chat_id: int, color: bool = True, status_message_id: int = None, output_format: str = "png", bilevel: bool = False, prepared: dict = None, job_id: str = None, journaled: dict = None, resolution: str = DEFAULT_RESOLUTION, layout: str = DEFAULT_LAYOUT) -> bool:
+        """
+        Render every ID and send the A4 pages, laid out as `layout` (PNG pages
+        only; PDF sheets always use [Back | Front] rows). `prepared` maps
+        file_id -> Task of `prepare_batch_item` started while the files were being collected.
+
+        Progress is recorded in the job journal under `job_id`. `journaled` is the
+        replayed state of an interrupted batch: IDs it already rendered are loaded
+        from the result store and pages it already sent are skipped.
+        """
+        prepared = prepared or {}
+        job_id = job_id or new_job_id()
+        if journaled is None:
+            job_journal.accept(job_id, chat_id, file_ids, {"is_color": color, "output_format": output_format, "bilevel": bilevel, "resolution": resolution, "layout": layout})
+        done_items = journaled["items"] if journaled else {}
+        sent_pages = journaled["pages"] if journaled else set()
         status_msg_id = status_message_id
         if status_msg_id:
             try:
@@ -131,113 +572,167 @@ class ProcessingService:
             msg = await self.bot.send_message(chat_id=chat_id, text=f"🚀 Starting batch processing of {len(file_ids)} PDFs...")
             status_msg_id = msg.message_id
         
-        # A4 Size at 300 DPI
-        A4_WIDTH = 2480
-        A4_HEIGHT = 3508
-        ID_HALF_WIDTH = 1240 # Template width 2480 / 2
-        ID_FULL_HEIGHT = 727
-        
-        # Scaling to fit 5 rows with margins
-        TARGET_HEIGHT = 700
-        TARGET_ROW_WIDTH = A4_WIDTH # We use the full A4 width for the [Back | Front] row
-        
         all_rows_processed = []
+        all_cards = []  # parsed cards, for the PDF output mode
+        qualities = []  # quality tier of each ID, in order
+        held_bytes = 0  # rows kept until their page is built count against the memory budget
+        upload = None  # the page group being sent
+        dpi = RESOLUTION_PROFILES[resolution]["dpi"]
+        profile = describe_resolution(resolution)
+        if output_format == "pdf":
+            layout = DEFAULT_LAYOUT
+        per_page = cards_per_page(layout)
+        sides = sheet_sides(layout)
+
+        # Work still to start, should the user's session be cancelled first
+        token = current_token.get()
+        if token is not None:
+            token.plan(batch_item_stage(output_format), sum(
+                1 for i, file_id in enumerate(file_ids)
+                if i not in done_items and i // per_page not in sent_pages and file_id not in prepared
+            ))
+            if output_format != "pdf":
+                token.plan(render_sheet.__name__, len(set(range(math.ceil(len(file_ids) / per_page))) - sent_pages))
 
         try:
             for i, file_id in enumerate(file_ids):
+                stored = done_items.get(i, {})
+                if i // per_page in sent_pages:
+                    # Its page was sent before the restart
+                    all_rows_processed.append(None)
+                    qualities.append(stored.get("quality", "full"))
+                    continue
+
+                item = None
+                if stored:
+                    # Rendered before the restart
+                    item, item_bytes = await self.restore_batch_item(stored["hash"], output_format, resolution)
+                    quality = stored["quality"]
+                # Rendered in this run (its stored result may have been lost): store and journal it
+                rendered = item is None
+
+                task = prepared.pop(file_id, None) if item is None else None
+                if item is None and (task is None or not task.done()):
+                    # Items prepared in the background are ready instantly; only report real work
+                    await self.bot.edit_message_text(
+                        text=f"🔄 Processing ID #{i+1} of {len(file_ids)}...",
+                        chat_id=chat_id,
+                        message_id=status_msg_id
+                    )
+
+                if item is None and task is not None:
+                    try:
+                        item, item_bytes, quality = await task
+                    except Exception as e:
+                        # e.g. a download that failed in the background: try once more below
+                        print(f"⚠️ Background preparation of ID #{i+1} failed, retrying: {e}")
+                if item is None:
+                    item, item_bytes, quality = await self.prepare_batch_item(file_id, color, output_format, resolution)
+                if rendered and job_journal.enabled:
+                    digest = await asyncio.to_thread(store_batch_item, item, output_format)
+                    job_journal.item_done(job_id, i, digest, quality)
+                held_bytes += item_bytes
+                qualities.append(quality)
+
+                if output_format == "pdf":
+                    all_cards.append(item)
+                else:
+                    all_rows_processed.append(item)
+
+            # 5. Batch rows into A4 sheets (cards_per_page(layout) per sheet, two pages each for duplex)
+            num_pages = math.ceil(len(file_ids) / per_page)
+
+            if sent_pages.issuperset(range(num_pages)):
+                print(f"📒 Batch {job_id} was fully delivered before the restart")
+            elif output_format == "pdf":
                 await self.bot.edit_message_text(
-                    text=f"🔄 Processing ID #{i+1} of {len(file_ids)}...",
+                    text=f"📑 Building print-ready PDF ({num_pages} A4 pages)...",
                     chat_id=chat_id,
                     message_id=status_msg_id
                 )
-                
-                # 1. Download
-                file = await self.bot.get_file(file_id=file_id)
-                pdf_bytes_io = await self.bot.download_file(file_path=file.file_path)
-                pdf_bytes = pdf_bytes_io.read()
-                
-                # 2. Process to Wide Image (Front | Back)
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    temp_path = Path(temp_dir)
-                    pdf_file = temp_path / f"input_{i}.pdf"
-                    pdf_file.write_bytes(pdf_bytes)
-                    
-                    output_dir = temp_path / "output"
-                    output_dir.mkdir(exist_ok=True)
-
-                    image_bytes = await asyncio.to_thread(
-                        generate_final_id_image,
-                        pdf_path=pdf_file,
-                        output_dir=output_dir,
-                        font_amharic="./fonts/truetype/abyssinica/AbyssinicaSIL-Regular.ttf",
-                        font_english="./fonts/truetype/noto/NotoSans-Regular.ttf",
-                        font_size=27,
-                        boldness=1,
-                        color=color
-                    )
-                    
-                    # 3. Reorder to [Back | Front]
-                    full_id_img = Image.open(io.BytesIO(image_bytes))
-                    # Template: Front is 0-1240, Back is 1240-2480
-                    front = full_id_img.crop((0, 0, ID_HALF_WIDTH, ID_FULL_HEIGHT))
-                    back = full_id_img.crop((ID_HALF_WIDTH, 0, A4_WIDTH, ID_FULL_HEIGHT))
-                    
-                    # Create the new row [Back | Front]
-                    new_row = Image.new('RGB', (A4_WIDTH, ID_FULL_HEIGHT))
-                    new_row.paste(back, (0, 0))
-                    new_row.paste(front, (ID_HALF_WIDTH, 0))
-                    
-                    # 4. Resize for A4 fit
-                    row_resized = new_row.resize((TARGET_ROW_WIDTH, TARGET_HEIGHT), Image.Resampling.LANCZOS)
-                    all_rows_processed.append(row_resized)
-
-            # 5. Batch rows into A4 pages (5 per page)
-            num_pages = math.ceil(len(file_ids) / 5)
-            
-            for p in range(num_pages):
+                sheet_pdf = await asyncio.to_thread(render_cards_pdf, all_cards, "a4")
+                await sent_files.send(
+                    lambda media: self.bot.send_document(
+                        chat_id=chat_id,
+                        document=media[0],
+                        caption=f"✅ All {len(all_cards)} IDs processed: {num_pages} A4 pages\n{describe_layout(layout)}\nType: {describe_output(color)}{profile}{describe_quality(qualities)}"
+                    ),
+                    [(sheet_pdf, "A4_IDs.pdf", "document")],
+                )
+                job_journal.pages_sent(job_id, range(num_pages))
+            elif settings.BATCH_DELIVERY == "zip":
+                # Pages sent before a restart (e.g. as an album) have no rows left to render
+                remaining = [p for p in range(num_pages) if p not in sent_pages]
                 await self.bot.edit_message_text(
-                    text=f"📄 Generating A4 page {p+1} of {num_pages}...",
+                    text=f"📄 Generating {len(remaining)} A4 sheet(s)...",
                     chat_id=chat_id,
                     message_id=status_msg_id
                 )
-                
-                start_idx = p * 5
-                end_idx = min(start_idx + 5, len(file_ids))
-                current_batch_size = end_idx - start_idx
-                
-                # Create A4 canvas
-                a4_canvas = Image.new('RGB', (A4_WIDTH, A4_HEIGHT), (255, 255, 255))
-                
-                if current_batch_size > 0:
-                    margin_y = (A4_HEIGHT - (current_batch_size * TARGET_HEIGHT)) // (current_batch_size + 1)
-                else:
-                    margin_y = 0
-                
-                for j in range(current_batch_size):
-                    y_pos = margin_y + j * (TARGET_HEIGHT + margin_y)
-                    a4_canvas.paste(all_rows_processed[start_idx + j], (0, y_pos))
-
-                # 6. Send the A4 page
-                out_io = io.BytesIO()
-                a4_canvas.save(out_io, format='PNG')
-                out_io.seek(0)
-                
-                await self.bot.send_document(
-                    chat_id=chat_id,
-                    document=BufferedInputFile(out_io.read(), filename=f"A4_IDs_PAGE_{p+1}.png"),
-                    caption=f"✅ A4 Page {p+1} ({current_batch_size} IDs)\nLayout: [Back | Front]\nType: {'Color' if color else 'B&W'}"
+                # Every sheet is composed and encoded in the render workers at once
+                sheets = await asyncio.gather(*(
+                    render_sheet_pages(all_rows_processed[p * per_page:(p + 1) * per_page], bilevel and not color, dpi, layout)
+                    for p in remaining
+                ))
+                pages = [(page_filename(p, side), page) for p, sheet in zip(remaining, sheets) for side, page in zip(sides, sheet)]
+
+                # 6. Send every page in one archive
+                archive = await asyncio.to_thread(zip_pages, pages)
+                await sent_files.send(
+                    lambda media: self.bot.send_document(
+                        chat_id=chat_id,
+                        document=media[0],
+                        caption=f"✅ All {len(file_ids)} IDs processed: {len(pages)} A4 pages (PNG, zipped)\n{describe_layout(layout)}\nType: {describe_output(color, bilevel)}{profile}{describe_quality(qualities)}"
+                    ),
+                    [(archive, "A4_IDs.zip", "document")],
                 )
+                job_journal.pages_sent(job_id, remaining)
+            else:
+                remaining = [p for p in range(num_pages) if p not in sent_pages]
+                # A media group holds whole sheets (a duplex sheet is two documents)
+                group_size = MEDIA_GROUP_SIZE // len(sides)
+                for n in range(0, len(remaining), group_size):
+                    group_pages = remaining[n:n + group_size]
+                    first, last = group_pages[0] + 1, group_pages[-1] + 1
+                    await self.bot.edit_message_text(
+                        text=f"📄 Generating A4 pages {first}-{last} of {num_pages}..." if last > first else f"📄 Generating A4 page {first} of {num_pages}...",
+                        chat_id=chat_id,
+                        message_id=status_msg_id
+                    )
+
+                    # Compose and PNG-encode the group's sheets side by side in the render workers
+                    sheets = await asyncio.gather(*(
+                        render_sheet_pages(all_rows_processed[p * per_page:(p + 1) * per_page], bilevel and not color, dpi, layout)
+                        for p in group_pages
+                    ))
+                    group = []  # (filename, bytes, caption) of the pages to send
+                    for p, sheet in zip(group_pages, sheets):
+                        start_idx = p * per_page
+                        ids = len(all_rows_processed[start_idx:start_idx + per_page])
+                        for side, page_bytes in zip(sides, sheet):
+                            caption = f"✅ A4 Page {p+1}{f' ({side})' if side else ''} ({ids} IDs)\n{describe_layout(layout)}\nType: {describe_output(color, bilevel)}{profile}{describe_quality(qualities[start_idx:start_idx + per_page])}"
+                            if p == num_pages - 1 and side == sides[-1]:
+                                caption += f"\n\n✅ All {len(file_ids)} IDs processed and sent!"
+                            group.append((page_filename(p, side), page_bytes, caption))
+
+                    # 6. Send full groups while the next pages render (one upload at a time keeps the order)
+                    if upload:
+                        await upload
+                    upload = asyncio.create_task(self.send_documents(chat_id, group, job_id, group_pages))
+                if upload:
+                    await upload
+
+            job_journal.finish(job_id, "done")
 
             try:
                 await self.bot.delete_message(chat_id=chat_id, message_id=status_msg_id)
             except Exception:
                 pass
-            await self.bot.send_message(chat_id=chat_id, text=f"✅ All {len(file_ids)} IDs processed and sent!")
             return True
 
         except Exception as e:
             error_traceback = traceback.format_exc()
             print(f"Batch Processing Error: {e}\n{error_traceback}")
+            job_journal.finish(job_id, "failed")
             if status_msg_id:
                 try:
                     await self.bot.edit_message_text(
@@ -249,4 +744,20 @@ class ProcessingService:
                     pass
             else:
                 await self.bot.send_message(chat_id=chat_id, text=f"❌ Batch Error: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+        except asyncio.CancelledError:
+            # Left as it is on shutdown, so that the batch resumes after the restart
+            if await self.report_cancelled(chat_id, status_msg_id, f"🛑 Batch of {len(file_ids)} IDs cancelled."):
+                print(f"🛑 Batch {job_id} cancelled by the user")
+                job_journal.finish(job_id, "cancelled")
+            raise
+
+        finally:
+            if token is not None:
+                token.unplan()
+            if upload and not upload.done():
+                upload.cancel()
+            memory_budget.unhold(held_bytes)
+            # Prepared items that were never used (e.g. the batch failed half-way)
+            discard_tasks(prepared.values())
\ No newline at end of file
@@ -0,0 +1,81 @@
+# services/quality.py
+import time
+
+from app.config import settings
+from services.memory_budget import memory_budget
+
+# Best first; see QUALITY_TIERS in core.image.image_generator
+TIERS = ("full", "reduced", "minimal")
+
+
+class QualityGovernor:
+    """
+    Picks the render quality tier for each new job from the render queue depth
+    and the recent job latency (queue wait + render) of the memory budget.
+
+    Degrades as soon as a threshold is crossed; recovers one tier at a time,
+    once load has stayed below the current tier's thresholds for `recover_after`
+    seconds, so the tier doesn't flap at the edge of a threshold.
+    """
+
+    def __init__(
+        self,
+        budget,
+        enabled: bool = True,
+        queue_thresholds: tuple = (4, 12),
+        latency_thresholds: tuple = (20.0, 45.0),
+        recover_after: float = 30.0,
+    ):
+        self.budget = budget
+        self.enabled = enabled
+        self.queue_thresholds = queue_thresholds
+        self.latency_thresholds = latency_thresholds
+        self.recover_after = recover_after
+        self.level = 0
+        self._changed_at = time.monotonic()
+        self.chosen = {tier: 0 for tier in TIERS}
+
+    def _target_level(self, queued: int, latency: float) -> int:
+        level = 0
+        for i, (max_queue, max_latency) in enumerate(zip(self.queue_thresholds, self.latency_thresholds), start=1):
+            if queued >= max_queue or latency >= max_latency:
+                level = i
+        return level
+
+    def choose(self) -> str:
+        """The tier for a job starting now (always "full" when disabled)."""
+        if self.enabled:
+            queued = self.budget.queued
+            latency = self.budget.recent_latency() or 0.0
+            target = self._target_level(queued, latency)
+            now = time.monotonic()
+
+            if target > self.level or (target < self.level and now - self._changed_at >= self.recover_after):
+                new_level = target if target > self.level else self.level - 1
+                print(f"⚡ Quality tier {TIERS[self.level]} -> {TIERS[new_level]} (queued {queued}, latency {latency:.1f}s)")
+                self.level = new_level
+                self._changed_at = now
+            elif target == self.level:
+                self._changed_at = now  # still under this much load: restart the recovery clock
+
+        tier = TIERS[self.level] if self.enabled else "full"
+        self.chosen[tier] += 1
+        return tier
+
+    def stats(self) -> dict:
+        latency = self.budget.recent_latency()
+        return {
+            "enabled": self.enabled,
+            "tier": TIERS[self.level] if self.enabled else "full",
+            "recent_latency_s": round(latency, 2) if latency is not None else None,
+            "jobs_per_tier": dict(self.chosen),
+        }
+
+
+# One governor per process, fed by the shared memory budget
+quality_governor = QualityGovernor(
+    memory_budget,
+    enabled=settings.QUALITY_AUTO,
+    queue_thresholds=(settings.QUALITY_REDUCED_QUEUE, settings.QUALITY_MINIMAL_QUEUE),
+    latency_thresholds=(settings.QUALITY_REDUCED_LATENCY_S, settings.QUALITY_MINIMAL_LATENCY_S),
+)
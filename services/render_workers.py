@@ -0,0 +1,308 @@
+# services/render_workers.py
+"""
+Render worker processes that are recycled before they grow too big.
+
+PIL, OpenCV, camelot and onnxruntime keep native memory that Python never hands
+back, so a process that renders for days only grows. Render jobs (everything
+run through the memory budget) therefore go to child processes, one job at a
+time each. After every job a worker reports its RSS and the PyMuPDF documents
+still open in it. A worker retires after RENDER_WORKER_MAX_JOBS jobs or once its
+RSS passes RENDER_WORKER_MAX_RSS_MB: a replacement is started and warmed up
+first, new jobs go to the replacement, and the old process exits once its last
+job is done. Each worker caps its native libraries at its share of the cores
+(see services.thread_budget).
+
+A job whose session is cancelled (see services.cancellation) stops at its next
+checkpoint: the pool lists the job's number in a small array shared with its
+worker, which the worker's checkpoints read.
+"""
+import asyncio
+import gc
+import itertools
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from app.config import settings
+from services.cancellation import JobCancelled, checkpoint, current_token
+from services.memory_budget import MIB, RssSampler, current_rss
+from services.thread_budget import apply_native_threads, thread_plan
+
+# Numbers of the last cancelled jobs each worker is told about
+CANCELLED_JOB_SLOTS = 8
+
+
+# --- Worker side (runs in the child process) ---
+
+_cancelled_jobs = None  # this worker's shared array of cancelled job numbers
+
+
+def _init_worker(cancelled_jobs, threads: int):
+    global _cancelled_jobs
+    _cancelled_jobs = cancelled_jobs
+    apply_native_threads(threads)  # before warm-up loads the libraries
+
+
+class WorkerJobFlag:
+    """Stands in for the session's token in a worker: cancelled once the pool lists the job."""
+
+    def __init__(self, job_no: int):
+        self.job_no = job_no
+
+    @property
+    def cancelled(self) -> bool:
+        return self.job_no in _cancelled_jobs[:]
+
+
+def open_pdf_handles() -> int:
+    """PyMuPDF documents still open in this process (0 after a clean job)."""
+    fitz = sys.modules.get("fitz")
+    if fitz is None:
+        return 0
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, fitz.Document) and not obj.is_closed)
+
+
+def _worker_state() -> dict:
+    return {"rss": current_rss(), "open_pdfs": open_pdf_handles()}
+
+
+def _warm_up() -> tuple[dict, str | None, dict]:
+    """Load the template, fonts and models. Returns (timings, error, worker state)."""
+    import os
+    from core.image.image_generator import warm_up
+
+    timings, error = {}, None
+    try:
+        timings = warm_up(settings.FONT_AMHARIC, settings.FONT_ENGLISH, settings.FONT_SIZE)
+    except Exception as e:
+        # Rendering still works (lazily / with fallbacks) in a worker whose warm-up failed
+        error = str(e)
+    return timings, error, dict(_worker_state(), pid=os.getpid())
+
+
+def _run_job(fn, args, job_no: int = 0) -> tuple:
+    """
+    Run `fn(*args)` while sampling RSS. Returns (result, peak RSS growth, worker state
+    with the job's CPU seconds). A cancelled job raises JobCancelled, with its CPU seconds as `cpu`.
+    """
+    flag = current_token.set(WorkerJobFlag(job_no))
+    start = time.process_time()
+    try:
+        checkpoint()
+        with RssSampler() as sampler:
+            result = fn(*args)
+    except JobCancelled as e:
+        e.cpu = time.process_time() - start
+        raise
+    finally:
+        current_token.reset(flag)
+    return result, sampler.peak_delta, dict(_worker_state(), cpu=time.process_time() - start)
+
+
+def _job_cpu(future) -> tuple[float, bool]:
+    """(CPU seconds, ran to the end) of a finished _run_job future."""
+    if future.cancelled():
+        return 0.0, False
+    error = future.exception()
+    if error is not None:
+        return getattr(error, "cpu", 0.0), False
+    return future.result()[2]["cpu"], True
+
+
+# --- Pool side (event loop) ---
+
+class RenderWorker:
+    """One single-process executor and what it has reported so far."""
+
+    def __init__(self, number: int, threads: int = 0):
+        self.number = number
+        context = get_context("spawn")
+        self.cancelled_jobs = context.Array("q", CANCELLED_JOB_SLOTS, lock=False)
+        self.executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=context, initializer=_init_worker, initargs=(self.cancelled_jobs, threads)
+        )
+        self._cancelled = 0  # cancellations written to the array so far
+        self.pid = None
+        self.jobs = 0
+        self.busy = 0
+        self.rss = 0
+        self.baseline_rss = 0  # RSS right after warm-up
+        self.open_pdfs = 0
+        self.started = time.monotonic()
+        self.retiring = None  # reason, once a replacement has been asked for
+        self.warmed = None  # Task of the warm-up
+
+    def cancel_job(self, job_no: int):
+        """Have job `job_no` stop at its next checkpoint (the oldest cancellation listed is overwritten)."""
+        self.cancelled_jobs[self._cancelled % CANCELLED_JOB_SLOTS] = job_no
+        self._cancelled += 1
+
+    def stats(self) -> dict:
+        return {
+            "worker": self.number,
+            "pid": self.pid,
+            "jobs": self.jobs,
+            "busy": self.busy,
+            "rss_mib": round(self.rss / MIB),
+            "rss_growth_mib": round((self.rss - self.baseline_rss) / MIB) if self.baseline_rss else None,
+            "open_pdfs": self.open_pdfs,
+            "age_s": round(time.monotonic() - self.started),
+            "retiring": self.retiring,
+        }
+
+
+class RenderWorkerPool:
+    def __init__(self, size: int, max_jobs: int, max_rss_bytes: int, threads: int = 0):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss_bytes
+        self.threads = threads  # native threads per worker (0: the libraries' defaults)
+        self.workers = []
+        self._numbers = 0
+        self.retired = {"jobs": 0, "rss": 0, "crashed": 0}
+        self.leaked_pdf_jobs = 0  # jobs that left PyMuPDF documents open
+        self.warmup_timings = {}
+        self.warmup_error = None
+        self._job_numbers = itertools.count(1)
+        self._replace_tasks = set()
+        self._replacing = {}  # retiring worker -> its replacement, until the old one has exited
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def _spawn(self) -> RenderWorker:
+        self._numbers += 1
+        worker = RenderWorker(self._numbers, self.threads)
+        worker.warmed = asyncio.create_task(self._warm(worker))
+        return worker
+
+    async def _warm(self, worker: RenderWorker):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            timings, error, state = await loop.run_in_executor(worker.executor, _warm_up)
+        except Exception as e:
+            timings, error, state = {}, str(e), {}
+        worker.pid = state.get("pid")
+        worker.rss = worker.baseline_rss = state.get("rss", 0)
+        self.warmup_timings, self.warmup_error = timings, error
+        if error:
+            print(f"⚠️ Render worker {worker.number} warm-up failed after {time.perf_counter() - started:.2f}s: {error}")
+        else:
+            print(f"🔥 Render worker {worker.number} (pid {worker.pid}) warm in {time.perf_counter() - started:.2f}s, RSS {worker.rss / MIB:.0f} MiB")
+
+    def start(self):
+        """Start the workers (their warm-up runs in the background)."""
+        while len(self.workers) < self.size:
+            self.workers.append(self._spawn())
+
+    async def wait_warm(self) -> dict:
+        """
+        Wait for the current workers' warm-up. Returns the warm-up timings of one
+        of them; raises RuntimeError if the last warm-up failed.
+        """
+        self.start()
+        await asyncio.gather(*(worker.warmed for worker in self.workers))
+        if self.warmup_error:
+            raise RuntimeError(self.warmup_error)
+        return self.warmup_timings
+
+    async def run(self, fn, *args, ticket=None) -> tuple:
+        """
+        Run `fn(*args)` in the least busy worker. Returns (result, peak RSS growth).
+        `ticket` (see services.cancellation) is settled with the job's CPU time, and
+        cancelling its session stops the job at its next checkpoint.
+        """
+        self.start()
+        # Retiring workers only get jobs while no one else can take them
+        worker = min(self.workers, key=lambda w: (w.retiring is not None, w.busy, w.number))
+        job_no = next(self._job_numbers)
+        worker.busy += 1
+        try:
+            future = worker.executor.submit(_run_job, fn, args, job_no)
+            if ticket:
+                ticket.started = True
+                ticket.on_cancel(lambda: worker.cancel_job(job_no))
+                future.add_done_callback(lambda f: ticket.settle(*_job_cpu(f)))
+            result, peak, state = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._retire(worker, "crashed")
+            raise RuntimeError("Render worker crashed (out of memory?), please try again")
+        finally:
+            worker.busy -= 1
+
+        worker.jobs += 1
+        worker.rss = state["rss"]
+        if state["open_pdfs"] > worker.open_pdfs:
+            self.leaked_pdf_jobs += 1
+            print(f"⚠️ {getattr(fn, '__name__', fn)} left {state['open_pdfs'] - worker.open_pdfs} PDF document(s) open in render worker {worker.number}")
+        worker.open_pdfs = state["open_pdfs"]
+
+        if not worker.retiring:
+            if worker.jobs >= self.max_jobs:
+                self._retire(worker, "jobs")
+            elif worker.rss >= self.max_rss:
+                self._retire(worker, "rss")
+        return result, peak
+
+    def _retire(self, worker: RenderWorker, reason: str):
+        if worker.retiring:
+            return
+        worker.retiring = reason
+        self.retired[reason] += 1
+        print(f"♻️ Retiring render worker {worker.number} ({reason}: {worker.jobs} jobs, RSS {worker.rss / MIB:.0f} MiB)")
+        task = asyncio.create_task(self._replace(worker))
+        self._replace_tasks.add(task)
+        task.add_done_callback(self._replace_tasks.discard)
+
+    async def _replace(self, worker: RenderWorker):
+        replacement = self._spawn()
+        self._replacing[worker] = replacement
+        try:
+            if worker.retiring != "crashed":
+                # The old worker keeps taking jobs until its replacement is warm
+                await replacement.warmed
+            if worker not in self.workers:
+                # The pool was stopped in the meantime
+                replacement.executor.shutdown(wait=False, cancel_futures=True)
+                return
+            self.workers[self.workers.index(worker)] = replacement
+            # Exits once its queued jobs are done
+            await asyncio.to_thread(worker.executor.shutdown, wait=True)
+        finally:
+            self._replacing.pop(worker, None)
+
+    async def stop(self):
+        """Stop every worker, including retiring ones and replacements still warming up."""
+        for task in self._replace_tasks:
+            task.cancel()
+        replacing = [w for pair in self._replacing.items() for w in pair]
+        for worker in [*self.workers, *replacing]:
+            if worker.warmed and not worker.warmed.done():
+                worker.warmed.cancel()
+            worker.executor.shutdown(wait=False, cancel_futures=True)
+        self.workers = []
+        self._replacing = {}
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "threads_per_worker": self.threads,
+            "max_jobs": self.max_jobs,
+            "max_rss_mib": round(self.max_rss / MIB),
+            "retired": dict(self.retired),
+            "jobs_leaking_pdfs": self.leaked_pdf_jobs,
+            "workers": [worker.stats() for worker in self.workers],
+        }
+
+
+# One pool per process; RENDER_WORKERS=0 keeps rendering in threads of this process
+render_workers = RenderWorkerPool(
+    thread_plan["workers"],
+    max_jobs=settings.RENDER_WORKER_MAX_JOBS,
+    max_rss_bytes=settings.RENDER_WORKER_MAX_RSS_MB * MIB,
+    threads=thread_plan["threads_per_render"],
+)
@@ -0,0 +1,136 @@
+# services/sent_files.py
+"""
+Telegram file_ids of the results we have sent, by content.
+
+Telegram gives every uploaded file a file_id that can be sent again without the
+bytes. The same result is often delivered twice (a user sends their PDF again,
+asks for a resend, or processes it twice the same day), so each upload is
+recorded under the SHA-256 of its bytes and later deliveries of the same bytes
+go out by file_id: nothing is uploaded and Telegram answers at once.
+
+A key also holds how the file was sent: a photo's file_id can only be sent as a
+photo, and a document keeps the file name it was uploaded with. Entries expire
+after SENT_FILES_TTL_HOURS; a file_id Telegram refuses is forgotten and the
+bytes are uploaded again.
+"""
+import hashlib
+import sqlite3
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+from aiogram.exceptions import TelegramBadRequest
+
+from app.config import settings
+from services.telegram_files import output_file
+
+
+def file_id_of(message, kind: str) -> str | None:
+    """The file_id Telegram gave the photo (largest size) or document of a sent message."""
+    if kind == "photo":
+        photos = getattr(message, "photo", None)
+        return photos[-1].file_id if photos else None
+    document = getattr(message, "document", None)
+    return document.file_id if document else None
+
+
+class SentFiles:
+    def __init__(self, path: Path, ttl_seconds: float, enabled: bool = True):
+        self.path = Path(path)
+        self.ttl = ttl_seconds
+        self.enabled = enabled
+        self._db = None
+        self.hits = 0
+        self.uploads = 0
+        self.refused = 0
+        self.bytes_saved = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sent_files ("
+                " key TEXT PRIMARY KEY,"
+                " file_id TEXT NOT NULL,"
+                " ts REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM sent_files WHERE ts < ?", (time.time() - self.ttl,))
+        return self._db
+
+    @staticmethod
+    def key(data: bytes, kind: str, filename: str) -> str:
+        """`kind` is "photo" or "document"; only documents keep their file name."""
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{digest}:photo" if kind == "photo" else f"{digest}:document:{filename}"
+
+    def get(self, key: str) -> str | None:
+        """The file_id of the same bytes sent the same way, unless expired."""
+        if not self.enabled:
+            return None
+        row = self._conn().execute(
+            "SELECT file_id FROM sent_files WHERE key = ? AND ts >= ?", (key, time.time() - self.ttl)
+        ).fetchone()
+        return row[0] if row else None
+
+    def remember(self, key: str, file_id: str):
+        if self.enabled and file_id:
+            self._conn().execute("INSERT OR REPLACE INTO sent_files (key, file_id, ts) VALUES (?, ?, ?)", (key, file_id, time.time()))
+
+    def forget(self, key: str):
+        if self.enabled:
+            self._conn().execute("DELETE FROM sent_files WHERE key = ?", (key,))
+
+    async def send(self, send, items: list[tuple]):
+        """
+        Call `send(media)` (a coroutine function) with, for each (data, filename,
+        kind) item, the file_id of the same bytes sent before or else an upload
+        (see services.telegram_files.output_file). Then remember the file_ids of
+        the uploads from what `send` returned: a message, or one per item. If
+        Telegram refuses a known file_id, it is forgotten and everything is
+        uploaded instead. Returns what `send` returned.
+        """
+        keys = [self.key(data, kind, filename) for data, filename, kind in items]
+        known = [self.get(key) for key in keys]
+        try:
+            return await self._send(send, items, keys, known)
+        except TelegramBadRequest as e:
+            if not any(known):
+                raise
+            print(f"⚠️ Telegram refused a known file_id, uploading again: {e}")
+            self.refused += 1
+            for key, file_id in zip(keys, known):
+                if file_id:
+                    self.forget(key)
+            return await self._send(send, items, keys, [None] * len(items))
+
+    async def _send(self, send, items: list[tuple], keys: list[str], known: list):
+        async with AsyncExitStack() as stack:
+            media = [
+                file_id or await stack.enter_async_context(output_file(data, filename))
+                for file_id, (data, filename, _) in zip(known, items)
+            ]
+            result = await send(media)
+
+        messages = result if isinstance(result, list) else [result] * len(items)
+        for key, file_id, message, (data, _, kind) in zip(keys, known, messages, items):
+            if file_id:
+                self.hits += 1
+                self.bytes_saved += len(data)
+            else:
+                self.uploads += 1
+                self.remember(key, file_id_of(message, kind))
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "reused": self.hits,
+            "uploaded": self.uploads,
+            "refused": self.refused,
+            "upload_mib_saved": round(self.bytes_saved / 2**20, 1),
+        }
+
+
+# One cache per process (SQLite connections stay on the event loop thread)
+sent_files = SentFiles(settings.SENT_FILES_PATH, settings.SENT_FILES_TTL_HOURS * 3600, enabled=settings.SENT_FILES_ENABLED)
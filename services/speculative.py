@@ -0,0 +1,106 @@
+# services/speculative.py
+import asyncio
+
+from core.image.image_generator import DEFAULT_RESOLUTION
+from services.cancellation import current_token
+from services.memory_budget import memory_budget
+
+# Background preparations per user running at once (the rest wait their turn)
+PER_USER_CONCURRENCY = 2
+
+
+class SpeculativeBatch:
+    """Items of one user's multi-PDF collection, prepared while they keep sending files."""
+
+    def __init__(self, color: bool, output_format: str, resolution: str = DEFAULT_RESOLUTION):
+        self.color = color
+        self.output_format = output_format
+        self.resolution = resolution
+        self.tasks = {}  # file_id -> Task resolving to (item, held_bytes, quality)
+        self.semaphore = asyncio.Semaphore(PER_USER_CONCURRENCY)
+
+    def matches(self, color: bool, output_format: str, resolution: str = DEFAULT_RESOLUTION) -> bool:
+        return self.color == color and self.output_format == output_format and self.resolution == resolution
+
+    def ready_count(self) -> int:
+        return sum(1 for task in self.tasks.values() if task.done() and not task.cancelled() and not task.exception())
+
+
+class SpeculativeResults:
+    """
+    Per-user registry of background preparations.
+
+    `start` schedules one file as soon as it arrives; `take` hands the prepared
+    tasks to the batch when the user presses "Done"; `discard` throws them away
+    (and gives back the memory they hold) when the user backs out.
+    """
+
+    def __init__(self):
+        self._batches = {}  # user_id -> SpeculativeBatch
+
+    def start(self, user_id: int, file_id: str, color: bool, output_format: str, prepare, resolution: str = DEFAULT_RESOLUTION):
+        """Run `prepare()` (a coroutine function returning (item, held_bytes, quality)) in the background."""
+        batch = self._batches.get(user_id)
+        if batch and not batch.matches(color, output_format, resolution):
+            self.discard(user_id)
+            batch = None
+        if batch is None:
+            batch = self._batches[user_id] = SpeculativeBatch(color, output_format, resolution)
+        if file_id in batch.tasks:
+            return
+
+        async def run():
+            async with batch.semaphore:
+                return await prepare()
+
+        batch.tasks[file_id] = asyncio.create_task(run())
+        # Started for the user's session: cancelled with it
+        token = current_token.get()
+        if token is not None:
+            token.track(batch.tasks[file_id])
+
+    def ready_count(self, user_id: int) -> int:
+        batch = self._batches.get(user_id)
+        return batch.ready_count() if batch else 0
+
+    def take(self, user_id: int, color: bool, output_format: str, resolution: str = DEFAULT_RESOLUTION) -> dict:
+        """Hand over the user's tasks (file_id -> Task). Results for other settings are discarded."""
+        batch = self._batches.get(user_id)
+        if batch is None:
+            return {}
+        if not batch.matches(color, output_format, resolution):
+            self.discard(user_id)
+            return {}
+        del self._batches[user_id]
+        return batch.tasks
+
+    def discard(self, user_id: int):
+        """Cancel pending work and release what finished work holds."""
+        batch = self._batches.pop(user_id, None)
+        if batch is None:
+            return
+        discard_tasks(batch.tasks.values())
+        print(f"🗑 Discarded {len(batch.tasks)} speculative item(s) for user {user_id}")
+
+
+def discard_tasks(tasks):
+    """Cancel unfinished tasks; release the memory held by finished ones."""
+    for task in tasks:
+        if not task.done():
+            # A task finishing after cancel() still owns its result, so release it then
+            task.add_done_callback(_release_result)
+            task.cancel()
+        else:
+            _release_result(task)
+
+
+def _release_result(task: asyncio.Task):
+    if task.cancelled():
+        return
+    if task.exception() is None:
+        _, held_bytes, _ = task.result()
+        memory_budget.unhold(held_bytes)
+
+
+# One registry per process, shared by every handler
+speculative_results = SpeculativeResults()
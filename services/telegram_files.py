@@ -0,0 +1,143 @@
+# services/telegram_files.py
+"""
+File transfer with the Telegram Bot API, with a fast path for a self-hosted
+Bot API server running in --local mode on the same machine.
+
+A local server returns absolute `file_path`s from getFile instead of relative
+download paths, and accepts `file://` URIs for uploads. When we see such a path
+we memory-map the file instead of downloading it over HTTP; with
+BOT_API_LOCAL=True results are written to OUTPUT_DIR and uploaded by path.
+"""
+import asyncio
+import mmap
+import shutil
+import tempfile
+import types as _types
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from aiogram.types import BufferedInputFile
+
+from app.config import settings
+
+
+def _remap(path: Path, src: str, dst: str) -> Path:
+    """Translate `path` from under `src` to under `dst` (no-op when unset or not under it)."""
+    if not src or not dst:
+        return path
+    try:
+        return Path(dst) / path.relative_to(src)
+    except ValueError:
+        return path
+
+
+def local_file_path(file_path: str) -> Path | None:
+    """The on-disk location of a getFile result, or None if it must be downloaded."""
+    if not file_path or not Path(file_path).is_absolute():
+        return None  # api.telegram.org (or a non-local server): relative download path
+    path = _remap(Path(file_path), settings.BOT_API_SERVER_DIR, settings.BOT_API_MOUNT_DIR)
+    return path if path.is_file() else None
+
+
+def map_file(path: Path) -> memoryview:
+    """
+    Read-only memory map of a file, as a buffer PyMuPDF opens without copying.
+    The mapping lives as long as the returned memoryview.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped)
+
+
+async def download_pdf(bot, file_id: str) -> tuple:
+    """
+    Fetch a document. Returns (data, local_path): `data` is bytes (HTTP download)
+    or a memory-mapped view of the server's file, in which case `local_path`
+    is that file so the parser can open it directly.
+    """
+    file = await bot.get_file(file_id=file_id)
+    local_path = local_file_path(file.file_path)
+    if local_path:
+        return await asyncio.to_thread(map_file, local_path), local_path
+
+    pdf_bytes_io = await bot.download_file(file_path=file.file_path)
+    return pdf_bytes_io.read(), None
+
+
+@asynccontextmanager
+async def output_file(data: bytes, filename: str):
+    """
+    The document/photo argument for sending `data`: a file:// URI on a local Bot
+    API server (the file is removed once sent), else an in-memory upload.
+    """
+    if not settings.BOT_API_LOCAL:
+        yield BufferedInputFile(data, filename=filename)
+        return
+
+    # One directory per upload, so the server sees the original file name
+    out_dir = Path(tempfile.mkdtemp(prefix="send_", dir=settings.OUTPUT_DIR))
+    try:
+        out_path = out_dir / filename
+        await asyncio.to_thread(out_path.write_bytes, data)
+        server_path = _remap(out_path.resolve(), settings.BOT_API_MOUNT_DIR, settings.BOT_API_SERVER_DIR)
+        # The server takes the rest of the URI as a plain path (no percent-decoding)
+        yield f"file://{server_path}"
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+class DirectoryBotApi:
+    """
+    Directory-backed stand-in for a local Bot API server, for trying local mode
+    without one. File ids are file names under `root`; getFile returns their
+    absolute paths, and sent documents/photos are read back from their path
+    (or taken from the upload) and kept in `sent`.
+    Only implements what ProcessingService uses.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        self.sent = []  # (method, filename, size, caption)
+        self._next_id = 0
+
+    def _message(self, **fields):
+        self._next_id += 1
+        return _types.SimpleNamespace(message_id=self._next_id, **fields)
+
+    async def get_file(self, file_id: str):
+        path = self.root / file_id
+        return _types.SimpleNamespace(file_id=file_id, file_path=str(path), file_size=path.stat().st_size)
+
+    async def download_file(self, file_path: str, destination=None):
+        raise RuntimeError("DirectoryBotApi only serves local paths")
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return self._message(text=text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return True
+
+    async def delete_message(self, chat_id, message_id):
+        return True
+
+    def _upload(self, method, file, caption):
+        if isinstance(file, str) and file.startswith("file://"):
+            path = Path(file[len("file://"):])
+            name, size = path.name, path.stat().st_size
+        else:
+            name, size = file.filename, len(file.data)
+        self.sent.append((method, name, size, caption))
+        return self._message(caption=caption)
+
+    async def send_document(self, chat_id, document, caption=None, **kwargs):
+        return self._upload("send_document", document, caption)
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        return self._upload("send_photo", photo, caption)
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        return [self._upload(f"send_media_group:{item.type}", item.media, item.caption) for item in media]
+
+    async def edit_message_media(self, media, chat_id=None, message_id=None, **kwargs):
+        self._upload("edit_message_media", media.media, media.caption)
+        return True
@@ -0,0 +1,114 @@
+# services/thread_budget.py
+"""
+One CPU allocation for every thread pool a render touches.
+
+OpenCV, onnxruntime and NumPy's BLAS each start a pool as large as the machine
+(os.cpu_count() sees the host's cores, not the container's quota), and so does
+the default asyncio.to_thread executor. With several renders at once, every one
+of them running all those pools, the cores spend their time switching threads.
+
+Instead, the cores this process may use (CPU_CORES, else detected from its CPU
+affinity and cgroup quota) are split between the concurrent renders: render
+worker processes, or render threads when RENDER_WORKERS=0. Each render gets
+CORES_PER_RENDER threads in each native library, set through their environment
+variables (read when the library loads) and, for OpenCV, directly:
+
+    RENDER_WORKERS  CORES_PER_RENDER=0 (auto)
+    > 0             the cores split evenly between the workers
+    -1              1: one single-threaded worker per core
+    0               1: one render thread per core, in this process
+
+The render threads use their own executor (see MemoryBudget.executor); the
+default executor keeps IO_THREADS threads (0: Python's min(32, cores + 4)) for
+downloads, libmagic, pre-flight and the like.
+
+`python benchmark.py thread_budget` sweeps worker/thread splits of the cores and
+reports the best throughput.
+"""
+import os
+import sys
+
+from app.config import settings
+
+# Read by OpenMP (onnxruntime via rembg, see core.image.image_bg_remove), OpenBLAS,
+# MKL, Accelerate, numexpr and OpenCV's default parallel backend when they load
+THREAD_ENV = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "OPENCV_FOR_THREADS_NUM",
+)
+
+
+def available_cores() -> int:
+    """Cores this process may use: its CPU affinity, capped by a cgroup CPU quota."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        cores = os.cpu_count() or 1
+
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2: "<quota> <period>" or "max <period>"
+            limit, period = f.read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f, open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as g:
+                limit, period = int(f.read()), int(g.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cores = min(cores, max(1, int(quota)))
+    return cores
+
+
+def plan_threads(cores: int, workers: int, cores_per_render: int = 0, io_threads: int = 0) -> dict:
+    """
+    Split `cores` between the concurrent renders (see the module doc). Returns
+    the render worker count, the renders run at once, the native threads of
+    each and the size of the default executor.
+    """
+    cores = max(cores, 1)
+    if workers > 0:
+        threads = cores_per_render or max(1, cores // workers)
+    else:
+        threads = cores_per_render or 1
+        if workers < 0:
+            workers = max(1, cores // threads)
+    return {
+        "cores": cores,
+        "workers": workers,
+        "render_slots": workers or max(1, cores // threads),
+        "threads_per_render": threads,
+        "io_threads": io_threads or min(32, cores + 4),
+    }
+
+
+def apply_native_threads(threads: int):
+    """
+    Cap the native libraries of this process at `threads` threads each (0: leave
+    their defaults). Call it before they load: only OpenCV can still be changed
+    once loaded. Spawned processes inherit the setting.
+    """
+    if threads <= 0:
+        return
+    for var in THREAD_ENV:
+        os.environ[var] = str(threads)
+    cv2 = sys.modules.get("cv2")
+    if cv2 is not None:
+        cv2.setNumThreads(threads)
+
+
+# The split for this process, from the settings
+thread_plan = plan_threads(
+    settings.CPU_CORES or available_cores(),
+    settings.RENDER_WORKERS,
+    settings.CORES_PER_RENDER,
+    settings.IO_THREADS,
+)